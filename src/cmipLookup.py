@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:00:00 2026
+
+Sparse CMIP_ESGF.json/CMIP_Merge.json tree and its lookup API. Members are
+stored as id lists, configuration lives once per source_id:
+
+    {"CMIP6": {instId: {srcId: {actId: {expId: [ripfId, ...]}}}},
+     "CMIP5": {...}, "CMIP3": {...},
+     "sources": {"CMIP6": {instId: {srcId: {
+         "variables": [varId, ...],
+         "members": {actId: {expId: {ripfId: [varId, ...]}}},
+         "config": {actId|"all": {expId|"all": {ripfId|"all": {queryKey: value}}}}
+     }}}}}
+
+so file size and memory scale with the number of models, not members.
+"variables" is the union over the source's members, "members" only lists
+those publishing a different set (saveTree drops the rest), so
+memberVariables can tell which members have thetao but not so.
+"config" is the CMIP_Modeller.json entry of the source (added by
+updateModInfo), memberConfig resolves it for a single member. Its entries
+are keyed (all, all, all), (actId, all, all), (actId, expId, all) or
+(actId, expId, ripfId), any other shape is an error.
+
+ConfigRules compiles every source's config into one rule index, so resolving
+all members is a single pass with one dictionary lookup per member.
+
+Usage:
+    tree = loadTree('../CMIP_Merge.json')
+    rules = ConfigRules(tree)
+    for instId, srcId, actId, expId, ripfIds in iterExperiments(tree, 'CMIP6'):
+        config = rules['CMIP6', instId, srcId, actId, expId, ripfIds[0]]
+        config['modId'], config['eos']
+
+    memberConfig(tree, 'CMIP6', 'NOAA-GFDL', 'GFDL-CM4', 'CMIP', 'historical', 'r1i1p1f1')
+
+PJD 18 Oct 2026 - Started
+PJD 18 Oct 2026 - Added ConfigRules, compiled member config rule index
+PJD 18 Oct 2026 - Sparse per-member variables ("members"), memberVariables
+PJD 18 Oct 2026 - configLevel, the config entry shapes memberConfig applies
+PJD 18 Oct 2026 - ConfigRules raises on unsupported config entry shapes
+
+@author: durack1
+"""
+
+import json
+
+# %% Member configuration fields, keys as in CMIP_Modeller.json
+queries = {'modId': 'ocean model id (+ version)',
+           'eos': 'equation of state (+ constants)',
+           'cp': 'specific heat capacity (cpocean, J kg-1 K-1)',
+           'refRho': 'reference density (boussinesq; rhozero, kg m-3)',
+           'frzEqn': 'freezing point (equation)',
+           'angRot': 'planet angular rotation (radians s-1)',
+           'graAcc': 'gravitational acceleration (m s-2)',
+           'horRes': 'native horizontal resolution',
+           'verRes': 'native vertical resolution',
+           'vertK': 'vertical diffusivity scheme',
+           'mldSch': 'boundary-layer (mixed-) scheme',
+           'vol': 'sea water volume',
+           'initCl': 'initialization observed climatology',
+           'spinYr': 'spinup length (years)',
+           'antAer': 'anthropogenic aerosol forcing',
+           'volcFo': 'volcanic forcing',
+           'aerInd': 'sulphate aerosol indirect effects',
+           'geotHt': 'geothermal heating'}
+
+mipEras = ['CMIP6', 'CMIP5', 'CMIP3']
+
+
+# %% functions
+def newTree():
+    """
+    Return an empty tree, members and source variables are sets until
+    saveTree
+    """
+    tree = {mipEra: {} for mipEra in mipEras}
+    tree['sources'] = {mipEra: {} for mipEra in mipEras}
+    return tree
+
+
+def jsonTree(tree):
+    """
+    Return tree with sets as sorted lists (json serializable)
+    """
+    if isinstance(tree, dict):
+        return {key: jsonTree(val) for key, val in tree.items()}
+    if isinstance(tree, (set, frozenset)):
+        return sorted(tree)
+    return tree
+
+
+def packVariables(tree):
+    """
+    Drop, in place, the "members" variable entries equal to their source's
+    "variables" (and emptied levels), see module docstring
+    """
+    for insts in tree['sources'].values():
+        for srcs in insts.values():
+            for source in srcs.values():
+                if 'members' not in source:
+                    continue
+                variables = set(source.get('variables', []))
+                acts = source['members']
+                for actId in list(acts):
+                    for expId in list(acts[actId]):
+                        ripfs = acts[actId][expId]
+                        for ripfId in list(ripfs):
+                            if set(ripfs[ripfId]) == variables:
+                                del ripfs[ripfId]
+                        if not ripfs:
+                            del acts[actId][expId]
+                    if not acts[actId]:
+                        del acts[actId]
+                if not acts:
+                    del source['members']
+    return tree
+
+
+def saveTree(tree, fileName):
+    with open(fileName, 'w', encoding='utf-8') as outJson:
+        json.dump(jsonTree(packVariables(tree)), outJson, ensure_ascii=False,
+                  indent=4, sort_keys=True)
+
+
+def loadTree(fileName):
+    """
+    Parameters
+    ----------
+    fileName : str
+        sparse CMIP_ESGF.json or CMIP_Merge.json
+
+    Returns
+    -------
+    tree : dict
+
+    """
+    with open(fileName) as jsonFile:
+        tree = json.load(jsonFile)
+    tree.setdefault('sources', {})
+    for mipEra in mipEras:
+        tree.setdefault(mipEra, {})
+        tree['sources'].setdefault(mipEra, {})
+    return tree
+
+
+def sourceInfo(tree, mipEra, instId, srcId, create=False):
+    """
+    Return the tree['sources'] entry of srcId ({} if missing), create adds
+    an empty entry
+    """
+    insts = tree['sources'].setdefault(mipEra, {})
+    if create:
+        return insts.setdefault(instId, {}).setdefault(srcId, {})
+    return insts.get(instId, {}).get(srcId, {})
+
+
+def memberVariables(tree, mipEra, instId, srcId, actId, expId, ripfId):
+    """
+    Return the sorted variables published by a member, its "members" entry
+    if listed, else the source's "variables"
+    """
+    source = sourceInfo(tree, mipEra, instId, srcId)
+    variables = source.get('members', {}).get(actId, {}).get(expId, {}).get(
+        ripfId)
+    if variables is None:
+        variables = source.get('variables', [])
+    return sorted(variables)
+
+
+def iterExperiments(tree, mipEra):
+    """
+    Yields
+    ------
+    (instId, srcId, actId, expId, ripfIds) : tuple
+        per experiment of mipEra, ripfIds as stored (sorted)
+
+    """
+    for instId, srcs in tree.get(mipEra, {}).items():
+        for srcId, acts in srcs.items():
+            for actId, exps in acts.items():
+                for expId, ripfIds in exps.items():
+                    yield instId, srcId, actId, expId, ripfIds
+
+
+def configLevel(actId, expId, ripfId):
+    """
+    Return the precedence level of a config entry, 0 (all, all, all),
+    1 (actId, all, all), 2 (actId, expId, all) or 3 (actId, expId, ripfId);
+    None for any other shape ("all" below a specific id)
+    """
+    if actId == 'all':
+        return 0 if expId == ripfId == 'all' else None
+    if expId == 'all':
+        return 1 if ripfId == 'all' else None
+    return 2 if ripfId == 'all' else 3
+
+
+class ConfigRules(dict):
+    """
+    Specificity-ordered rule index of source config entries,
+    {(mipEra, instId, srcId, actId, expId, ripfId): config} with "all"
+    wildcards. Rules are compiled least specific first, each starting from
+    the values of the rule above it (member < experiment < activity < "all"),
+    so precedence is resolved once per rule. A key without a rule falls back
+    to the next less specific one and the result is stored, so
+    rules[member] is a single dictionary lookup. Configs are shared between
+    members, copy before modifying
+    """
+
+    def __init__(self, tree=None):
+        super().__init__()
+        self.empty = dict.fromkeys(queries)
+        if tree is None:
+            return
+        for mipEra, insts in tree['sources'].items():
+            for instId, srcs in insts.items():
+                for srcId, source in srcs.items():
+                    self.addSource(mipEra, instId, srcId, source.get('config'))
+
+    def addSource(self, mipEra, instId, srcId, entries):
+        """
+        Compile the config entries of a source, before any of its members
+        are looked up. Raises ValueError for an entry shape memberConfig
+        cannot apply, see configLevel
+        """
+        levels = [[], [], [], []]
+        for actId, exps in (entries or {}).items():
+            for expId, ripfs in exps.items():
+                for ripfId, entry in ripfs.items():
+                    level = configLevel(actId, expId, ripfId)
+                    if level is None:
+                        raise ValueError(
+                            '{} {} {}: config entry {}.{}.{} is not keyed '
+                            '(all, all, all), (actId, all, all), (actId, '
+                            'expId, all) or (actId, expId, ripfId)'.format(
+                                mipEra, instId, srcId, actId, expId, ripfId))
+                    if entry:
+                        levels[level].append((actId, expId, ripfId, entry))
+        srcKey = (mipEra, instId, srcId)
+        for rules in levels:
+            for actId, expId, ripfId, entry in rules:
+                key = srcKey + (actId, expId, ripfId)
+                config = dict(self[key])
+                config.update((qKey, val) for qKey, val in entry.items()
+                              if qKey in config)
+                self[key] = config
+
+    def __missing__(self, key):
+        actId, expId, ripfId = key[3:]
+        if ripfId != 'all':
+            parent = key[:5] + ('all',)
+        elif expId != 'all':
+            parent = key[:4] + ('all', 'all')
+        elif actId != 'all':
+            parent = key[:3] + ('all', 'all', 'all')
+        else:
+            # Source without config
+            return self.empty
+        config = self[parent]
+        self[key] = config
+        return config
+
+
+def memberConfig(tree, mipEra, instId, srcId, actId, expId, ripfId):
+    """
+
+    Parameters
+    ----------
+    tree : dict
+        sparse tree, see module docstring
+    mipEra, instId, srcId, actId, expId, ripfId : str
+        the member
+
+    Returns
+    -------
+    config : dict
+        {queryKey: value} for every queries key, the most specific config
+        entry wins (member, experiment, activity, then "all"), None where
+        the source has no value. Compiles the source's rules, use
+        ConfigRules to resolve many members
+
+    """
+    rules = ConfigRules()
+    rules.addSource(mipEra, instId, srcId,
+                    sourceInfo(tree, mipEra, instId, srcId).get('config'))
+    return dict(rules[mipEra, instId, srcId, actId, expId, ripfId])
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:00:00 2026
+
+Precompiled, era-specific parser for ESGF dataset ids (DRS). All patterns
+are compiled once at import and ids are split rather than matched, so the
+per-id cost is a few splits, dict lookups and two anchored prefix matches.
+Output is identical to the original readOceanMods.siftBits.
+
+Usage:
+    rec = parseId('CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.gn.v20190308|aims3.llnl.gov')
+    rec.srcId, rec.ripfId
+    recs = parseIds(ids)
+
+PJD 18 Oct 2026 - Started, from readOceanMods.siftBits/actRemap/instRemap
+PJD 18 Oct 2026 - actRemap and the CanCM4/CanESM2 no-table kludge are table
+                  driven (drsMappings.json), exact dict + prefix trie
+PJD 18 Oct 2026 - Add datasetKey and versionKey for replica/version dedup
+PJD 18 Oct 2026 - Truncated ids (too few components, no |node) raise DrsError
+PJD 18 Oct 2026 - instAliases read from drsMappings.json; checkIds flags
+                  instId/srcId/expId unknown to a local CMIP6_CVs copy
+PJD 18 Oct 2026 - loadCVs(required=True) raises FileNotFoundError when a
+                  CV file is missing, validation is never silently off
+
+@author: durack1
+"""
+
+import collections
+import json
+import os
+import re
+
+moduleDir = os.path.dirname(os.path.abspath(__file__))
+
+# %% Compact record, unpacks as the siftBits tuple
+DrsRecord = collections.namedtuple('DrsRecord', [
+    'mipEra', 'actId', 'instId', 'srcId', 'expId', 'ripfId', 'tabId', 'varId',
+    'gridId', 'verId', 'nodeId'])
+
+
+class DrsError(ValueError):
+    """Dataset id failing mipEra, ripfId or verId validation, or truncated"""
+
+
+# %% Validation patterns by mipEra
+mipTest = re.compile(r'^CMIP\d{1}')
+ripfTests = {'CMIP6': re.compile(r'^r\d{1,4}i\d{1,4}p\d{1,3}f\d{1,3}'),
+             'CMIP5': re.compile(r'^r\d{1,2}i\d{1,2}p\d{1,3}'),
+             'CMIP3': re.compile(r'^run\d{1}')}
+verTests = {'CMIP6': re.compile(r'^v\d{8}'),
+            'CMIP5': re.compile(r'^v\d{1,8}'),
+            'CMIP3': re.compile(r'^v\d{1}')}
+verDigits = re.compile(r'^v(\d+)')
+# Fewest id components by mipEra, CMIP5 no-table ids have 9
+minParts = {'CMIP6': 10, 'CMIP5': 9, 'CMIP3': 9}
+
+# %% Experiment > activity, no-table and institution alias mappings, see
+# loadMappings
+mappingFile = os.path.join(moduleDir, 'drsMappings.json')
+actExact = {}
+actTries = {}
+noTableExps = {}
+instAliases = {}
+
+# %% CMIP6_CVs lookup tables (github.com/WCRP-CMIP/CMIP6_CVs checkout, not
+# shipped), see loadCVs; loadCVs(required=True) fails on a missing CV file
+cvDir = os.environ.get('CMIP6_CVS', os.path.join(moduleDir, '..',
+                                                 'CMIP6_CVs'))
+cvNames = {'instId': 'institution_id', 'srcId': 'source_id',
+           'expId': 'experiment_id'}
+cvTables = {}
+cvFiles = {}
+
+_actCache = {}
+_checkCache = {}
+
+
+# %% functions
+def buildTrie(prefixes):
+    """
+
+    Parameters
+    ----------
+    prefixes : dict
+        prefix > value, '#' in a prefix matches any digit
+
+    Returns
+    -------
+    trie : dict
+        nested {char: node} nodes, a node's value is stored under None
+
+    """
+    trie = {}
+    for prefix, value in prefixes.items():
+        nodes = [trie]
+        for char in prefix:
+            chars = '0123456789' if char == '#' else char
+            nodes = [node.setdefault(charN, {}) for node in nodes
+                     for charN in chars]
+        for node in nodes:
+            node[None] = value
+    return trie
+
+
+def matchTrie(trie, key):
+    """
+    Return the value of the longest prefix of key in trie, None if no
+    prefix (or a null-valued one) matches
+    """
+    value = None
+    node = trie
+    for char in key:
+        node = node.get(char)
+        if node is None:
+            break
+        if None in node:
+            value = node[None]
+    return value
+
+
+def loadMappings(fileName=None):
+    """
+    Load experiment > activity rules, no-table experiments and institution
+    aliases into actExact, actTries, noTableExps and instAliases
+
+    Parameters
+    ----------
+    fileName : str, optional
+        mapping file. The default is drsMappings.json beside this module.
+
+    """
+    with open(fileName or mappingFile) as f:
+        mappings = json.load(f)
+    actExact.clear()
+    actTries.clear()
+    noTableExps.clear()
+    instAliases.clear()
+    _actCache.clear()
+    _checkCache.clear()
+    for mipEra, rules in mappings.items():
+        if mipEra.startswith('_') or mipEra in ['noTable', 'instAliases']:
+            continue
+        actExact[mipEra] = dict(rules.get('exact', {}))
+        actTries[mipEra] = buildTrie(rules.get('prefix', {}))
+    for instId, srcs in mappings.get('noTable', {}).items():
+        for srcId, vers in srcs.items():
+            for verId, exps in vers.items():
+                noTableExps[(instId, srcId, verId)] = frozenset(exps)
+    instAliases.update(mappings.get('instAliases', {}))
+
+
+def loadCVs(cvPath=None, required=False):
+    """
+
+    Parameters
+    ----------
+    cvPath : str, optional
+        CMIP6_CVs directory. The default is cvDir ($CMIP6_CVS or a
+        CMIP6_CVs checkout beside src).
+    required : bool, optional
+        raise FileNotFoundError if any CMIP6_<name>.json file is missing or
+        unreadable. The default is False (skipped, cvFiles value None).
+
+    Returns
+    -------
+    fields : list
+        fields with a loaded CV (cvTables keys)
+
+    """
+    cvTables.clear()
+    cvFiles.clear()
+    _checkCache.clear()
+    for field, name in cvNames.items():
+        fileName = os.path.join(cvPath or cvDir, 'CMIP6_{}.json'.format(name))
+        cvFiles[field] = None
+        try:
+            with open(fileName) as f:
+                cvTables[field] = frozenset(json.load(f)[name])
+        except (OSError, ValueError, KeyError):
+            continue
+        cvFiles[field] = fileName
+    missing = [cvNames[field] for field, fileName in cvFiles.items()
+               if fileName is None]
+    if required and missing:
+        raise FileNotFoundError(
+            'CMIP6_CVs {} not found in {} (set CMIP6_CVS to a '
+            'github.com/WCRP-CMIP/CMIP6_CVs checkout)'.format(
+                ', '.join(missing), cvPath or cvDir))
+    return sorted(cvTables)
+
+
+def actRemap(mipEra, actId, expId):
+    """
+
+    Parameters
+    ----------
+    mipEra : str
+        CMIP6, CMIP5 or CMIP3
+    actId : str
+        activity id from the dataset id or harvest query
+    expId : str
+        experiment id
+
+    Returns
+    -------
+    actId : str
+        CMIP6-equivalent activity id for CMIP5/CMIP3 experiments, unchanged
+        for CMIP6
+
+    """
+    # Few distinct experiments, remap each once
+    key = (mipEra, actId, expId)
+    if key in _actCache:
+        return _actCache[key]
+    for era in ['CMIP5', 'CMIP3']:
+        if era in mipEra:
+            actIdT = actExact[era].get(expId)
+            if actIdT is None:
+                actIdT = matchTrie(actTries[era], expId)
+            if actIdT is not None:
+                actId = actIdT
+            break
+    _actCache[key] = actId
+
+    return actId
+
+
+def checkIds(mipEra, instId, srcId, expId):
+    """
+
+    Parameters
+    ----------
+    mipEra, instId, srcId, expId : str
+        parsed (aliased) ids, e.g. from a DrsRecord
+
+    Returns
+    -------
+    unknown : tuple
+        (field, value) pairs missing from CMIP6_CVs: instId for every
+        mipEra (a CMIP5/CMIP3 institute without an alias), srcId and expId
+        for CMIP6; CVs load on first use
+
+    """
+    key = (mipEra, instId, srcId, expId)
+    unknown = _checkCache.get(key)
+    if unknown is not None:
+        return unknown
+    if not cvFiles:
+        loadCVs()
+    values = {'instId': instId, 'srcId': srcId, 'expId': expId}
+    fields = ['instId', 'srcId', 'expId'] if 'CMIP6' in mipEra else ['instId']
+    unknown = tuple((field, values[field]) for field in fields
+                    if field in cvTables and values[field] not in
+                    cvTables[field])
+    _checkCache[key] = unknown
+
+    return unknown
+
+
+def instRemap(instId):
+    """
+
+    Parameters
+    ----------
+    instId : str
+        institution id from the dataset id
+
+    Returns
+    -------
+    instId : str
+        CMIP6 institution_id alias (instAliases), unchanged otherwise
+
+    """
+    return instAliases.get(instId, instId)
+
+
+def parseId(tmpId):
+    """
+
+    Parameters
+    ----------
+    tmpId : str
+        dataset id, e.g.
+        CMIP6.ScenarioMIP.NCAR.CESM2-WACCM.ssp126.r1i1p1f1.Oday.tos.gn.v20190815|esgf-data3.ceda.ac.uk
+        cmip5.output1.NOAA-GFDL.GFDL-ESM2M.historicalMisc.day.ocean.day.r1i1p3.v20110601|aims3.llnl.gov
+        cmip3.GFDL.gfdl_cm2_0.historical.mon.ocean.run3.tos.v1|aims3.llnl.gov
+
+    Returns
+    -------
+    rec : DrsRecord
+        (mipEra, actId, instId, srcId, expId, ripfId, tabId, varId, gridId,
+         verId, nodeId), varId is None for CMIP5, gridId for CMIP5/3
+
+    Raises
+    ------
+    DrsError
+        invalid mipEra, ripfId or verId, or a truncated id
+
+    """
+    docId = tmpId.split('|')
+    modId = docId[0].split('.')
+    mipEra = modId[0].upper()
+    if not mipTest.match(mipEra):
+        raise DrsError('mipEra format invalid - mipTest: {}'.format(mipEra))
+    if len(docId) < 2:
+        raise DrsError('nodeId missing - no |node: {}'.format(tmpId))
+    for era, parts in minParts.items():
+        if era in mipEra and len(modId) < parts:
+            raise DrsError('id truncated - {} of {} components: {}'.format(
+                len(modId), parts, docId[0]))
+    # Parse dependent on mipEra indexes
+    if 'CMIP6' in mipEra:
+        era = 'CMIP6'
+        actId = modId[1]
+        instId = modId[2]
+        srcId = modId[3]
+        expId = modId[4]
+        ripfId = modId[5]
+        tabId = modId[6]
+        varId = modId[7]
+        gridId = modId[8]
+    elif 'CMIP5' in mipEra:
+        era = 'CMIP5'
+        instId = modId[2]
+        srcId = modId[3]
+        expId = modId[4]
+        actId = actRemap(mipEra, 'CMIP', expId)
+        # Kludge - poor indexes, missing tableId
+        if expId in noTableExps.get((instId, srcId, modId[-1]), ()):
+            ripfId = modId[7]
+        else:
+            ripfId = modId[8]
+        tabId = '.'.join([modId[6], modId[5]])
+        varId = None  # solr scrape was 'tos'
+        gridId = None
+    elif 'CMIP3' in mipEra:
+        era = 'CMIP3'
+        instId = modId[1]
+        # Kludge for wrong instId
+        if instId in 'CSIRO-QCCCE':
+            instId = 'CSIRO'
+        srcId = modId[2]
+        expId = modId[3]
+        actId = actRemap(mipEra, 'CMIP', expId)
+        ripfId = modId[6]
+        tabId = '.'.join([modId[5], modId[4]])
+        varId = modId[7]
+        gridId = None
+    else:
+        raise DrsError('mipEra unsupported: {}'.format(mipEra))
+    verId = modId[-1]
+    nodeId = docId[1]
+    if not ripfTests[era].match(ripfId):
+        raise DrsError('ripfId format invalid - ripfTest: {}'.format(ripfId))
+    if not verTests[era].match(verId):
+        raise DrsError('verId format invalid - verTest: {}'.format(verId))
+
+    return DrsRecord(mipEra, actId, instRemap(instId), srcId, expId, ripfId,
+                     tabId, varId, gridId, verId, nodeId)
+
+
+def datasetKey(tmpId):
+    """
+    Return tmpId without its |node suffix and version, the key shared by
+    every replica and version of a dataset
+    """
+    return tmpId.split('|', 1)[0].rsplit('.', 1)[0]
+
+
+def versionKey(verId):
+    """
+    Sort key for verId, numeric so v10 > v9 and v20190308 > v1
+    """
+    match = verDigits.match(verId)
+    return (int(match.group(1)) if match else -1, verId)
+
+
+def parseIds(ids):
+    """
+
+    Parameters
+    ----------
+    ids : iterable
+        dataset ids
+
+    Returns
+    -------
+    recs : list
+        DrsRecord per id, see parseId
+
+    """
+    return [parseId(tmpId) for tmpId in ids]
+
+
+loadMappings()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:00:00 2026
+
+Content-addressed on-disk cache for ESGF Solr responses. Entries are keyed
+by the normalized query url (parameters sorted, shard list dropped), stored
+gzip-compressed, expire after a per-entry TTL and are evicted least recently
+used first once the cache exceeds its size bound. Bodies are written and
+read as streams, so caching adds no memory over the incremental parse.
+Entries can carry info (e.g. the harvest walk and numFound a page was
+fetched with), so multi-page queries are only served when all their pages
+come from the same walk, see esgfQueryModels.iter_dataset_docs.
+
+PJD 18 Oct 2026 - Started
+PJD 18 Oct 2026 - Entry info (CacheWriter.commit(info), info(url)); get
+                  opens the entry so later eviction cannot truncate it
+
+@author: durack1
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+#%%
+CACHE_TTL = 43200  # seconds, a daily harvest always refetches
+CACHE_MAX_BYTES = 1 << 30
+CACHE_CHUNK_SIZE = 1 << 16
+
+
+def normalize_url(url):
+    """
+    Parameters
+    ----------
+    url : str
+        request url
+
+    Returns
+    -------
+    normUrl : str
+        url with query parameters sorted and the volatile shards list
+        dropped, equal queries map to the same key
+
+    """
+    parts = urllib.parse.urlsplit(url)
+    params = [(key, val) for key, val in
+              urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+              if key != 'shards']
+    query = urllib.parse.urlencode(sorted(params))
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc.lower(),
+                                    parts.path, query, ''))
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of compressed response bodies with per-entry
+    TTL, see module docstring. Safe to share between harvest threads.
+    """
+
+    def __init__(self, cache_dir, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.index_file) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def key(self, url):
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.gz')
+
+    def get(self, url):
+        """
+        Parameters
+        ----------
+        url : str
+            request url
+
+        Returns
+        -------
+        chunks : generator or None
+            decompressed body chunks of a live entry, None on a miss
+
+        """
+        key = self.key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None or time.time() > entry['expires']:
+                self.misses += 1
+                return None
+            try:
+                # Opened now, an entry evicted before it is read stays whole
+                f = gzip.open(self.path(key), 'rb')
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            entry['accessed'] = time.time()
+            self.hits += 1
+        return self._read(f)
+
+    def info(self, url):
+        """
+        Return the info committed with a live entry ({} if none), None on a
+        miss; not counted as a hit or miss
+        """
+        with self.lock:
+            entry = self.index.get(self.key(url))
+            if entry is None or time.time() > entry['expires']:
+                return None
+            return entry.get('info', {})
+
+    def _read(self, f):
+        with f:
+            while True:
+                chunk = f.read(CACHE_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def writer(self, url, ttl=None):
+        """
+        Parameters
+        ----------
+        url : str
+            request url
+        ttl : float, optional
+            entry lifetime in seconds. The default is the cache ttl.
+
+        Returns
+        -------
+        writer : CacheWriter
+            write() body chunks then commit(); an uncommitted entry (failed
+            or partial transfer) is discarded by abort()
+
+        """
+        return CacheWriter(self, self.key(url), url,
+                           self.ttl if ttl is None else ttl)
+
+    def _commit(self, key, url, tmpPath, ttl, info):
+        size = os.path.getsize(tmpPath)
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        os.replace(tmpPath, self.path(key))
+        timeNow = time.time()
+        with self.lock:
+            self.index[key] = {'url': normalize_url(url), 'size': size,
+                               'created': timeNow, 'accessed': timeNow,
+                               'expires': timeNow + ttl}
+            if info:
+                self.index[key]['info'] = info
+            self._evict()
+            self._save()
+
+    def _evict(self):
+        # Expired entries first, then least recently used over max_bytes
+        timeNow = time.time()
+        for key in [key for key, entry in self.index.items()
+                    if timeNow > entry['expires']]:
+            self._remove(key)
+        total = sum(entry['size'] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda key:
+                          self.index[key]['accessed']):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]['size']
+            self._remove(key)
+
+    def _remove(self, key):
+        self.index.pop(key, None)
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _save(self):
+        tmpFile = '.'.join([self.index_file, str(os.getpid()),
+                            str(threading.get_ident()), 'tmp'])
+        with open(tmpFile, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmpFile, self.index_file)
+
+    def invalidate(self, url=None):
+        """
+        Drop the entry for url, or every entry if url is None
+        """
+        with self.lock:
+            keys = list(self.index) if url is None else [self.key(url)]
+            for key in keys:
+                self._remove(key)
+            self._save()
+
+    def close(self):
+        """
+        Persist access times (LRU order) for the next run
+        """
+        with self.lock:
+            self._save()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.index), 'hits': self.hits,
+                    'misses': self.misses,
+                    'bytes': sum(entry['size']
+                                 for entry in self.index.values())}
+
+
+class CacheWriter:
+    """Streams a response body into a compressed temporary entry"""
+
+    def __init__(self, cache, key, url, ttl):
+        self.cache = cache
+        self.key = key
+        self.url = url
+        self.ttl = ttl
+        self.tmpPath = '.'.join([cache.path(key), str(os.getpid()),
+                                 str(threading.get_ident()), 'tmp'])
+        os.makedirs(os.path.dirname(self.tmpPath), exist_ok=True)
+        self.f = gzip.open(self.tmpPath, 'wb', compresslevel=6)
+
+    def write(self, chunk):
+        self.f.write(chunk)
+
+    def commit(self, info=None):
+        """
+        Move the entry into place, info (json serializable dict) is stored
+        with it, see ResponseCache.info
+        """
+        self.f.close()
+        self.cache._commit(self.key, self.url, self.tmpPath, self.ttl, info)
+
+    def abort(self):
+        self.f.close()
+        try:
+            os.remove(self.tmpPath)
+        except FileNotFoundError:
+            pass
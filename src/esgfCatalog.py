@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:00:00 2026
+
+Columnar catalog of parsed dataset ids, one row per dataset (drsParser
+DrsRecord fields). Each column is dictionary-encoded: an int32 code array
+plus its vocabulary, None is code -1. Filtering, grouping and counting are
+vectorized NumPy operations over the codes, and catalogs persist as a
+single .npz file (no pickles).
+
+Usage:
+    cat = Catalog.load('../CMIP_ESGF-Catalog.npz')
+    cat.count_by('mipEra', 'instId')
+    cat.count_unique(['mipEra', 'srcId'], 'ripfId', expId='historical')
+
+    python esgfCatalog.py ../CMIP_ESGF-Catalog.npz --by mipEra srcId --unique ripfId --where actId=CMIP
+
+PJD 18 Oct 2026 - Started
+
+@author: durack1
+"""
+
+import argparse
+import array
+import numpy as np
+from drsParser import DrsRecord
+
+#%%
+CATALOG_COLUMNS = list(DrsRecord._fields)
+
+
+class CatalogBuilder:
+    """
+    Appends rows, encoding each column against a growing vocabulary
+    """
+
+    def __init__(self, columns=CATALOG_COLUMNS):
+        self.columns = list(columns)
+        self.lookup = {col: {} for col in self.columns}
+        self.vocab = {col: [] for col in self.columns}
+        self.codes = {col: array.array('i') for col in self.columns}
+
+    def append(self, rec):
+        """
+        Parameters
+        ----------
+        rec : sequence
+            row values in column order, e.g. a DrsRecord
+        """
+        for col, val in zip(self.columns, rec):
+            if val is None:
+                self.codes[col].append(-1)
+                continue
+            lookup = self.lookup[col]
+            code = lookup.get(val)
+            if code is None:
+                code = lookup[val] = len(self.vocab[col])
+                self.vocab[col].append(val)
+            self.codes[col].append(code)
+
+    def extend(self, recs):
+        for rec in recs:
+            self.append(rec)
+
+    def build(self):
+        """
+        Returns
+        -------
+        cat : Catalog
+        """
+        return Catalog({col: np.frombuffer(self.codes[col], dtype=np.int32)
+                        .copy() for col in self.columns},
+                       {col: np.array(self.vocab[col], dtype=str)
+                        for col in self.columns}, self.columns)
+
+
+class Catalog:
+    """
+    Dictionary-encoded dataset rows, see module docstring
+    """
+
+    def __init__(self, codes, vocab, columns=CATALOG_COLUMNS):
+        self.columns = list(columns)
+        self.codes = codes
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.codes[self.columns[0]]) if self.columns else 0
+
+    # %% Persistence
+    def save(self, fileName):
+        """
+        Write codes and vocabularies to fileName (.npz, compressed)
+        """
+        arrays = {'columns': np.array(self.columns, dtype=str)}
+        for col in self.columns:
+            arrays['codes_' + col] = self.codes[col]
+            arrays['vocab_' + col] = self.vocab[col]
+        with open(fileName, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, fileName):
+        with np.load(fileName, allow_pickle=False) as npz:
+            columns = [str(col) for col in npz['columns']]
+            return cls({col: npz['codes_' + col] for col in columns},
+                       {col: npz['vocab_' + col] for col in columns},
+                       columns)
+
+    @classmethod
+    def concat(cls, catalogs):
+        """
+        Parameters
+        ----------
+        catalogs : list
+            Catalogs with the same columns, e.g. one per harvest file
+
+        Returns
+        -------
+        cat : Catalog
+            rows of all catalogs in order, over merged vocabularies
+
+        """
+        catalogs = [cat for cat in catalogs if cat is not None]
+        columns = catalogs[0].columns if catalogs else CATALOG_COLUMNS
+        codes = {}
+        vocab = {}
+        for col in columns:
+            merged = np.unique(np.concatenate(
+                [cat.vocab[col] for cat in catalogs] +
+                [np.array([], dtype=str)]))
+            parts = []
+            for cat in catalogs:
+                # Old code > new code, -1 (None) stays -1
+                remap = np.append(np.searchsorted(merged, cat.vocab[col]),
+                                  -1).astype(np.int32)
+                parts.append(remap[cat.codes[col]])
+            codes[col] = np.concatenate(parts + [np.array([], np.int32)])
+            vocab[col] = merged
+        return cls(codes, vocab, columns)
+
+    # %% Access
+    def column(self, col, mask=None):
+        """
+        Decoded values of col (object array, None for missing)
+        """
+        codes = self.codes[col] if mask is None else self.codes[col][mask]
+        values = np.append(self.vocab[col].astype(object), None)
+        return values[codes]
+
+    def mask(self, **filters):
+        """
+        Parameters
+        ----------
+        filters : str or list
+            column=value or column=[values], None matches missing values
+
+        Returns
+        -------
+        mask : numpy.ndarray
+            boolean row mask, all filters applied
+
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for col, values in filters.items():
+            if isinstance(values, str) or values is None:
+                values = [values]
+            vocabIndex = {val: code for code, val in
+                          enumerate(self.vocab[col].tolist())}
+            wanted = [vocabIndex.get(val, -2) if val is not None else -1
+                      for val in values]
+            mask &= np.isin(self.codes[col], wanted)
+        return mask
+
+    def filter(self, **filters):
+        """
+        Returns
+        -------
+        cat : Catalog
+            rows matching all filters, see mask (vocabularies are shared)
+
+        """
+        mask = self.mask(**filters)
+        return Catalog({col: self.codes[col][mask] for col in self.columns},
+                       self.vocab, self.columns)
+
+    def _groups(self, cols, mask):
+        # Distinct code rows over cols and their row counts
+        stacked = np.stack([self.codes[col][mask] for col in cols], axis=1)
+        return np.unique(stacked.reshape(-1, len(cols)), axis=0,
+                         return_counts=True)
+
+    def _decode(self, cols, rows):
+        return [tuple(None if code < 0 else str(self.vocab[col][code])
+                      for col, code in zip(cols, row))
+                for row in rows.tolist()]
+
+    def count_by(self, *cols, **filters):
+        """
+        Parameters
+        ----------
+        cols : str
+            grouping columns
+        filters : str or list
+            row filters, see mask
+
+        Returns
+        -------
+        counts : dict
+            {(value, ...): rows} per group
+
+        """
+        rows, counts = self._groups(cols, self.mask(**filters))
+        return dict(zip(self._decode(cols, rows), counts.tolist()))
+
+    def count_unique(self, cols, countCol, **filters):
+        """
+        Parameters
+        ----------
+        cols : list
+            grouping columns
+        countCol : str
+            column whose distinct values are counted, e.g. 'ripfId' for
+            members per source
+        filters : str or list
+            row filters, see mask
+
+        Returns
+        -------
+        counts : dict
+            {(value, ...): distinct countCol values} per group
+
+        """
+        cols = list(cols)
+        rows, _ = self._groups(cols + [countCol], self.mask(**filters))
+        # Distinct (group, value) rows are sorted, count them per group
+        groups, counts = np.unique(rows[:, :-1], axis=0, return_counts=True)
+        return dict(zip(self._decode(cols, groups), counts.tolist()))
+
+
+#%%
+def main():
+
+    parser = argparse.ArgumentParser(description="Group and count a dataset catalog")
+    parser.add_argument("catalog", help="Catalog file (readOceanMods --catalog)")
+    parser.add_argument("--by", "-b", dest="by", nargs="+", default=["mipEra"], help="Grouping columns (default is mipEra), from {}".format(", ".join(CATALOG_COLUMNS)))
+    parser.add_argument("--unique", "-u", dest="unique", type=str, default=None, help="Count distinct values of this column, e.g. ripfId for members (default counts datasets)")
+    parser.add_argument("--where", "-w", dest="where", nargs="*", default=[], help="Row filters column=value[,value]")
+    args = parser.parse_args()
+
+    cat = Catalog.load(args.catalog)
+    filters = {}
+    for where in args.where:
+        col, _, values = where.partition('=')
+        filters[col] = values.split(',')
+    if args.unique:
+        counts = cat.count_unique(args.by, args.unique, **filters)
+    else:
+        counts = cat.count_by(*args.by, **filters)
+    print('rows:', len(cat), 'groups:', len(counts))
+    for key in sorted(counts, key=lambda key: [str(val) for val in key]):
+        print('\t'.join([str(val) for val in key] + [str(counts[key])]))
+
+    return counts
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:00:00 2026
+
+Change log between two harvest snapshots. A snapshot is a getOceanMods day
+directory (../YYMMDD, *_ESGF-Datasets files) or a readOceanMods replica map
+(CMIP_ESGF-Replicas.json); both reduce to the latest non-retracted version
+of every dataset (the latest, if all are retracted), grouped by member
+(mipEra, instId, srcId, actId, expId, ripfId). Set operations over those
+keys give:
+
+    added       members new in the later snapshot
+    removed     members no longer published
+    retracted   {member: [dataset, ...]} datasets withdrawn (flagged
+                retracted, or gone without a newer version) from a member
+    versions    {member: {dataset: [oldVerId, newVerId]}} version changes
+
+Usage:
+    changes = diff_snapshots(load_snapshot('../261017'), load_snapshot('../261018'))
+    changed_sources(changes)
+
+    python esgfDiff.py ../261017 ../261018 --out ../CMIP_ESGF-Changes.json
+
+PJD 18 Oct 2026 - Started
+PJD 18 Oct 2026 - load_snapshot keeps the latest non-retracted version, a
+                  dataset is retracted only if every version is
+
+@author: durack1
+"""
+
+import argparse
+import json
+import os
+from drsParser import DrsError, datasetKey, parseId, versionKey
+from esgfSnapshot import iter_snapshot_docs, snapshot_format
+
+#%%
+CHANGE_KEYS = ['added', 'removed', 'retracted', 'versions']
+
+
+def member_id(rec):
+    """
+    Return the dotted tree path of a DrsRecord's member, e.g.
+    'CMIP6.NCAR.CESM2.CMIP.historical.r1i1p1f1'
+    """
+    return '.'.join([rec.mipEra, rec.instId, rec.srcId, rec.actId, rec.expId,
+                     rec.ripfId])
+
+
+def _iter_snapshot_ids(path):
+    # (id, retracted) of a day directory or replica map
+    if os.path.isdir(path):
+        for fileName in sorted(os.listdir(path)):
+            if 'ESGF-Datasets' not in fileName or \
+                    snapshot_format(fileName) is None:
+                continue
+            for doc in iter_snapshot_docs(os.path.join(path, fileName)):
+                yield doc['id'], doc.get('retracted') is True
+        return
+    with open(path) as jsonFile:
+        replicas = json.load(jsonFile)
+    for key, entry in replicas.items():
+        for nodeId in entry['nodes']:
+            yield '{}.{}|{}'.format(key, entry['verId'], nodeId), False
+
+
+def load_snapshot(path):
+    """
+
+    Parameters
+    ----------
+    path : str
+        day directory (../YYMMDD) or replica map (CMIP_ESGF-Replicas.json)
+
+    Returns
+    -------
+    snapshot : dict
+        {datasetKey: [memberId, verId, retracted]} latest version per
+        dataset that is not retracted (a version is retracted if every doc
+        of it is flagged); the latest version, retracted, if all versions
+        are (invalid ids are skipped)
+
+    """
+    versions = {}
+    invalid = 0
+    for tmpId, retracted in _iter_snapshot_ids(path):
+        try:
+            rec = parseId(tmpId)
+        except DrsError:
+            invalid += 1
+            continue
+        vers = versions.setdefault(datasetKey(tmpId), {})
+        entry = vers.get(rec.verId)
+        if entry is None:
+            vers[rec.verId] = [member_id(rec), retracted]
+        else:
+            entry[1] = entry[1] and retracted
+    snapshot = {}
+    for key, vers in versions.items():
+        live = [verId for verId, entry in vers.items() if not entry[1]]
+        verId = max(live or vers, key=versionKey)
+        snapshot[key] = [vers[verId][0], verId, not live]
+    print('load_snapshot:', path, 'datasets:', len(snapshot),
+          'invalid ids skipped:', invalid)
+    return snapshot
+
+
+def _by_member(snapshot, retracted=False):
+    # {memberId: {datasetKey: verId}} of live (or retracted) datasets
+    members = {}
+    for key, entry in snapshot.items():
+        if entry[2] != retracted:
+            continue
+        members.setdefault(entry[0], {})[key] = entry[1]
+    return members
+
+
+def diff_snapshots(old, new):
+    """
+
+    Parameters
+    ----------
+    old, new : dict
+        snapshots, see load_snapshot
+
+    Returns
+    -------
+    changes : dict
+        added, removed, retracted and versions (see module docstring) and
+        a summary of their counts
+
+    """
+    oldMembers = _by_member(old)
+    newMembers = _by_member(new)
+    newRetracted = _by_member(new, retracted=True)
+    changes = {'added': sorted(newMembers.keys() - oldMembers.keys()),
+               'removed': [], 'retracted': {}, 'versions': {}}
+    for memberId in oldMembers.keys() - newMembers.keys():
+        # Fully withdrawn, retracted if flagged, otherwise unpublished
+        if memberId in newRetracted:
+            changes['retracted'][memberId] = sorted(oldMembers[memberId])
+        else:
+            changes['removed'].append(memberId)
+    changes['removed'].sort()
+    for memberId in oldMembers.keys() & newMembers.keys():
+        oldSets = oldMembers[memberId]
+        newSets = newMembers[memberId]
+        withdrawn = oldSets.keys() - newSets.keys()
+        if withdrawn:
+            changes['retracted'][memberId] = sorted(withdrawn)
+        bumps = {key: [oldSets[key], newSets[key]]
+                 for key in oldSets.keys() & newSets.keys()
+                 if oldSets[key] != newSets[key]}
+        if bumps:
+            changes['versions'][memberId] = bumps
+    changes['summary'] = {key: len(changes[key]) for key in CHANGE_KEYS}
+    changes['summary']['datasetVersions'] = sum(
+        len(bumps) for bumps in changes['versions'].values())
+    return changes
+
+
+def changed_sources(changes):
+    """
+    Return the (mipEra, instId, srcId) of every changed member, the sources
+    downstream stages need to refresh
+    """
+    sources = set()
+    for key in CHANGE_KEYS:
+        for memberId in changes[key]:
+            sources.add(tuple(memberId.split('.')[:3]))
+    return sources
+
+
+#%%
+def main():
+
+    parser = argparse.ArgumentParser(description="Change log between two harvest snapshots")
+    parser.add_argument("old", help="Earlier snapshot, a day directory (../YYMMDD) or CMIP_ESGF-Replicas.json")
+    parser.add_argument("new", help="Later snapshot, a day directory (../YYMMDD) or CMIP_ESGF-Replicas.json")
+    parser.add_argument("--out", "-o", dest="out", type=str, default=None, help="Write the change log to this json file (default prints the summary only)")
+    args = parser.parse_args()
+
+    changes = diff_snapshots(load_snapshot(args.old), load_snapshot(args.new))
+    changes['old'] = args.old
+    changes['new'] = args.new
+    print('summary:', changes['summary'])
+    print('sources changed:', len(changed_sources(changes)))
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as outJson:
+            json.dump(changes, outJson, ensure_ascii=False, indent=4,
+                      sort_keys=True)
+        print('outFile:', args.out)
+
+    return changes
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:00:00 2026
+
+SQLite index of parsed dataset ids, one datasets row per id (drsParser
+DrsRecord fields) plus a variables row per variable the dataset holds. The
+DRS components are indexed, so facet questions (nodes serving a source,
+sources with one variable but not another, a member's version history) are
+single indexed queries rather than a re-parse of the day's harvest.
+
+Usage:
+    index = DatasetIndex('../CMIP_ESGF-Index.sqlite')
+    index.nodes('CESM2')
+    index.sources(['thetao'], lacks=['so'], mipEra='CMIP6')
+    index.versions('CESM2', 'historical', 'r1i1p1f1')
+
+    python esgfIndex.py ../CMIP_ESGF-Index.sqlite nodes CESM2
+    python esgfIndex.py ../CMIP_ESGF-Index.sqlite sources thetao --lacks so
+    python esgfIndex.py ../CMIP_ESGF-Index.sqlite versions CESM2 historical r1i1p1f1
+    python esgfIndex.py ../CMIP_ESGF-Index.sqlite --where actId=CMIP count --by mipEra srcId
+
+PJD 18 Oct 2026 - Started
+
+@author: durack1
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from drsParser import DrsRecord
+
+#%%
+INDEX_COLUMNS = list(DrsRecord._fields)
+INDEX_SCHEMA = [
+    'CREATE TABLE datasets (id INTEGER PRIMARY KEY, {})'.format(
+        ', '.join('{} TEXT'.format(col) for col in INDEX_COLUMNS)),
+    'CREATE TABLE variables (dataset INTEGER NOT NULL, varId TEXT NOT NULL)',
+    'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)']
+# Created after the bulk load, name > (table, columns)
+INDEX_INDEXES = {
+    'datasets_member': ('datasets', ['srcId', 'expId', 'ripfId', 'mipEra']),
+    'datasets_inst': ('datasets', ['instId', 'srcId']),
+    'datasets_act': ('datasets', ['actId', 'expId']),
+    'datasets_exp': ('datasets', ['expId']),
+    'datasets_var': ('datasets', ['varId']),
+    'datasets_node': ('datasets', ['nodeId', 'srcId']),
+    'datasets_ver': ('datasets', ['verId']),
+    'variables_var': ('variables', ['varId', 'dataset']),
+    'variables_dataset': ('variables', ['dataset'])}
+
+
+def _check_columns(cols):
+    # Column names are interpolated into SQL, only allow DRS fields
+    for col in cols:
+        if col not in INDEX_COLUMNS:
+            raise ValueError('Unknown column: {}, expected one of {}'
+                             .format(col, INDEX_COLUMNS))
+
+
+def _where(filters, prefix='d.'):
+    """
+    Parameters
+    ----------
+    filters : str or list
+        column=value or column=[values], None matches missing values
+
+    Returns
+    -------
+    sql : str
+        WHERE clause ('' without filters)
+    params : list
+
+    """
+    _check_columns(filters)
+    clauses = []
+    params = []
+    for col, values in filters.items():
+        if isinstance(values, str) or values is None:
+            values = [values]
+        terms = []
+        values = list(values)
+        if None in values:
+            terms.append('{}{} IS NULL'.format(prefix, col))
+            values = [val for val in values if val is not None]
+        if values:
+            terms.append('{}{} IN ({})'.format(prefix, col,
+                                               ', '.join('?' * len(values))))
+            params.extend(values)
+        clauses.append('({})'.format(' OR '.join(terms)))
+    if not clauses:
+        return '', params
+    return ' WHERE ' + ' AND '.join(clauses), params
+
+
+class DatasetIndex:
+    """
+    Read (default) or build (create=True) a dataset index file. A build is
+    written to fileName.tmp and moved into place by commit()
+    """
+
+    def __init__(self, fileName, create=False):
+        self.fileName = fileName
+        self.count = 0
+        if create:
+            self.tmpFile = fileName + '.tmp'
+            if os.path.exists(self.tmpFile):
+                os.remove(self.tmpFile)
+            self.conn = sqlite3.connect(self.tmpFile)
+            # Bulk load, the file is only moved into place once complete
+            self.conn.execute('PRAGMA journal_mode = OFF')
+            self.conn.execute('PRAGMA synchronous = OFF')
+            for sql in INDEX_SCHEMA:
+                self.conn.execute(sql)
+        else:
+            self.tmpFile = None
+            if not os.path.exists(fileName):
+                raise FileNotFoundError(fileName)
+            self.conn = sqlite3.connect('file:{}?mode=ro'.format(fileName),
+                                        uri=True)
+
+    # %% Build
+    def add(self, rows):
+        """
+        Parameters
+        ----------
+        rows : iterable
+            (rec, variables) pairs, rec a DrsRecord (or sequence in
+            INDEX_COLUMNS order), variables the dataset's variable ids
+        """
+        datasets = []
+        variables = []
+        for rec, varIds in rows:
+            self.count += 1
+            datasets.append((self.count,) + tuple(rec))
+            variables.extend((self.count, varId) for varId in varIds or [])
+        self.conn.executemany('INSERT INTO datasets VALUES ({})'.format(
+            ', '.join('?' * (len(INDEX_COLUMNS) + 1))), datasets)
+        self.conn.executemany('INSERT INTO variables VALUES (?, ?)',
+                              variables)
+
+    def commit(self, **meta):
+        """
+        Create the indexes, store meta (e.g. source='261018') and move the
+        index into place
+
+        Returns
+        -------
+        fileName : str
+
+        """
+        for name, (table, cols) in INDEX_INDEXES.items():
+            self.conn.execute('CREATE INDEX {} ON {} ({})'.format(
+                name, table, ', '.join(cols)))
+        meta.setdefault('created', time.strftime('%Y-%m-%d %H:%M:%S'))
+        meta.setdefault('datasets', self.count)
+        self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                              [(key, str(val)) for key, val in meta.items()])
+        self.conn.execute('ANALYZE')
+        self.conn.commit()
+        self.conn.close()
+        os.replace(self.tmpFile, self.fileName)
+        return self.fileName
+
+    def abort(self):
+        self.conn.close()
+        try:
+            os.remove(self.tmpFile)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.conn.close()
+
+    # %% Queries
+    def query(self, sql, params=()):
+        """
+        Run any read-only SQL over the datasets/variables/meta tables
+        """
+        return self.conn.execute(sql, params).fetchall()
+
+    def meta(self):
+        return dict(self.query('SELECT key, value FROM meta'))
+
+    def __len__(self):
+        return self.query('SELECT COUNT(*) FROM datasets')[0][0]
+
+    def count_by(self, *cols, **filters):
+        """
+        Parameters
+        ----------
+        cols : str
+            grouping columns
+        filters : str or list
+            row filters, column=value or column=[values]
+
+        Returns
+        -------
+        counts : dict
+            {(value, ...): datasets} per group
+
+        """
+        _check_columns(cols)
+        where, params = _where(filters)
+        groupCols = ', '.join('d.' + col for col in cols)
+        rows = self.query('SELECT {0}, COUNT(*) FROM datasets d{1} GROUP BY '
+                          '{0}'.format(groupCols, where), params)
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def nodes(self, srcId, **filters):
+        """
+        Parameters
+        ----------
+        srcId : str
+            source_id (model)
+        filters : str or list
+            further row filters, e.g. mipEra='CMIP6'
+
+        Returns
+        -------
+        nodes : dict
+            {nodeId: datasets served} for srcId
+
+        """
+        filters['srcId'] = srcId
+        return {key[0]: count for key, count in
+                self.count_by('nodeId', **filters).items()}
+
+    def sources(self, has, lacks=None, **filters):
+        """
+        Parameters
+        ----------
+        has : list
+            variables a source must publish, e.g. ['thetao']
+        lacks : list, optional
+            variables a source must not publish, e.g. ['so']
+        filters : str or list
+            row filters applied to both, e.g. mipEra='CMIP6'
+
+        Returns
+        -------
+        sources : list
+            sorted (mipEra, srcId) pairs
+
+        """
+        where, params = _where(filters)
+        where = where + (' AND ' if where else ' WHERE ') + 'v.varId = ?'
+        select = ('SELECT DISTINCT d.mipEra, d.srcId FROM datasets d JOIN '
+                  'variables v ON v.dataset = d.id' + where)
+        sql = ' INTERSECT '.join([select] * len(has))
+        args = []
+        for varId in has:
+            args.extend(params + [varId])
+        for varId in lacks or []:
+            sql = ' '.join([sql, 'EXCEPT', select])
+            args.extend(params + [varId])
+        return sorted(self.query(sql + ' ORDER BY 1, 2', args))
+
+    def versions(self, srcId, expId, ripfId, **filters):
+        """
+        Parameters
+        ----------
+        srcId, expId, ripfId : str
+            the member
+        filters : str or list
+            further row filters, e.g. mipEra='CMIP6'
+
+        Returns
+        -------
+        versions : dict
+            {(tabId, varId, gridId): [(verId, nodes), ...]} oldest version
+            first, nodes the number of data nodes serving it
+
+        """
+        filters.update(srcId=srcId, expId=expId, ripfId=ripfId)
+        where, params = _where(filters)
+        rows = self.query('SELECT d.tabId, d.varId, d.gridId, d.verId, '
+                          'COUNT(DISTINCT d.nodeId) FROM datasets d{} GROUP BY '
+                          '1, 2, 3, 4 ORDER BY 1, 2, 3, 4'.format(where),
+                          params)
+        versions = {}
+        for tabId, varId, gridId, verId, nodes in rows:
+            versions.setdefault((tabId, varId, gridId), []).append(
+                (verId, nodes))
+        return versions
+
+
+#%%
+def main():
+
+    parser = argparse.ArgumentParser(description="Query a dataset index")
+    parser.add_argument("index", help="Index file (readOceanMods --index)")
+    parser.add_argument("--where", "-w", dest="where", action="append", default=[], help="Row filter column=value[,value], repeatable, from {}".format(", ".join(INDEX_COLUMNS)))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    nodesParser = subparsers.add_parser("nodes", help="Data nodes serving a source_id")
+    nodesParser.add_argument("srcId", help="source_id, e.g. CESM2")
+    sourcesParser = subparsers.add_parser("sources", help="Sources publishing all of the given variables")
+    sourcesParser.add_argument("has", nargs="+", help="Variables, e.g. thetao")
+    sourcesParser.add_argument("--lacks", "-l", dest="lacks", nargs="+", default=[], help="Variables the source must not publish, e.g. so")
+    versionsParser = subparsers.add_parser("versions", help="Version history of a member")
+    versionsParser.add_argument("srcId", help="source_id, e.g. CESM2")
+    versionsParser.add_argument("expId", help="experiment_id, e.g. historical")
+    versionsParser.add_argument("ripfId", help="member, e.g. r1i1p1f1")
+    countParser = subparsers.add_parser("count", help="Datasets per group")
+    countParser.add_argument("--by", "-b", dest="by", nargs="+", default=["mipEra"], help="Grouping columns (default is mipEra)")
+    args = parser.parse_args()
+
+    index = DatasetIndex(args.index)
+    filters = {}
+    for where in args.where:
+        col, _, values = where.partition('=')
+        filters[col] = values.split(',')
+    timeStart = time.time()
+    if args.command == 'nodes':
+        result = index.nodes(args.srcId, **filters)
+        lines = ['{}\t{}'.format(key, result[key]) for key in sorted(result)]
+    elif args.command == 'sources':
+        result = index.sources(args.has, args.lacks, **filters)
+        lines = ['\t'.join(row) for row in result]
+    elif args.command == 'versions':
+        result = index.versions(args.srcId, args.expId, args.ripfId, **filters)
+        lines = ['\t'.join([str(val) for val in key] + [verId, str(nodes)])
+                 for key, vers in sorted(result.items(), key=lambda item:
+                                         [str(val) for val in item[0]])
+                 for verId, nodes in vers]
+    else:
+        result = index.count_by(*args.by, **filters)
+        lines = ['\t'.join([str(val) for val in key] + [str(result[key])])
+                 for key in sorted(result, key=lambda key:
+                                   [str(val) for val in key])]
+    if lines:
+        print('\n'.join(lines))
+    print('rows:', len(lines), 'query time (ms):',
+          round((time.time() - timeStart) * 1000, 1))
+    index.close()
+
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,31 @@ Extract model information from CMIP6 project direct from ESGF API
 PJD 31 Mar 2021 - Started
 PJD  4 May 2021 - Finalized working version across CMIP6, 5, 3
                 TODO: Cleanup type checking (datetime)
+PJD 18 Oct 2026 - Add start/rows paginated harvest (iter_dataset_pages,
+                  iter_dataset_docs); rows=50000 silently truncated results
+PJD 18 Oct 2026 - Cache shard discovery in memory and on disk (TTL, explicit
+                  invalidation, last-known fallback when discovery fails)
+PJD 18 Oct 2026 - Pooled keep-alive session with gzip, bounded timeouts,
+                  jittered exponential retry and per-request transfer stats;
+                  ESGF_NODE env overrides the index node (local stand-ins)
+PJD 18 Oct 2026 - Add Solr fl= field projection (fields='id' preset or a
+                  named set of extra fields)
+PJD 18 Oct 2026 - Add facet.pivot tree harvest (get_facet_tree), rows=0 so
+                  no documents are retrieved
+PJD 18 Oct 2026 - Apply start_date/end_date as a _timestamp range filter,
+                  library defaults are now None (no filter) so incremental
+                  harvests can pass a high-water mark
+PJD 18 Oct 2026 - Stream response bodies through solrStream, docs and ids are
+                  yielded as bytes arrive (http_get_docs, iter_dataset_ids)
+PJD 18 Oct 2026 - Optional content-addressed response cache (esgfCache),
+                  enable_response_cache(refresh=True) forces refetches
+PJD 18 Oct 2026 - variable_id may be a list, queried in one OR-filtered pass
+                  and split per variable as docs stream (iter_variable_docs)
+PJD 18 Oct 2026 - CLI --start_date/--end_date default to None, the whole
+                  index is queried unless a _timestamp range is given
+PJD 18 Oct 2026 - Cached pages are tagged with their harvest walk, a query
+                  is served from the cache only if all of its pages come
+                  from one walk, otherwise every page is refetched
 
 @author: durack1
 """
@@ -16,7 +41,15 @@ import argparse
 import datetime
 import json
 import os
+import random
+import threading
+import time
+import urllib.parse
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from esgfCache import CACHE_MAX_BYTES, CACHE_TTL, ResponseCache
+from solrStream import iterStreamDocs
 
 #%%
 timeNow = datetime.datetime.now()
@@ -24,52 +57,578 @@ timeFormat = timeNow.strftime('%y%m%d')
 timeFormatY = timeNow.strftime('%Y-%m-%d')
 
 #%%
-def get_solr_query_url():
-    search_url = 'https://esgf-node.llnl.gov/esg-search/search/' \
-                 '?limit=0&format=application%2Fsolr%2Bjson'
+# Solr window size for paginated harvests, results are no longer capped
+PAGE_SIZE = 10000
+# Solr fl= projections; None returns full documents
+FIELD_PRESETS = {'all': None,
+                 'id': ['id'],
+                 'drs': ['id', 'data_node', 'version', 'latest', 'replica',
+                         '_timestamp']}
+# Solr facet.pivot fields, institution > source > experiment > member
+FACET_PIVOTS = {'CMIP6': ['institution_id', 'source_id', 'experiment_id',
+                          'member_id'],
+                'CMIP5': ['institute', 'model', 'experiment', 'ensemble'],
+                'CMIP3': ['institute', 'model', 'experiment', 'ensemble']}
+# Solr variable field by project, multi-valued for CMIP5 datasets
+VARIABLE_FIELDS = {'CMIP6': 'variable_id', 'CMIP5': 'variable',
+                   'CMIP3': 'variable'}
+
+#%%
+# HTTP transport - index node, pooled session, timeouts, retry and stats
+ESGF_NODE = os.environ.get('ESGF_NODE', 'https://esgf-node.llnl.gov')
+HTTP_TIMEOUT = (10, 300)  # connect, read seconds
+HTTP_RETRIES = 5
+HTTP_BACKOFF = 2.0  # seconds, doubled per retry with full jitter
+HTTP_BACKOFF_MAX = 60.0
+HTTP_POOL_SIZE = 16
+HTTP_CHUNK_SIZE = 1 << 16  # bytes per streamed read
+_session = None
+_session_lock = threading.Lock()
+_transfer_log = []
+_transfer_lock = threading.Lock()
+# Response cache, off unless enable_response_cache is called
+_response_cache = None
+_response_cache_refresh = False
+
+
+class RetryableHTTPError(requests.exceptions.HTTPError):
+    """Server-side (5xx) response, retried by http_get"""
+
+
+def get_session():
+    """
+    Returns
+    -------
+    session : requests.Session
+        Process-wide keep-alive session with a connection pool sized for
+        concurrent harvests and compressed transfer negotiated
+
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                  pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                                    'Connection': 'keep-alive'})
+            _session = session
+    return _session
+
+
+def http_get(url, timeout=None, retries=None):
+    """
+    GET with bounded timeouts and jittered exponential retry on 5xx,
+    timeouts and dropped connections; 4xx responses are raised immediately
+
+    Parameters
+    ----------
+    url : str
+        Request url.
+    timeout : tuple or float, optional
+        requests timeout. The default is HTTP_TIMEOUT.
+    retries : int, optional
+        Retries after the first attempt. The default is HTTP_RETRIES.
+
+    Returns
+    -------
+    req : requests.Response
+        Response with body read.
+
+    """
+    if timeout is None:
+        timeout = HTTP_TIMEOUT
+    if retries is None:
+        retries = HTTP_RETRIES
+    session = get_session()
+    attempt = 0
+    while True:
+        timeStart = time.time()
+        try:
+            req = session.get(url, timeout=timeout)
+            if req.status_code >= 500:
+                raise RetryableHTTPError(
+                    '{} Server Error for url: {}'.format(req.status_code,
+                                                         url), response=req)
+            req.raise_for_status()
+            content = req.content
+            wireBytes = getattr(req.raw, 'tell', lambda: len(content))()
+            log_transfer(url, time.time() - timeStart, wireBytes,
+                         len(content), attempt)
+            return req
+        except (RetryableHTTPError, requests.exceptions.Timeout,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError) as err:
+            log_transfer(url, time.time() - timeStart, 0, 0, attempt,
+                         error=err)
+            if attempt >= retries:
+                raise
+            delay = random.uniform(0, min(HTTP_BACKOFF_MAX,
+                                          HTTP_BACKOFF * 2 ** attempt))
+            print('** http_get retry', attempt + 1, 'of', retries, 'in',
+                  round(delay, 1), 's:', err, '**')
+            time.sleep(delay)
+            attempt += 1
+
+
+def enable_response_cache(cache_dir=None, max_bytes=CACHE_MAX_BYTES,
+                          ttl=CACHE_TTL, refresh=False):
+    """
+    Serve repeated dataset queries from an on-disk response cache
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Cache directory. The default is CACHE_DIR/responses.
+    max_bytes : int, optional
+        Compressed size bound, least recently used entries are evicted.
+    ttl : float, optional
+        Entry lifetime in seconds.
+    refresh : bool, optional
+        Ignore cached entries (fetched responses still repopulate the
+        cache). The default is False.
+
+    Returns
+    -------
+    cache : esgfCache.ResponseCache
+
+    """
+    global _response_cache, _response_cache_refresh
+    if cache_dir is None:
+        cache_dir = os.path.join(CACHE_DIR, 'responses')
+    _response_cache = ResponseCache(cache_dir, max_bytes=max_bytes, ttl=ttl)
+    _response_cache_refresh = refresh
+    return _response_cache
+
+
+def http_get_docs(url, meta=None, timeout=None, retries=None, unit=None):
+    """
+    Stream the docs of a Solr JSON response as bytes arrive, parsed
+    incrementally so the body and document list are never held whole. Retry
+    policy as http_get; a retry after docs were yielded skips those already
+    seen (requests are sorted, see iter_dataset_docs).
+
+    Parameters
+    ----------
+    url : str
+        Request url.
+    meta : dict, optional
+        Updated with response scalars, e.g. meta['numFound'].
+    timeout, retries : optional
+        See http_get.
+    unit : str, optional
+        Page of a multi-page walk: the response is always fetched and cached
+        with this walk tag and its numFound, see iter_dataset_docs. The
+        default is None (single request, served from the cache if present).
+
+    Yields
+    ------
+    doc : dict
+        Solr document.
+
+    """
+    if timeout is None:
+        timeout = HTTP_TIMEOUT
+    if retries is None:
+        retries = HTTP_RETRIES
+    if meta is None:
+        meta = {}
+    cache = _response_cache
+    if cache is not None and not _response_cache_refresh and unit is None:
+        timeStart = time.time()
+        chunks = cache.get(url)
+        if chunks is not None:
+            counts = {'content': 0}
+
+            def cached():
+                for chunk in chunks:
+                    counts['content'] += len(chunk)
+                    yield chunk
+
+            for doc in iterStreamDocs(cached(), meta=meta):
+                yield doc
+            log_transfer(url, time.time() - timeStart, 0, counts['content'],
+                         0, cached=True)
+            return
+    session = get_session()
+    attempt = 0
+    yielded = 0
+    while True:
+        timeStart = time.time()
+        counts = {'content': 0, 'seen': 0}
+        writer = None if cache is None else cache.writer(url)
+        try:
+            with session.get(url, timeout=timeout, stream=True) as req:
+                if req.status_code >= 500:
+                    raise RetryableHTTPError(
+                        '{} Server Error for url: {}'.format(req.status_code,
+                                                             url),
+                        response=req)
+                req.raise_for_status()
+
+                def chunks():
+                    for chunk in req.iter_content(HTTP_CHUNK_SIZE):
+                        counts['content'] += len(chunk)
+                        if writer is not None:
+                            writer.write(chunk)
+                        yield chunk
+
+                for doc in iterStreamDocs(chunks(), meta=meta):
+                    counts['seen'] += 1
+                    if counts['seen'] > yielded:
+                        yielded += 1
+                        yield doc
+                wireBytes = getattr(req.raw, 'tell',
+                                    lambda: counts['content'])()
+            if writer is not None:
+                writer.commit(None if unit is None else
+                              {'unit': unit, 'numFound': meta.get('numFound')})
+                writer = None
+            log_transfer(url, time.time() - timeStart, wireBytes,
+                         counts['content'], attempt)
+            return
+        except (RetryableHTTPError, requests.exceptions.Timeout,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError, ValueError) as err:
+            if writer is not None:
+                writer.abort()
+                writer = None
+            log_transfer(url, time.time() - timeStart, 0, counts['content'],
+                         attempt, error=err)
+            if attempt >= retries:
+                raise
+            delay = random.uniform(0, min(HTTP_BACKOFF_MAX,
+                                          HTTP_BACKOFF * 2 ** attempt))
+            print('** http_get_docs retry', attempt + 1, 'of', retries, 'in',
+                  round(delay, 1), 's, resuming after', yielded, 'docs:',
+                  err, '**')
+            time.sleep(delay)
+            attempt += 1
+        finally:
+            # Partial bodies (consumer stopped early, other errors) are dropped
+            if writer is not None:
+                writer.abort()
+
+
+def log_transfer(url, seconds, wireBytes, contentBytes, attempt, error=None,
+                 cached=False):
+    """
+    Record per-request latency and transferred (wire, decoded) bytes
+    """
+    with _transfer_lock:
+        _transfer_log.append({'url': url, 'seconds': seconds,
+                              'wireBytes': wireBytes,
+                              'contentBytes': contentBytes,
+                              'attempt': attempt,
+                              'error': None if error is None else str(error),
+                              'cached': cached})
+
+
+def get_transfer_stats(reset=False):
+    """
+    Parameters
+    ----------
+    reset : bool, optional
+        Clear the transfer log after summarizing. The default is False.
+
+    Returns
+    -------
+    stats : dict
+        Request, retry, error and cache-hit counts, total/max latency (s)
+        and total wire/decoded bytes over the logged requests
+
+    """
+    with _transfer_lock:
+        log = list(_transfer_log)
+        if reset:
+            del _transfer_log[:]
+    stats = {'requests': len(log),
+             'retries': sum(1 for rec in log if rec['attempt']),
+             'errors': sum(1 for rec in log if rec['error']),
+             'cached': sum(1 for rec in log if rec['cached']),
+             'seconds': sum(rec['seconds'] for rec in log),
+             'maxSeconds': max([rec['seconds'] for rec in log] or [0.]),
+             'wireBytes': sum(rec['wireBytes'] for rec in log),
+             'contentBytes': sum(rec['contentBytes'] for rec in log)}
+    return stats
 
-    req = requests.get(search_url)
-    js = json.loads(req.text)
-    shards = js['responseHeader']['params']['shards']
 
-    solr_url = 'https://esgf-node.llnl.gov/solr/datasets/select' \
-               '?q=*:*&wt=json&facet=true&rows=50000&fq=type:Dataset' \
+#%%
+# Shard discovery cache, shared by all queries in a run and across runs
+CACHE_DIR = os.environ.get('CMIPOCEAN_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'CMIPOcean'))
+SHARD_CACHE_FILE = os.path.join(CACHE_DIR, 'esgf_shards.json')
+SHARD_CACHE_TTL = 86400  # seconds
+SHARD_DISCOVERY_TIMEOUT = 30  # seconds
+_shard_cache = {}
+_shard_lock = threading.Lock()
+
+
+def read_shard_cache():
+    """
+    Returns
+    -------
+    cache : dict
+        {'time': epoch seconds, 'node': ESGF_NODE, 'shards': str} from
+        SHARD_CACHE_FILE, empty if missing, unreadable or another node
+
+    """
+    try:
+        with open(SHARD_CACHE_FILE) as f:
+            cache = json.load(f)
+        if isinstance(cache.get('time'), (int, float)) and \
+                cache.get('shards') and cache.get('node') == ESGF_NODE:
+            return cache
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+
+def write_shard_cache(cache):
+    """
+    Parameters
+    ----------
+    cache : dict
+        {'time': epoch seconds, 'node': ESGF_NODE, 'shards': str}, written
+        atomically
+
+    """
+    try:
+        os.makedirs(os.path.dirname(SHARD_CACHE_FILE), exist_ok=True)
+        tmpFile = '.'.join([SHARD_CACHE_FILE, str(os.getpid()), 'tmp'])
+        with open(tmpFile, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmpFile, SHARD_CACHE_FILE)
+    except OSError as err:
+        print('** shard cache not written:', err, '**')
+
+
+def invalidate_shard_cache():
+    """
+    Drop the in-memory and on-disk shard lists, the next get_shards call
+    rediscovers them
+    """
+    with _shard_lock:
+        _shard_cache.clear()
+        try:
+            os.remove(SHARD_CACHE_FILE)
+        except FileNotFoundError:
+            pass
+
+
+def get_shards(refresh=False):
+    """
+    Parameters
+    ----------
+    refresh : bool, optional
+        Ignore cached shards and rediscover. The default is False.
+
+    Returns
+    -------
+    shards : str
+        Comma-separated Solr shard list from esg-search/search. Cached for
+        SHARD_CACHE_TTL; if discovery fails or exceeds
+        SHARD_DISCOVERY_TIMEOUT the last-known list is returned.
+
+    """
+    with _shard_lock:
+        timeNow = time.time()
+        if not refresh:
+            if _shard_cache and \
+                    timeNow - _shard_cache['time'] < SHARD_CACHE_TTL:
+                return _shard_cache['shards']
+            cache = read_shard_cache()
+            if cache and timeNow - cache['time'] < SHARD_CACHE_TTL:
+                _shard_cache.update(cache)
+                return cache['shards']
+        search_url = ESGF_NODE + '/esg-search/search/' \
+                     '?limit=0&format=application%2Fsolr%2Bjson'
+        try:
+            req = http_get(search_url,
+                           timeout=(HTTP_TIMEOUT[0], SHARD_DISCOVERY_TIMEOUT),
+                           retries=1)
+            js = json.loads(req.text)
+            shards = js['responseHeader']['params']['shards']
+        except (requests.exceptions.RequestException, ValueError,
+                KeyError) as err:
+            lastKnown = _shard_cache or read_shard_cache()
+            if not lastKnown:
+                raise
+            print('** shard discovery failed (', err, '), using last-known'
+                  ' shards from', time.ctime(lastKnown['time']), '**')
+            _shard_cache.update(lastKnown)
+            return lastKnown['shards']
+        cache = {'time': timeNow, 'node': ESGF_NODE, 'shards': shards}
+        _shard_cache.update(cache)
+        write_shard_cache(cache)
+
+    return shards
+
+
+#%%
+def get_solr_query_url():
+    shards = get_shards()
+
+    solr_url = ESGF_NODE + '/solr/datasets/select' \
+               '?q=*:*&wt=json&facet=true&fq=type:Dataset' \
                '{{query}}&shards={shards}'
     # Limit to unique/latest only - '&fq=replica:false&fq=latest:true&{{query}}&shards={shards}'
-    # Set row size to 1M - &rows=1000000; CMIP5 'tos' == 31050, max out at 50k
+    # Row windows are appended per page - see iter_dataset_docs
 
     return solr_url.format(shards=shards)
 
 #%%
-def get_dataset_time_data(project, activity_id, variable_id,
-                          experiment_id=None,
-                          start_date="2018-07-01",
-                          end_date=timeFormatY):
+def get_field_list(fields=None):
     """
     Parameters
     ----------
-    project : TYPE
-        DESCRIPTION.
-    activity_id : TYPE
-        DESCRIPTION.
-    experiment_id : TYPE
-        DESCRIPTION. The default is None.
-    variable_id : TYPE
-        DESCRIPTION.
-    start_date : TYPE, optional
-        DESCRIPTION. The default is None.
-    end_date : TYPE, optional
-        DESCRIPTION. The default is None.
+    fields : str or list, optional
+        FIELD_PRESETS key ('all', 'id', 'drs') or a list of extra field names,
+        'id' is always included. The default is None (full documents).
 
     Returns
     -------
-    js : TYPE
-        DESCRIPTION.
+    fieldList : list or None
+        Solr fl= field names, None for full documents.
+
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        if fields not in FIELD_PRESETS:
+            raise ValueError('Unknown fields preset: {}, expected one of {}'
+                             .format(fields, sorted(FIELD_PRESETS)))
+        return FIELD_PRESETS[fields]
+    fieldList = ['id']
+    for field in fields:
+        if field not in fieldList:
+            fieldList.append(field)
+    return fieldList
+
+
+def get_variable_list(variable_id):
+    """
+    Parameters
+    ----------
+    variable_id : str, list or None
+        Variable id, comma-separated ids or a list of ids.
+
+    Returns
+    -------
+    variables : list
+        Distinct variable ids in the given order, empty for None.
+
+    """
+    if not variable_id:
+        return []
+    if isinstance(variable_id, str):
+        variable_id = variable_id.split(',')
+    variables = []
+    for varId in variable_id:
+        varId = varId.strip()
+        if varId and varId not in variables:
+            variables.append(varId)
+    return variables
+
+
+def get_doc_variables(doc, project, variables):
+    """
+    Parameters
+    ----------
+    doc : dict
+        Solr dataset document.
+    project : str
+        ESGF project, selects the variable field (VARIABLE_FIELDS).
+    variables : list
+        Requested variable ids.
+
+    Returns
+    -------
+    docVariables : list
+        Requested variables the dataset holds; CMIP6 docs projected without
+        variable_id fall back to the id (table.variable.grid.version).
+
+    """
+    values = doc.get(VARIABLE_FIELDS[project])
+    if values is None and project == 'CMIP6':
+        values = doc['id'].split('|')[0].split('.')[7:8]
+    if isinstance(values, str):
+        values = [values]
+    return [varId for varId in variables if varId in (values or [])]
+
+
+#%%
+def get_solr_date(date, end=False):
+    """
+    Parameters
+    ----------
+    date : str, datetime or None
+        YYYY-MM-DD date, ISO 8601 timestamp or datetime.
+    end : bool, optional
+        Treat a YYYY-MM-DD date as the end of that day. The default is False.
+
+    Returns
+    -------
+    solrDate : str
+        Solr date string, '*' for None.
 
     """
     date_format = '%Y-%m-%dT%H:%M:%SZ'
-    start_str = start_date #start_date.strftime(date_format)
-    end_str = end_date #end_date.strftime(date_format)
+    if date is None:
+        return '*'
+    if isinstance(date, datetime.datetime):
+        return date.strftime(date_format)
+    try:
+        day = datetime.datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        # Already a timestamp, e.g. a harvested _timestamp high-water mark
+        return date
+    if end:
+        day = day.replace(hour=23, minute=59, second=59)
+    return day.strftime(date_format)
+
+
+#%%
+def get_query_url(project, activity_id, variable_id, experiment_id=None,
+                  start_date=None, end_date=None,
+                  fields=None):
+    """
+    Parameters
+    ----------
+    project : str
+        ESGF project, e.g. 'CMIP6', 'CMIP5', 'CMIP3'.
+    activity_id : str
+        MIP activity id (CMIP6 only).
+    variable_id : str or list
+        Variable id, e.g. 'thetao', or a list of ids matched with one OR
+        filter, e.g. ['thetao', 'so'].
+    experiment_id : str, optional
+        Experiment id. The default is None.
+    start_date : str or datetime, optional
+        Earliest index _timestamp, YYYY-MM-DD or ISO 8601 timestamp
+        (inclusive). The default is None (unbounded).
+    end_date : str or datetime, optional
+        Latest index _timestamp, YYYY-MM-DD (whole day included) or ISO 8601
+        timestamp. The default is None (unbounded).
+    fields : str or list, optional
+        Field projection, see get_field_list. The default is None.
+
+    Returns
+    -------
+    query_url : str
+        Solr dataset query url, without row window.
+
+    """
+    start_str = get_solr_date(start_date)
+    end_str = get_solr_date(end_date, end=True)
+    variables = get_variable_list(variable_id)
+    if len(variables) == 1:
+        variable_id = variables[0]
+    elif variables:
+        variable_id = urllib.parse.quote('({})'.format(' OR '.join(variables)))
 
     solr_url = get_solr_query_url()
 
@@ -78,11 +637,21 @@ def get_dataset_time_data(project, activity_id, variable_id,
     if project == 'CMIP6':
         if activity_id:
             query += '&fq=activity_id:{activity_id}'
-        if variable_id:
+        if variables:
             query += '&fq=variable_id:{variable_id}'
     else:
-        if variable_id:
+        if variables:
             query += '&fq=variable:{variable_id}'
+    if start_str != '*' or end_str != '*':
+        query += '&fq=_timestamp:' + urllib.parse.quote(
+            '[{} TO {}]'.format(start_str, end_str))
+    fieldList = get_field_list(fields)
+    if fieldList and len(variables) > 1 and \
+            VARIABLE_FIELDS[project] not in fieldList:
+        # Docs are split by variable downstream, keep the field
+        fieldList = fieldList + [VARIABLE_FIELDS[project]]
+    if fieldList:
+        query += '&fl=' + ','.join(fieldList)
 
     query_url = solr_url.format(query=query.format(project=project,
                                                    start_date=start_str,
@@ -91,10 +660,330 @@ def get_dataset_time_data(project, activity_id, variable_id,
                                                    experiment_id=experiment_id,
                                                    variable_id=variable_id))
 
+    return query_url
+
+
+#%%
+def iter_dataset_docs(project, activity_id, variable_id,
+                      experiment_id=None,
+                      start_date=None,
+                      end_date=None,
+                      page_size=PAGE_SIZE,
+                      fields=None,
+                      meta=None):
+    """
+    Generator over all documents of a Solr dataset query, walking start/rows
+    windows and parsing each window incrementally as it streams in, so
+    memory stays constant regardless of page_size and result size. With the
+    response cache enabled a query is read from the cache only as a whole,
+    see get_cached_pages
+
+    Parameters
+    ----------
+    project, activity_id, variable_id, experiment_id, start_date, end_date,
+    fields
+        See get_query_url.
+    page_size : int, optional
+        Number of documents per request. The default is PAGE_SIZE.
+    meta : dict, optional
+        Updated with response scalars, meta['numFound'] is the total number
+        of documents matching the query.
+
+    Yields
+    ------
+    doc : dict
+        Solr dataset document.
+
+    """
+    query_url = get_query_url(project, activity_id, variable_id,
+                              experiment_id=experiment_id,
+                              start_date=start_date, end_date=end_date,
+                              fields=fields)
     print('query_url:\n', query_url)
+    if meta is None:
+        meta = {}
+
+    # All pages from one earlier walk, never mixed with live pages
+    pages = get_cached_pages(query_url, page_size)
+    if pages is not None:
+        for page_url, chunks in pages:
+            timeStart = time.time()
+            counts = {'content': 0}
+
+            def cached():
+                for chunk in chunks:
+                    counts['content'] += len(chunk)
+                    yield chunk
+
+            for doc in iterStreamDocs(cached(), meta=meta):
+                yield doc
+            log_transfer(page_url, time.time() - timeStart, 0,
+                         counts['content'], 0, cached=True)
+        return
+
+    # Stable sort on the unique key keeps windows consistent across pages
+    unit = uuid.uuid4().hex
+    start = 0
+    while True:
+        page_url = get_page_url(query_url, start, page_size)
+        count = 0
+        for doc in http_get_docs(page_url, meta=meta, unit=unit):
+            count += 1
+            yield doc
+        start += count
+        if not count or start >= meta.get('numFound', 0):
+            break
+
+
+def get_page_url(query_url, start, page_size=PAGE_SIZE):
+    """
+    Return the start/rows window url of a query, sorted on the unique key
+    """
+    return ''.join([query_url, '&sort=id+asc&start=', str(start), '&rows=',
+                    str(page_size)])
+
+
+def get_cached_pages(query_url, page_size=PAGE_SIZE):
+    """
+    Parameters
+    ----------
+    query_url : str
+        Solr dataset query url, see get_query_url.
+    page_size : int, optional
+        Number of documents per request. The default is PAGE_SIZE.
+
+    Returns
+    -------
+    pages : list or None
+        [(page_url, chunks), ...] for every window of the query if all were
+        cached by the same walk (equal tag and numFound), None otherwise; a
+        partial or mixed set is dropped from the cache, so the walk that
+        follows refetches every page from the current index state
+
+    """
+    cache = _response_cache
+    if cache is None or _response_cache_refresh:
+        return None
+    first = cache.info(get_page_url(query_url, 0, page_size))
+    if not first or not first.get('unit'):
+        return None
+    numFound = first.get('numFound') or 0
+    urls = [get_page_url(query_url, start, page_size)
+            for start in range(0, max(numFound, 1), page_size)]
+    for page_url in urls:
+        info = cache.info(page_url)
+        if not info or info.get('unit') != first['unit'] or \
+                info.get('numFound') != numFound:
+            print('** cached pages of', query_url, 'are from different',
+                  'harvests, refetching all', len(urls), '**')
+            for stale_url in urls:
+                cache.invalidate(stale_url)
+            return None
+    pages = []
+    for page_url in urls:
+        chunks = cache.get(page_url)
+        if chunks is None:
+            # Expired since checked
+            return None
+        pages.append((page_url, chunks))
+    return pages
+
+
+def iter_dataset_pages(project, activity_id, variable_id, **kwargs):
+    """
+    Generator over start/rows windows of a Solr dataset query, see
+    iter_dataset_docs for arguments
+
+    Yields
+    ------
+    numFound : int
+        Total number of documents matching the query.
+    docs : list
+        Documents in the current window.
+
+    """
+    page_size = kwargs.get('page_size', PAGE_SIZE)
+    meta = {}
+    docs = []
+    for doc in iter_dataset_docs(project, activity_id, variable_id,
+                                 meta=meta, **kwargs):
+        docs.append(doc)
+        if len(docs) == page_size:
+            yield meta['numFound'], docs
+            docs = []
+    if docs or not meta.get('numFound'):
+        yield meta.get('numFound', 0), docs
+
+
+def iter_dataset_ids(project, activity_id, variable_id, **kwargs):
+    """
+    Generator over dataset ids only (fields='id' unless given), see
+    iter_dataset_docs for arguments
 
-    req = requests.get(query_url)
+    Yields
+    ------
+    id : str
+        Dataset id, e.g.
+        CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.gn.v20190308|node
+
+    """
+    kwargs.setdefault('fields', 'id')
+    for doc in iter_dataset_docs(project, activity_id, variable_id, **kwargs):
+        yield doc['id']
+
+
+def iter_variable_docs(project, activity_id, variable_id, **kwargs):
+    """
+    Generator splitting a single OR-filtered query over several variables
+    back into per-variable docs as they stream, see iter_dataset_docs for
+    arguments
+
+    Yields
+    ------
+    varId : str
+        Requested variable id held by the dataset.
+    doc : dict
+        Solr dataset document, yielded once per variable it holds (CMIP5
+        datasets hold several).
+
+    """
+    variables = get_variable_list(variable_id)
+    for doc in iter_dataset_docs(project, activity_id, variables, **kwargs):
+        for varId in get_doc_variables(doc, project, variables):
+            yield varId, doc
+
+
+#%%
+def build_pivot_tree(pivots):
+    """
+    Parameters
+    ----------
+    pivots : list
+        Solr facet_pivot entries [{'field', 'value', 'count', 'pivot'}, ...]
+
+    Returns
+    -------
+    tree : dict
+        Nested {value: subtree}, innermost level {value: count}
+
+    """
+    tree = {}
+    for entry in pivots:
+        if entry.get('pivot'):
+            tree[entry['value']] = build_pivot_tree(entry['pivot'])
+        else:
+            tree[entry['value']] = entry['count']
+    return tree
+
+
+def get_facet_tree(project, activity_id, variable_id,
+                   experiment_id=None,
+                   start_date=None,
+                   end_date=None):
+    """
+    Harvest distinct institution > source > experiment > member combinations
+    from Solr facet.pivot counts, with rows=0 no documents are returned
+
+    Parameters
+    ----------
+    project, activity_id, variable_id, experiment_id, start_date, end_date
+        See get_query_url.
+
+    Returns
+    -------
+    js : dict
+        {'numFound': n, 'pivot': [facet fields], 'activity_id': actId,
+         'variables': [varIds],
+         'tree': {instId: {srcId: {actId: {expId: {memberId: count}}}}}},
+        actId is the queried activity_id ('CMIP' if None); CMIP5/CMIP3
+        experiments are reassigned downstream (readOceanMods.actRemap).
+        For several variables the variable field is pivoted last, leaves
+        are {memberId: {varId: count}} (CMIP5 datasets hold several
+        variables, all are counted).
+
+    """
+    variables = get_variable_list(variable_id)
+    pivot = FACET_PIVOTS[project]
+    if len(variables) > 1:
+        pivot = pivot + [VARIABLE_FIELDS[project]]
+    query_url = get_query_url(project, activity_id, variable_id,
+                              experiment_id=experiment_id,
+                              start_date=start_date, end_date=end_date)
+    query_url = ''.join([query_url, '&rows=0&facet.limit=-1',
+                         '&facet.mincount=1&facet.pivot=', ','.join(pivot)])
+    print('query_url:\n', query_url)
+    req = http_get(query_url)
     js = json.loads(req.text)
+    pivots = js['facet_counts']['facet_pivot'][','.join(pivot)]
+
+    # Insert activity level to match the CMIP_ESGF tree
+    actId = activity_id if activity_id else 'CMIP'
+    tree = {}
+    for instId, srcs in build_pivot_tree(pivots).items():
+        tree[instId] = {}
+        for srcId, exps in srcs.items():
+            tree[instId][srcId] = {actId: exps}
+    return {'numFound': js['response']['numFound'], 'pivot': pivot,
+            'activity_id': actId, 'variables': variables, 'tree': tree}
+
+
+#%%
+def get_dataset_time_data(project, activity_id, variable_id,
+                          experiment_id=None,
+                          start_date=None,
+                          end_date=None,
+                          fields=None):
+    """
+    Parameters
+    ----------
+    project : TYPE
+        DESCRIPTION.
+    activity_id : TYPE
+        DESCRIPTION.
+    experiment_id : TYPE
+        DESCRIPTION. The default is None.
+    variable_id : str or list
+        Variable id, or a list of ids split per variable (see Returns).
+    start_date : TYPE, optional
+        DESCRIPTION. The default is None.
+    end_date : TYPE, optional
+        DESCRIPTION. The default is None.
+    fields : str or list, optional
+        Field projection, e.g. 'id' for id-only documents. The default is
+        None (full documents).
+
+    Returns
+    -------
+    js : dict
+        Solr-shaped response {'response': {'numFound': n, 'docs': [...]}}
+        assembled from all pages; use iter_dataset_docs for bounded memory.
+        For a list variable_id, one query is issued and the result is split
+        per variable, {varId: {'response': {'numFound': n, 'docs': [...]}}}.
+
+    """
+    if isinstance(variable_id, (list, tuple)):
+        js = {varId: {'response': {'numFound': 0, 'docs': []}}
+              for varId in get_variable_list(variable_id)}
+        for varId, doc in iter_variable_docs(project, activity_id,
+                                             variable_id,
+                                             experiment_id=experiment_id,
+                                             start_date=start_date,
+                                             end_date=end_date,
+                                             fields=fields):
+            js[varId]['response']['docs'].append(doc)
+            js[varId]['response']['numFound'] += 1
+        return js
+
+    numFound = 0
+    docs = []
+    for numFound, page in iter_dataset_pages(project, activity_id,
+                                             variable_id,
+                                             experiment_id=experiment_id,
+                                             start_date=start_date,
+                                             end_date=end_date,
+                                             fields=fields):
+        docs.extend(page)
+    js = {'response': {'numFound': numFound, 'docs': docs}}
 
     return js
 
@@ -106,43 +995,53 @@ def main():
     parser.add_argument("--project", "-p", dest="project", type=str, default="CMIP6", help="MIP project name (default is CMIP6)")
     parser.add_argument("--activity_id", "-ai", dest="activity_id", type=str, default=None, help="MIP activity id (default is None)")
     parser.add_argument("--experiment_id", "-ei", dest="experiment_id", type=str, default=None, help="MIP experiment id (default is None)")
-    parser.add_argument("--variable_id", "-vi", dest="variable_id", type=str, default="tos", help="MIP variable id (default is 'tos')")
-    parser.add_argument("--start_date", "-sd", dest="start_date", type=str, default="2018-07-01", help="Start date in YYYY-MM-DD format (default is 2018-07-01)")
-    parser.add_argument("--end_date", "-ed", dest="end_date", type=str, default=datetime.datetime.now().strftime('%Y-%m-%d'), help="End date in YYYY-MM-DD format (default is current date)")
+    parser.add_argument("--variable_id", "-vi", dest="variable_id", type=str, default="tos", help="MIP variable id, or comma-separated ids harvested in one pass (default is 'tos')")
+    parser.add_argument("--start_date", "-sd", dest="start_date", type=str, default=None, help="Earliest index _timestamp in YYYY-MM-DD format (default is None, no lower bound)")
+    parser.add_argument("--end_date", "-ed", dest="end_date", type=str, default=None, help="Latest index _timestamp in YYYY-MM-DD format (default is None, no upper bound)")
     parser.add_argument("--output", "-o", dest="output", type=str, default=os.path.curdir, help="Output directory (default is current directory)")
+    parser.add_argument("--fields", "-f", dest="fields", type=str, default=None, help="Field projection preset ({}) or comma-separated extra fields (default is full documents)".format(", ".join(sorted(FIELD_PRESETS))))
+    parser.add_argument("--refresh_shards", dest="refresh_shards", action="store_true", help="Invalidate cached ESGF shard list before querying")
     args = parser.parse_args()
 
-    if args.start_date is None:
-        print("You must enter a start date.")
-        return
-    else:
+    if args.refresh_shards:
+        invalidate_shard_cache()
+
+    fields = args.fields
+    if fields and fields not in FIELD_PRESETS:
+        fields = fields.split(',')
+
+    # No dates, no _timestamp filter (every indexed dataset)
+    start_date = None
+    if args.start_date is not None:
         try:
             start_date = datetime.datetime.strptime(args.start_date, '%Y-%m-%d')
         except ValueError:
             raise ValueError("Incorrect start date format, should be YYYY-MM-DD")
-            return
 
-    if args.end_date is None:
-        print("You must enter an end date.")
-        return
-    else:
+    end_date = None
+    if args.end_date is not None:
         try:
             end_date = datetime.datetime.strptime(args.end_date, '%Y-%m-%d')
+            end_date = end_date.replace(hour=23, minute=59, second=59)
         except ValueError:
             raise ValueError("Incorrect end date format, should be YYYY-MM-DD")
-            return
 
     if not os.path.isdir(args.output):
         print("{} is not a directory. Exiting.".format(args.output))
         return
 
+    variable_id = get_variable_list(args.variable_id)
+    if len(variable_id) == 1:
+        variable_id = variable_id[0]
+
     print('call get_dataset_time_data')
     js = get_dataset_time_data(project=args.project,
                                start_date=start_date,
                                end_date=end_date,
                                activity_id=args.activity_id,
                                experiment_id=args.experiment_id,
-                               variable_id=args.variable_id)
+                               variable_id=variable_id,
+                               fields=fields)
 
     return js
 
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:00:00 2026
+
+Harvest snapshot writers and a common reader. Snapshots are the daily
+*_ESGF-Datasets files written by getOceanMods and read by readOceanMods:
+
+    json        Solr-shaped {"response": {"docs": [...], "numFound": n}}, one
+                doc per line (the original format)
+    ndjson      one compact doc per line, closed by a {"response":
+                {"numFound": n}} trailer line (a missing trailer marks a
+                truncated file)
+    ndjson.gz   ndjson, gzip-compressed (stdlib)
+    ndjson.zst  ndjson, zstandard-compressed (needs the zstandard package)
+
+Usage:
+    writer = SnapshotWriter('261018_CMIP6_CMIP_ESGF-Datasets', 'ndjson.gz')
+    writer.write(doc)
+    outFile = writer.commit(numFound)
+    for doc in iter_snapshot_docs(outFile):
+        print(doc['id'])
+
+PJD 18 Oct 2026 - Started
+PJD 18 Oct 2026 - check_format, unknown or unavailable (no zstandard)
+                  formats are rejected before any harvest work
+
+@author: durack1
+"""
+
+import gzip
+import io
+import json
+import os
+from solrStream import iterFileDocs
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#%%
+SNAPSHOT_FORMATS = ['json', 'ndjson', 'ndjson.gz', 'ndjson.zst']
+SNAPSHOT_LEVELS = {'ndjson.gz': 6, 'ndjson.zst': 10}
+
+
+def snapshot_format(fullPath):
+    """
+    Parameters
+    ----------
+    fullPath : str
+        snapshot file name
+
+    Returns
+    -------
+    fmt : str or None
+        SNAPSHOT_FORMATS entry matching the file suffix, None otherwise
+
+    """
+    # Longest suffix first, 'ndjson.gz' before 'json'
+    for fmt in sorted(SNAPSHOT_FORMATS, key=len, reverse=True):
+        if fullPath.endswith('.' + fmt):
+            return fmt
+    return None
+
+
+def check_format(fmt):
+    """
+    Raise ValueError if fmt is not a SNAPSHOT_FORMATS entry or its
+    compression package is not installed
+    """
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError('Unknown snapshot format: {}, expected one of {}'
+                         .format(fmt, SNAPSHOT_FORMATS))
+    if fmt == 'ndjson.zst' and zstandard is None:
+        raise ValueError('ndjson.zst snapshots need the zstandard package')
+
+
+def find_snapshot(basePath):
+    """
+    Parameters
+    ----------
+    basePath : str
+        snapshot path without the format suffix, e.g.
+        '../261017/261017_CMIP6_CMIP_ESGF-Datasets'
+
+    Returns
+    -------
+    fullPath : str or None
+        first existing snapshot in any format
+
+    """
+    for fmt in SNAPSHOT_FORMATS:
+        fullPath = '.'.join([basePath, fmt])
+        if os.path.exists(fullPath):
+            return fullPath
+    return None
+
+
+def _open_binary(fullPath, fmt, mode):
+    if fmt == 'ndjson.gz':
+        return gzip.open(fullPath, mode,
+                         **({'compresslevel': SNAPSHOT_LEVELS[fmt]}
+                            if mode == 'wb' else {}))
+    if fmt == 'ndjson.zst':
+        check_format(fmt)
+        f = open(fullPath, mode)
+        if mode == 'wb':
+            return zstandard.ZstdCompressor(
+                level=SNAPSHOT_LEVELS[fmt]).stream_writer(f, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+    return open(fullPath, mode)
+
+
+#%% Writer
+class SnapshotWriter:
+    """
+    Streams docs to basePath.<fmt>.tmp, renamed to basePath.<fmt> by commit()
+    """
+
+    def __init__(self, basePath, fmt='json'):
+        check_format(fmt)
+        self.fmt = fmt
+        self.outFile = '.'.join([basePath, fmt])
+        self.tmpFile = self.outFile + '.tmp'
+        self.count = 0
+        self.f = io.TextIOWrapper(_open_binary(self.tmpFile, fmt, 'wb'),
+                                  encoding='utf-8')
+        if fmt == 'json':
+            self.f.write('{"response": {"docs": [')
+
+    def write(self, doc):
+        if self.fmt == 'json':
+            self.f.write(',\n' if self.count else '\n')
+            json.dump(doc, self.f, ensure_ascii=False, sort_keys=True)
+        else:
+            self.f.write(json.dumps(doc, ensure_ascii=False, sort_keys=True,
+                                    separators=(',', ':')))
+            self.f.write('\n')
+        self.count += 1
+
+    def commit(self, numFound):
+        """
+        Close the snapshot with its numFound and move it into place
+
+        Returns
+        -------
+        outFile : str
+
+        """
+        if self.fmt == 'json':
+            self.f.write('\n], "numFound": {}}}}}\n'.format(numFound))
+        else:
+            self.f.write(json.dumps({'response': {'numFound': numFound}}))
+            self.f.write('\n')
+        self.f.close()
+        os.replace(self.tmpFile, self.outFile)
+        return self.outFile
+
+    def abort(self):
+        self.f.close()
+        try:
+            os.remove(self.tmpFile)
+        except FileNotFoundError:
+            pass
+
+
+#%% Reader
+def iter_snapshot_docs(fullPath, meta=None):
+    """
+
+    Parameters
+    ----------
+    fullPath : str
+        snapshot file in any SNAPSHOT_FORMATS format
+    meta : dict, optional
+        updated with response scalars, meta['numFound']
+
+    Yields
+    ------
+    doc : dict
+
+    """
+    fmt = snapshot_format(fullPath)
+    if fmt is None:
+        raise ValueError('Unknown snapshot format: {}'.format(fullPath))
+    if fmt == 'json':
+        for doc in iterFileDocs(fullPath, meta=meta):
+            yield doc
+        return
+    closed = False
+    with io.TextIOWrapper(_open_binary(fullPath, fmt, 'rb'),
+                          encoding='utf-8') as f:
+        for line in f:
+            doc = json.loads(line)
+            if 'id' not in doc and 'response' in doc:
+                closed = True
+                if meta is not None:
+                    meta.update(doc['response'])
+                continue
+            yield doc
+    if not closed:
+        raise ValueError('Truncated snapshot, no trailer: {}'.format(fullPath))
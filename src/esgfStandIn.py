@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:00:00 2026
+
+Local stand-in for the ESGF index node, serving esg-search/search shard
+discovery and solr/datasets/select queries from recorded or synthetic
+fixtures, so harvests can be benchmarked and regression-tested offline
+
+Supports q=*:* with fq filters (field:value, field:(a OR b),
+field:[start TO end]), fl projection, sort=id asc, start/rows windows and
+facet.pivot (rows=0); responses are gzip-compressed on request. Latency and
+failures (503s, hangs) can be injected per request.
+
+To run against getOceanMods:
+    $ python esgfStandIn.py --port 8983 --synthetic 4 &
+    $ ESGF_NODE=http://127.0.0.1:8983 CMIPOCEAN_CACHE=/tmp/cache python getOceanMods.py
+
+PJD 18 Oct 2026 - Started
+PJD 18 Oct 2026 - synthetic_docs draws distinct versions, ids are unique
+PJD 18 Oct 2026 - complete_docs sets retracted (False) where fixtures lack it
+
+@author: durack1
+"""
+
+import argparse
+import datetime
+import gzip
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+#%%
+# Dataset id DRS components by project, CMIP5 datasets are published with
+# and without cmor_table (see readOceanMods.siftBits CanCM4/CanESM2 kludge)
+DRS_FIELDS = {'CMIP6': ['mip_era', 'activity_id', 'institution_id',
+                        'source_id', 'experiment_id', 'member_id', 'table_id',
+                        'variable_id', 'grid_label', 'version'],
+              'CMIP5': ['project', 'product', 'institute', 'model',
+                        'experiment', 'time_frequency', 'realm', 'cmor_table',
+                        'ensemble', 'version'],
+              'CMIP3': ['project', 'institute', 'model', 'experiment',
+                        'time_frequency', 'realm', 'ensemble', 'variable',
+                        'version']}
+# Solr multi-valued fields
+MULTI_VALUED = {'activity_id', 'institution_id', 'source_id',
+                'experiment_id', 'member_id', 'table_id', 'variable_id',
+                'grid_label', 'variable', 'institute', 'model', 'experiment',
+                'ensemble', 'cmor_table', 'realm', 'time_frequency',
+                'product'}
+
+
+def doc_from_id(dataset_id):
+    """
+    Parameters
+    ----------
+    dataset_id : str
+        ESGF dataset id, e.g.
+        CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.gn.v20190308|node
+
+    Returns
+    -------
+    doc : dict
+        Solr dataset document with project, DRS, data_node and version
+        fields derived from the id
+
+    """
+    master, _, node = dataset_id.partition('|')
+    parts = master.split('.')
+    project = parts[0].upper()
+    names = list(DRS_FIELDS.get(project, []))
+    if project == 'CMIP5' and len(parts) == len(names) - 1:
+        names.remove('cmor_table')
+    doc = {'id': dataset_id, 'type': 'Dataset', 'project': [project],
+           'master_id': master, 'data_node': node}
+    for name, value in zip(names, parts):
+        if name in ('mip_era', 'project'):
+            continue
+        doc[name] = [value] if name in MULTI_VALUED else value
+    doc['version'] = parts[-1].lstrip('v')
+    return doc
+
+
+def complete_docs(docs, variable='thetao'):
+    """
+    Fill DRS fields derived from ids, replica (not the first node seen for a
+    master_id), latest (highest version per instance), retracted (False)
+    and a synthetic _timestamp from the version date where fixtures lack
+    them
+
+    Parameters
+    ----------
+    docs : list
+        Solr dataset documents, at least {'id': ...}
+    variable : str or list, optional
+        variable(s) for CMIP5 docs, whose ids carry none. The default is
+        'thetao' (the getOceanMods harvest variable).
+
+    Returns
+    -------
+    docs : list
+        completed documents
+
+    """
+    completed = []
+    primary = {}
+    latest = {}
+    for doc in docs:
+        full = doc_from_id(doc['id'])
+        if 'variable_id' in full:
+            full['variable'] = full['variable_id']
+        elif 'variable' not in full:
+            full['variable'] = list(variable) if \
+                isinstance(variable, (list, tuple)) else [variable]
+        full.update(doc)
+        primary.setdefault(full['master_id'], full['data_node'])
+        instance = full['master_id'].rsplit('.', 1)[0]
+        latest[instance] = max(latest.get(instance, ''), full['version'])
+        completed.append(full)
+    for doc in completed:
+        doc.setdefault('retracted', False)
+        doc.setdefault('replica',
+                       doc['data_node'] != primary[doc['master_id']])
+        instance = doc['master_id'].rsplit('.', 1)[0]
+        doc.setdefault('latest', doc['version'] == latest[instance])
+        if '_timestamp' not in doc:
+            try:
+                day = datetime.datetime.strptime(doc['version'][:8], '%Y%m%d')
+            except ValueError:
+                day = datetime.datetime(2010, 1, 1)
+            doc['_timestamp'] = day.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    return completed
+
+
+#%%
+def load_fixtures(paths, variable='thetao'):
+    """
+    Parameters
+    ----------
+    paths : list
+        recorded harvest files ({'response': {'docs': [...]}}, a list of docs
+        or NDJSON, one doc per line)
+    variable : str, optional
+        CMIP5 variable, see complete_docs. The default is 'thetao'.
+
+    Returns
+    -------
+    docs : list
+        completed documents, see complete_docs
+
+    """
+    docs = []
+    for path in paths:
+        with open(path) as f:
+            text = f.read()
+        try:
+            js = json.loads(text)
+        except ValueError:
+            js = [json.loads(line) for line in text.splitlines() if line.strip()]
+        if isinstance(js, dict):
+            js = js['response']['docs']
+        docs.extend(js)
+    return complete_docs(docs, variable=variable)
+
+
+def synthetic_docs(scale=1, seed=0, variables=('thetao',)):
+    """
+    Parameters
+    ----------
+    scale : int, optional
+        institutions per project (sources, experiments and members scale
+        with it). The default is 1.
+    seed : int, optional
+        random seed, fixtures are reproducible. The default is 0.
+    variables : tuple, optional
+        variables per member, CMIP5 datasets hold all of them. The default
+        is ('thetao',).
+
+    Returns
+    -------
+    docs : list
+        completed CMIP6, CMIP5 and CMIP3 documents with replicas and
+        superseded versions
+
+    """
+    rand = random.Random(seed)
+    nodes = ['aims3.llnl.gov', 'esgf-data3.ceda.ac.uk', 'esgf.nci.org.au',
+             'esgf-data1.llnl.gov']
+    acts = {'CMIP': ['historical', 'piControl', '1pctCO2', 'abrupt-4xCO2'],
+            'ScenarioMIP': ['ssp126', 'ssp245', 'ssp585'],
+            'DAMIP': ['hist-GHG', 'hist-nat'],
+            'OMIP': ['omip1', 'omip2'],
+            'C4MIP': ['esm-ssp585'], 'FAFMIP': ['faf-heat'],
+            'HighResMIP': ['hist-1950'], 'PMIP': ['lig127k']}
+    exps5 = ['historical', 'piControl', 'rcp45', 'rcp85', 'esmFdbk1',
+             'historicalGHG', 'decadal1960', 'midHolocene', 'noVolc1960']
+    exps3 = ['historical', 'picntrl', 'sresa1b', 'sresb1']
+    ids = []
+
+    def versions():
+        # Distinct dates, id is the Solr unique key
+        days = rand.sample(range(12 * 28), rand.choice([1, 1, 2]))
+        return ['v2019{:02d}{:02d}'.format(day // 28 + 1, day % 28 + 1)
+                for day in days]
+
+    def replicas(master):
+        for node in rand.sample(nodes, rand.choice([1, 1, 2, 3])):
+            ids.append('|'.join([master, node]))
+
+    for inst in range(scale):
+        for src in range(1 + scale // 2):
+            for actId, exps in acts.items():
+                for expId in exps:
+                    for member in range(1, 2 + scale):
+                        for verId in versions():
+                            for varId in variables:
+                                replicas('.'.join([
+                                    'CMIP6', actId, 'INST{}'.format(inst),
+                                    'SRC{}-{}'.format(inst, src), expId,
+                                    'r{}i1p1f1'.format(member), 'Omon', varId,
+                                    'gn', verId]))
+            for expId in exps5:
+                for member in range(1, 2 + scale):
+                    for verId in versions():
+                        replicas('.'.join([
+                            'cmip5', 'output1', 'INST{}'.format(inst),
+                            'MOD{}-{}'.format(inst, src), expId, 'mon',
+                            'ocean', 'Omon', 'r{}i1p1'.format(member),
+                            verId]))
+            for expId in exps3:
+                for member in range(1, 2 + scale):
+                    for varId in variables:
+                        replicas('.'.join([
+                            'cmip3', 'INST{}'.format(inst),
+                            'mod{}_{}'.format(inst, src), expId, 'mon',
+                            'ocean', 'run{}'.format(member), varId, 'v1']))
+    return complete_docs([{'id': dataset_id} for dataset_id in ids],
+                         variable=list(variables))
+
+
+#%%
+def match_filter(doc, fq):
+    """
+    Parameters
+    ----------
+    doc : dict
+        Solr document
+    fq : str
+        filter query, field:value, field:(a OR b) or field:[start TO end]
+
+    Returns
+    -------
+    match : bool
+
+    """
+    field, _, expr = fq.partition(':')
+    value = doc.get(field)
+    if value is None:
+        return False
+    values = value if isinstance(value, list) else [value]
+    values = [str(val).lower() if isinstance(val, bool) else str(val)
+              for val in values]
+    if expr[:1] in '[{' and ' TO ' in expr:
+        start, _, end = expr[1:-1].partition(' TO ')
+        for val in values:
+            if start != '*' and (val < start or
+                                 (expr[0] == '{' and val == start)):
+                continue
+            if end != '*' and (val > end or (expr[-1] == '}' and val == end)):
+                continue
+            return True
+        return False
+    if expr.startswith('(') and expr.endswith(')'):
+        options = [opt.strip().strip('"') for opt in expr[1:-1].split(' OR ')]
+    else:
+        options = [expr.strip('"')]
+    return '*' in options or any(val in options for val in values)
+
+
+def pivot_counts(docs, fields):
+    """
+    Parameters
+    ----------
+    docs : list
+        matching Solr documents
+    fields : list
+        facet.pivot field names
+
+    Returns
+    -------
+    pivots : list
+        Solr facet_pivot entries [{'field', 'value', 'count', 'pivot'}, ...]
+
+    """
+    field = fields[0]
+    groups = {}
+    for doc in docs:
+        value = doc.get(field)
+        for val in (value if isinstance(value, list) else [value]):
+            if val is not None:
+                groups.setdefault(val, []).append(doc)
+    pivots = []
+    for val in sorted(groups, key=lambda key: (-len(groups[key]), key)):
+        entry = {'field': field, 'value': val, 'count': len(groups[val])}
+        if len(fields) > 1:
+            entry['pivot'] = pivot_counts(groups[val], fields[1:])
+        pivots.append(entry)
+    return pivots
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler, configuration is held on the server instance"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        # Injected latency and failures
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.rand.uniform(0, server.jitter))
+        if server.hang_rate and server.rand.random() < server.hang_rate:
+            with server.stats_lock:
+                server.stats['hangs'] += 1
+            time.sleep(server.hang_seconds)
+        if server.fail_rate and server.rand.random() < server.fail_rate:
+            with server.stats_lock:
+                server.stats['failures'] += 1
+            self.send_body(503, b'{"error": "injected failure"}')
+            return
+        url = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        if url.path.rstrip('/').endswith('esg-search/search'):
+            shards = '{}:{}/solr'.format(*self.server.server_address[:2])
+            js = {'responseHeader': {'status': 0, 'params': {
+                  'shards': shards}},
+                  'response': {'numFound': len(server.docs), 'docs': []}}
+        elif url.path.rstrip('/').endswith('solr/datasets/select'):
+            js = self.select(params)
+        else:
+            self.send_body(404, b'{"error": "not found"}')
+            return
+        self.send_body(200, json.dumps(js).encode('utf-8'))
+
+    def select(self, params):
+        docs = self.server.docs
+        for fq in params.get('fq', []):
+            docs = [doc for doc in docs if match_filter(doc, fq)]
+        sort = params.get('sort', [''])[0]
+        if sort.startswith('id'):
+            docs = sorted(docs, key=lambda doc: doc['id'],
+                          reverse=sort.endswith('desc'))
+        start = int(params.get('start', ['0'])[0])
+        rows = int(params.get('rows', ['10'])[0])
+        page = docs[start:start + rows]
+        fl = params.get('fl', [''])[0]
+        if fl and fl != '*':
+            names = fl.split(',')
+            page = [{name: doc[name] for name in names if name in doc}
+                    for doc in page]
+        js = {'responseHeader': {'status': 0, 'params': {
+              key: val[-1] for key, val in params.items()}},
+              'response': {'numFound': len(docs), 'start': start,
+                           'docs': page}}
+        if 'facet.pivot' in params:
+            pivots = {}
+            for pivot in params['facet.pivot']:
+                pivots[pivot] = pivot_counts(docs, pivot.split(','))
+            js['facet_counts'] = {'facet_pivot': pivots}
+        return js
+
+    def send_body(self, status, body):
+        accept = self.headers.get('Accept-Encoding', '')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in accept:
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.stats_lock:
+            self.server.stats['bytes'] += len(body)
+
+
+def start_server(docs, host='127.0.0.1', port=0, latency=0., jitter=0.,
+                 fail_rate=0., hang_rate=0., hang_seconds=60., seed=0,
+                 verbose=False):
+    """
+    Start a stand-in server on a background thread
+
+    Parameters
+    ----------
+    docs : list
+        completed Solr documents, see load_fixtures and synthetic_docs
+    host, port : str, int, optional
+        bind address, port 0 picks a free port
+    latency, jitter : float, optional
+        seconds added to every request, plus uniform random jitter
+    fail_rate : float, optional
+        fraction of requests answered with 503
+    hang_rate, hang_seconds : float, optional
+        fraction of requests stalled for hang_seconds (client timeouts)
+    seed : int, optional
+        random seed for injected latency and failures
+    verbose : bool, optional
+        log each request
+
+    Returns
+    -------
+    server : http.server.ThreadingHTTPServer
+        running server, server.url is the ESGF_NODE value, server.stats the
+        request/failure/byte counters; stop with server.shutdown()
+
+    """
+    server = http.server.ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.docs = docs
+    server.latency = latency
+    server.jitter = jitter
+    server.fail_rate = fail_rate
+    server.hang_rate = hang_rate
+    server.hang_seconds = hang_seconds
+    server.rand = random.Random(seed)
+    server.verbose = verbose
+    server.stats = {'requests': 0, 'failures': 0, 'hangs': 0, 'bytes': 0}
+    server.stats_lock = threading.Lock()
+    server.url = 'http://{}:{}'.format(*server.server_address[:2])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+#%%
+def main():
+
+    parser = argparse.ArgumentParser(description="Local ESGF index node stand-in")
+    parser.add_argument("fixtures", nargs="*", help="Recorded harvest files (*_ESGF-Datasets.json, doc lists or NDJSON)")
+    parser.add_argument("--synthetic", "-s", dest="synthetic", type=int, default=0, help="Add synthetic fixtures at this scale (default is 0, none)")
+    parser.add_argument("--host", dest="host", type=str, default="127.0.0.1", help="Bind address (default is 127.0.0.1)")
+    parser.add_argument("--port", "-p", dest="port", type=int, default=8983, help="Port (default is 8983)")
+    parser.add_argument("--latency", "-l", dest="latency", type=float, default=0., help="Seconds added to every request (default is 0)")
+    parser.add_argument("--jitter", "-j", dest="jitter", type=float, default=0., help="Uniform random extra latency in seconds (default is 0)")
+    parser.add_argument("--fail_rate", "-f", dest="fail_rate", type=float, default=0., help="Fraction of requests answered 503 (default is 0)")
+    parser.add_argument("--hang_rate", dest="hang_rate", type=float, default=0., help="Fraction of requests stalled for --hang_seconds (default is 0)")
+    parser.add_argument("--hang_seconds", dest="hang_seconds", type=float, default=60., help="Stall length in seconds (default is 60)")
+    parser.add_argument("--variable", dest="variable", type=str, default="thetao", help="Variable assigned to CMIP5 fixtures, whose ids carry none (default is 'thetao')")
+    parser.add_argument("--synthetic_variables", dest="synthetic_variables", type=str, default="thetao", help="Comma-separated variables per synthetic member (default is 'thetao')")
+    parser.add_argument("--seed", dest="seed", type=int, default=0, help="Random seed (default is 0)")
+    parser.add_argument("--verbose", "-v", dest="verbose", action="store_true", help="Log each request")
+    args = parser.parse_args()
+
+    docs = load_fixtures(args.fixtures, variable=args.variable)
+    if args.synthetic:
+        docs.extend(synthetic_docs(args.synthetic, seed=args.seed,
+                                   variables=args.synthetic_variables.split(',')))
+    if not docs:
+        print("No fixtures, pass harvest files or --synthetic. Exiting.")
+        return
+
+    server = start_server(docs, host=args.host, port=args.port,
+                          latency=args.latency, jitter=args.jitter,
+                          fail_rate=args.fail_rate, hang_rate=args.hang_rate,
+                          hang_seconds=args.hang_seconds, seed=args.seed,
+                          verbose=args.verbose)
+    print('Serving', len(docs), 'docs, ESGF_NODE=' + server.url)
+    try:
+        while True:
+            time.sleep(60)
+            print('stats:', server.stats)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print('stats:', server.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,15 +6,244 @@ Created on Tue May  4 14:27:40 2021
 PJD  6 May 2021     - Add sort by key
 PJD 11 May 2021     - Dealt with new directory info
 PJD  3 Jun 2021     - Updated variable_id=thetao, tos collecting atmos-only
+PJD 18 Oct 2026     - Stream paginated docs to file, rather than a single
+                        capped (rows=50000) response held in memory
+PJD 18 Oct 2026     - Concurrent harvest over all (mipEra, activity_id,
+                        variable_id) units, --workers sets thread pool size
+PJD 18 Oct 2026     - Harvest id-only documents by default (--fields), the
+                        only field readOceanMods uses
+PJD 18 Oct 2026     - Add --mode facets, harvesting the institution/source/
+                        experiment/member tree from Solr facet.pivot counts
+PJD 18 Oct 2026     - Add --incremental, query only datasets indexed since the
+                        per-unit _timestamp high-water mark and merge the delta
+                        into the previous snapshot
+PJD 18 Oct 2026     - Write docs as they are parsed from the response stream
+PJD 18 Oct 2026     - Serve repeated page queries from the on-disk response
+                        cache, --refresh forces refetches, --no_cache disables
+PJD 18 Oct 2026     - Add --variables, several variables are harvested in one
+                        OR-filtered pass per activity and counted per variable
+PJD 18 Oct 2026     - Checkpoint completed units in ESGF-Manifest.json, write
+                        files atomically (temp + rename); --resume fetches only
+                        missing or failed units rather than purging the dir
+PJD 18 Oct 2026     - Add --format, compact ndjson(.gz/.zst) snapshots
+                        (esgfSnapshot) as an alternative to Solr-shaped json
+PJD 18 Oct 2026     - Keep the retracted flag in every projection (esgfDiff
+                        retractions)
+PJD 18 Oct 2026     - --format is checked at startup, ndjson.zst without the
+                        zstandard package is a usage error
+PJD 18 Oct 2026     - Merged snapshots record the merged doc count and count
+                        variables over all merged docs; --full_every re-harvests
+                        a unit in full after N days, dropping datasets removed
+                        upstream that a delta merge keeps
+PJD 18 Oct 2026     - --resume removes the output of units it re-harvests
+                        (other --mode, --fields or --format), so readOceanMods
+                        never ingests a stale file beside the new one
 
 @author: durack1
 """
 
+import argparse
+import concurrent.futures
 import datetime
 import json
 import os
-import shutil
-from esgfQueryModels import get_dataset_time_data
+import sys
+import time
+from esgfQueryModels import (FIELD_PRESETS, VARIABLE_FIELDS,
+                             enable_response_cache, get_doc_variables,
+                             get_facet_tree, get_field_list,
+                             get_transfer_stats, get_variable_list,
+                             invalidate_shard_cache, iter_dataset_docs)
+from esgfSnapshot import (SNAPSHOT_FORMATS, SnapshotWriter, check_format,
+                          find_snapshot, iter_snapshot_docs)
+
+# High-water marks {mipEra_actId_varId: {'_timestamp', 'snapshot'}}, kept
+# alongside the YYMMDD harvest dirs
+highWaterFile = 'ESGF-HighWater.json'
+manifestFile = 'ESGF-Manifest.json'
+
+
+def writeJson(js, fileName, indent=4):
+    """
+    Write js to fileName atomically (temp file + rename), a crash never
+    leaves a truncated file behind
+    """
+    tmpFile = fileName + '.tmp'
+    with open(tmpFile, 'w', encoding='utf-8') as f:
+        json.dump(js, f, ensure_ascii=False, indent=indent, sort_keys=True)
+    os.replace(tmpFile, fileName)
+
+
+# %% functions
+def harvestUnit(mipEra, actId, varId, timeFormatDir, fields='id',
+                incremental=False, since=None, previousFile=None,
+                fmt='json'):
+    """
+    Harvest a single (mipEra, activity_id, variable_id) unit to file
+
+    Parameters
+    ----------
+    mipEra : str
+        ESGF project, e.g. 'CMIP6'
+    actId : str
+        activity_id
+    varId : str
+        variable_id, or comma-separated ids harvested in one pass
+    timeFormatDir : str
+        YYMMDD prefix for the output file
+    fields : str or list, optional
+        Solr field projection, see esgfQueryModels.get_field_list. The
+        default is 'id'.
+    incremental : bool, optional
+        Add _timestamp to the projection to track a high-water mark. The
+        default is False.
+    since : str, optional
+        _timestamp high-water mark, only datasets indexed since are queried.
+        The default is None (full harvest).
+    previousFile : str, optional
+        Earlier *_ESGF-Datasets snapshot (any format) the delta is merged
+        into. A delta only adds or updates datasets, those removed upstream
+        are kept until a full harvest (see --full_every). The default is
+        None.
+    fmt : str, optional
+        Snapshot format, see esgfSnapshot.SNAPSHOT_FORMATS. The default is
+        'json'.
+
+    Returns
+    -------
+    outFile : str
+        written *_ESGF-Datasets.<fmt> file
+    numFound : int
+        number of documents reported by Solr, or in the merged snapshot
+    count : int
+        number of documents written
+    highWater : str
+        latest _timestamp seen (or since), None if not harvested
+
+    """
+    # Keep the variable field (per-member variables), retracted (esgfDiff)
+    # and _timestamp whenever a high-water mark is kept
+    fieldList = get_field_list(fields)
+    if fieldList is not None:
+        for field in [VARIABLE_FIELDS[mipEra], 'retracted'] + \
+                (['_timestamp'] if incremental else []):
+            if field not in fieldList:
+                fieldList = fieldList + [field]
+        fields = fieldList
+    variables = get_variable_list(varId)
+    varCounts = dict.fromkeys(variables, 0)
+    # Write output, streaming docs as they arrive, renamed once complete
+    writer = SnapshotWriter('_'.join([timeFormatDir, mipEra, actId,
+                                      'ESGF-Datasets']), fmt)
+    highWater = since
+    deltaIds = set()
+    meta = {}
+    try:
+        for doc in iter_dataset_docs(project=mipEra, activity_id=actId,
+                                     variable_id=varId, start_date=since,
+                                     fields=fields, meta=meta):
+            writer.write(doc)
+            for varIdD in get_doc_variables(doc, mipEra, variables):
+                varCounts[varIdD] += 1
+            if previousFile:
+                deltaIds.add(doc['id'])
+            if '_timestamp' in doc and \
+                    (highWater is None or doc['_timestamp'] > highWater):
+                highWater = doc['_timestamp']
+        numFound = meta.get('numFound', 0)
+        # Merge delta into previous snapshot, delta docs supersede
+        if previousFile:
+            for doc in iter_snapshot_docs(previousFile):
+                if doc['id'] in deltaIds:
+                    continue
+                writer.write(doc)
+                for varIdD in get_doc_variables(doc, mipEra, variables):
+                    varCounts[varIdD] += 1
+            print('merged delta:', len(deltaIds), 'into:', previousFile)
+            numFound = writer.count
+        outFile = writer.commit(numFound)
+    except BaseException:
+        writer.abort()
+        raise
+    print(outFile, 'harvested per variable:', varCounts)
+
+    return outFile, numFound, writer.count, highWater
+
+
+def harvestFacets(mipEra, actId, varId, timeFormatDir):
+    """
+    Harvest a single (mipEra, activity_id, variable_id) unit as a facet
+    pivot tree, see harvestUnit for arguments and returns (count is the
+    number of members)
+
+    """
+    outFile = '_'.join([timeFormatDir, mipEra, actId, 'ESGF-Facets.json'])
+    js = get_facet_tree(project=mipEra, activity_id=actId, variable_id=varId)
+    count = 0
+    for instId in js['tree'].values():
+        for srcId in instId.values():
+            for actIdT in srcId.values():
+                for expId in actIdT.values():
+                    count += len(expId)
+    writeJson(js, outFile, indent=None)
+
+    return outFile, js['numFound'], count, None
+
+
+# %% Argparse extract
+parser = argparse.ArgumentParser(description="Harvest ESGF dataset indexes")
+parser.add_argument("--workers", "-w", dest="workers", type=int, default=4,
+                    help="Concurrent harvest threads (default is 4, 1 is serial)")
+parser.add_argument("--fields", "-f", dest="fields", type=str, default="id",
+                    help="".join(["Solr field projection preset (",
+                                  ", ".join(sorted(FIELD_PRESETS)),
+                                  ") or comma-separated extra fields ",
+                                  "(default is 'id')"]))
+parser.add_argument("--mode", "-m", dest="mode", type=str, default="docs",
+                    choices=["docs", "facets"],
+                    help="".join(["Harvest dataset docs, or facet pivot ",
+                                  "trees only (default is 'docs')"]))
+parser.add_argument("--incremental", "-i", dest="incremental",
+                    action="store_true",
+                    help="".join(["Query only datasets indexed since the ",
+                                  "last high-water mark and merge into the ",
+                                  "previous snapshot (docs mode)"]))
+parser.add_argument("--full_every", dest="fullEvery", type=int, default=7,
+                    help="".join(["Days after which --incremental harvests ",
+                                  "a unit in full again, dropping datasets ",
+                                  "removed upstream (default is 7)"]))
+parser.add_argument("--variables", "-v", dest="variables", type=str,
+                    default="thetao",
+                    help="".join(["Comma-separated variable_ids harvested ",
+                                  "in one pass per activity (default is ",
+                                  "'thetao')"]))
+parser.add_argument("--format", dest="format", type=str, default="json",
+                    choices=SNAPSHOT_FORMATS,
+                    help="".join(["Dataset snapshot format, ndjson.gz and ",
+                                  "ndjson.zst (needs zstandard) are compact ",
+                                  "(default is 'json')"]))
+parser.add_argument("--resume", dest="resume", action="store_true",
+                    help="".join(["Keep today's completed units (manifest) ",
+                                  "and fetch only missing or failed units"]))
+parser.add_argument("--refresh", "-r", dest="refresh", action="store_true",
+                    help="".join(["Ignore cached responses and shard lists, ",
+                                  "refetch and repopulate the cache"]))
+parser.add_argument("--no_cache", dest="noCache", action="store_true",
+                    help="Do not read or write the response cache")
+args = parser.parse_args()
+try:
+    check_format(args.format)
+except ValueError as err:
+    parser.error(str(err))
+fields = args.fields
+if fields not in FIELD_PRESETS:
+    fields = fields.split(',')
+cache = None
+if not args.noCache:
+    cache = enable_response_cache(refresh=args.refresh)
+    print('response cache:', cache.cache_dir, 'refresh:', args.refresh)
+if args.refresh:
+    invalidate_shard_cache()
 
 # %% Get time
 timeNow = datetime.datetime.now()
@@ -25,13 +254,22 @@ print('os.getcwd():', os.getcwd())
 os.chdir('..')
 print('os.getcwd():', os.getcwd())
 
-# %% Create/manage output dir
-if os.path.exists(timeFormatDir):
-    shutil.rmtree(timeFormatDir)
-    print('Existing dir', timeFormatDir, 'purged')
-os.mkdir(timeFormatDir)
+# %% Create/manage output dir, completed units are checkpointed in manifest
+if not os.path.exists(timeFormatDir):
+    os.mkdir(timeFormatDir)
 os.chdir(timeFormatDir)
 print('os.getcwd():', os.getcwd())
+manifest = {}
+if args.resume and os.path.exists(manifestFile):
+    with open(manifestFile) as f:
+        manifest = json.load(f)
+for fileName in os.listdir('.'):
+    # Partial writes are always dropped, a fresh run drops earlier output
+    if fileName.endswith('.tmp') or (not args.resume and (
+            fileName.startswith(timeFormatDir + '_') or
+            fileName == manifestFile)):
+        os.remove(fileName)
+        print('Existing file', fileName, 'purged')
 
 # %% Define MIPs and iterate
 mips = {}
@@ -40,18 +278,105 @@ mips['CMIP6'] = ['C4MIP', 'CMIP', 'DAMIP', 'FAFMIP', 'HighResMIP', 'OMIP',
 mips['CMIP5'] = ['CMIP']
 mips['CMIP3'] = ['CMIP']
 
-# %% Loop through mipEras and actIds
-for mipEra in mips.keys():
-    print('mipEra:', mipEra)
-    for count, actId in enumerate(mips[mipEra]):
-        print('activity_id:', actId)
-        # Call function - get json output
-        js = get_dataset_time_data(project=mipEra, activity_id=actId,
-                                   variable_id='thetao')
-        # Write output
-        outFile = '_'.join([timeFormatDir, mipEra, actId,
-                            'ESGF-Datasets.json'])
-        print('outFile:', outFile)
-        print('JSON response numFound:', js['response']['numFound'])
-        with open(outFile, 'w', encoding='utf-8') as f:
-            json.dump(js, f, ensure_ascii=False, indent=4, sort_keys=True)
+# %% Load high-water marks {..., 'full': YYMMDD of the last full harvest},
+# delta harvests need the matching snapshot
+highWater = {}
+if args.incremental and os.path.exists(os.path.join('..', highWaterFile)):
+    with open(os.path.join('..', highWaterFile)) as f:
+        highWater = json.load(f)
+
+# %% Submit all mipEra/actId units, write each as it completes
+varIds = ','.join(get_variable_list(args.variables))
+units = [(mipEra, actId, varIds) for mipEra in mips.keys()
+         for actId in mips[mipEra]]
+timeStart = time.time()
+with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, args.workers)) as executor:
+    futures = {}
+    sinces = {}
+    for mipEra, actId, varId in units:
+        entry = manifest.get('_'.join([mipEra, actId, varId]), {})
+        if entry.get('status') == 'done' and entry['mode'] == args.mode and \
+                entry['fields'] == args.fields and \
+                entry.get('format', 'json') == args.format and \
+                os.path.exists(entry['outFile']):
+            print('resume skip mipEra:', mipEra, 'activity_id:', actId,
+                  'variable_id:', varId, 'outFile:', entry['outFile'])
+            continue
+        if entry.get('outFile') and os.path.exists(entry['outFile']):
+            # Earlier run with another mode, fields or format
+            os.remove(entry['outFile'])
+            print('Existing file', entry['outFile'], 'purged')
+        print('submit mipEra:', mipEra, 'activity_id:', actId,
+              'variable_id:', varId)
+        if args.mode == 'facets':
+            future = executor.submit(harvestFacets, mipEra, actId, varId,
+                                     timeFormatDir)
+        else:
+            since = None
+            previousFile = None
+            if args.incremental:
+                mark = highWater.get('_'.join([mipEra, actId, varId]), {})
+                snapshot = mark.get('snapshot')
+                previousFile = find_snapshot(os.path.join(
+                    '..', str(snapshot), '_'.join([str(snapshot), mipEra, actId,
+                                                   'ESGF-Datasets'])))
+                fullAge = (timeNow - datetime.datetime.strptime(
+                    mark['full'], '%y%m%d')).days if mark.get('full') else None
+                if snapshot and snapshot != timeFormatDir and previousFile \
+                        and fullAge is not None and fullAge < args.fullEvery:
+                    since = mark['_timestamp']
+                else:
+                    # No usable snapshot or a due full harvest, which drops
+                    # removed datasets and establishes the mark
+                    previousFile = None
+                print('incremental since:', since, 'previous:', previousFile)
+            future = executor.submit(harvestUnit, mipEra, actId, varId,
+                                     timeFormatDir, fields,
+                                     args.incremental, since, previousFile,
+                                     args.format)
+            sinces['_'.join([mipEra, actId, varId])] = since
+        futures[future] = (mipEra, actId, varId)
+    # Checkpoint each unit as it completes, failures are retried by --resume
+    for future in concurrent.futures.as_completed(futures):
+        unitKey = '_'.join(futures[future])
+        entry = {'mode': args.mode, 'fields': args.fields,
+                 'format': args.format,
+                 'finished': datetime.datetime.now().isoformat()}
+        try:
+            outFile, numFound, count, mark = future.result()
+        except Exception as err:
+            print('** unit failed:', unitKey, err, '**')
+            entry.update({'status': 'failed', 'error': str(err)})
+        else:
+            print('outFile:', outFile)
+            print('JSON response numFound:', numFound, 'written:', count)
+            entry.update({'status': 'done', 'outFile': outFile,
+                          'numFound': numFound, 'count': count,
+                          'highWater': mark,
+                          'full': sinces.get(unitKey) is None})
+        manifest[unitKey] = entry
+        writeJson(manifest, manifestFile)
+print('harvest time (s):', round(time.time() - timeStart, 1))
+print('transfer stats:', get_transfer_stats())
+if cache is not None:
+    cache.close()
+    print('cache stats:', cache.stats())
+
+# %% Persist high-water marks of completed units
+if args.incremental:
+    for unitKey, entry in manifest.items():
+        if entry['status'] == 'done' and entry.get('highWater') is not None:
+            full = timeFormatDir if entry.get('full') else \
+                highWater.get(unitKey, {}).get('full')
+            highWater[unitKey] = {'_timestamp': entry['highWater'],
+                                  'snapshot': timeFormatDir, 'full': full}
+    writeJson(highWater, os.path.join('..', highWaterFile))
+    print('highWaterFile:', highWaterFile)
+
+# %% Report failed units
+failed = sorted(unitKey for unitKey, entry in manifest.items()
+                if entry['status'] == 'failed')
+if failed:
+    print('** failed units:', failed, 'rerun with --resume **')
+    sys.exit(1)
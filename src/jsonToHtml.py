@@ -50,6 +50,11 @@ PJD 14 Jun 2023     - update to use pcmdi.github.io/assets jquery libraries so t
 PJD 15 Jun 2023     - updated github.com/pcmdi/assets to use github-pages - so https://pcmdi.github.io/assets/ resolves, as do symlinks    
 PJD 26 Jun 2023     - updated github.com/pcmdi/assets to separate jquery/dataTables source - see https://github.com/PCMDI/assets/pull/5
 PJD 23 Jan 2024     - updated to include E3SM-2-0 entries; needed parens switch out for AMS ..(1995).. dois
+PJD 18 Oct 2026     - read sparse CMIP_Merge.json, member values resolved with cmipLookup.memberConfig
+PJD 18 Oct 2026     - add --changes, only rewrite pages of mipEras changed in an esgfDiff change log
+PJD 18 Oct 2026     - member values from a cmipLookup.ConfigRules index compiled once per run
+PJD 18 Oct 2026     - --changes also rewrites mipEras whose modeller entries changed since the
+                    last write (../CMIP_Modeller-Pages.json)
                                         
                    - TODO: Update default page lengths
                    - TODO: Use <td rowspan="2">$50</td> across multiple actIds
@@ -65,6 +70,9 @@ import pdb
 import re
 import sys
 
+from cmipLookup import ConfigRules, loadTree, mipEras
+from esgfDiff import changed_sources
+
 # %% Functions
 
 
@@ -256,6 +264,17 @@ parser.add_argument(
         ]
     ),
 )
+parser.add_argument(
+    "--changes",
+    type=str,
+    default=None,
+    help=" ".join(
+        [
+            "esgfDiff change log (json), only pages of mipEras",
+            "with changed members are rewritten",
+        ]
+    ),
+)
 args = parser.parse_args()
 if re.search(verTest, args.ver):
     version = args.ver  # 1 = make files
@@ -263,18 +282,49 @@ if re.search(verTest, args.ver):
 else:
     print("** Version: ", args.ver, " invalid, exiting")
     sys.exit()
+changedEras = None
+if args.changes:
+    with open(args.changes) as jsonFile:
+        changedEras = {source[0] for source in changed_sources(json.load(jsonFile))}
+    print("** Changed mipEras: ", sorted(changedEras), " **")
 
 # %% Set global arguments
 destDir = "../docs/"
 
 # %% Read data
 inFile = "../CMIP_Merge.json"
-with open(inFile) as jsonFile:
-    CMIP = json.load(jsonFile)
-CMIP6 = CMIP.get("CMIP6")
-CMIP5 = CMIP.get("CMIP5")
-CMIP3 = CMIP.get("CMIP3")
-versionInfo = CMIP.get("version")
+CMIPTree = loadTree(inFile)
+# Compiled modeller entries, one lookup per member
+CMIPRules = ConfigRules(CMIPTree)
+CMIP6 = CMIPTree.get("CMIP6")
+CMIP5 = CMIPTree.get("CMIP5")
+CMIP3 = CMIPTree.get("CMIP3")
+versionInfo = CMIPTree.get("version")
+
+# Modeller entries the pages are written from, --changes also rewrites the
+# pages of mipEras whose entries differ from the last write (registry edits)
+pagesFile = "../CMIP_Modeller-Pages.json"
+pageConfigs = {
+    mipEra: {
+        instId: {
+            srcId: source["config"]
+            for srcId, source in srcs.items()
+            if "config" in source
+        }
+        for instId, srcs in CMIPTree["sources"][mipEra].items()
+    }
+    for mipEra in mipEras
+}
+if changedEras is not None:
+    lastConfigs = {}
+    if os.path.exists(pagesFile):
+        with open(pagesFile) as jsonFile:
+            lastConfigs = json.load(jsonFile)
+    configEras = {
+        mipEra for mipEra in mipEras if pageConfigs[mipEra] != lastConfigs.get(mipEra)
+    }
+    print("** Changed modeller entries: ", sorted(configEras), " **")
+    changedEras |= configEras
 
 # %% Process html
 
@@ -302,6 +352,8 @@ queries = {
 
 for mipEra in ["CMIP6", "CMIP5", "CMIP3", "CMIP6c", "CMIP5c", "CMIP3c"]:
     print(mipEra)
+    if changedEras is not None and mipEra[0:5] not in changedEras:
+        continue  # Page unchanged since the diffed snapshot
     CMIP = eval(mipEra[0:5])
     # Preformat inputs to be a single line for each source_id
     CMIPList = []  # [[] for _ in range(1)]
@@ -313,16 +365,7 @@ for mipEra in ["CMIP6", "CMIP5", "CMIP3", "CMIP6c", "CMIP5c", "CMIP3c"]:
                 print(count3, instId, srcId, actId)
                 for count4, expId in enumerate(CMIP[instId][srcId][actId]):
                     print(count4, instId, srcId, actId, expId)
-                    ripfList = []
-                    for count5, ripId in enumerate(CMIP[instId][srcId][actId][expId]):
-                        print(count5, instId, srcId, actId, expId, ripId)
-                        ripfList.append(ripId)
-                        # Get first ripf values
-                        if count5 == 0:
-                            for count6, query in enumerate(queries.keys()):
-                                vars()[query] = CMIP[instId][srcId][actId][expId][
-                                    ripId
-                                ][queries[query]]
+                    ripfList = list(CMIP[instId][srcId][actId][expId])
                     dump = [instId, srcId, actId, expId, ripfList]
                     print(dump)
                     CMIPList.append(dump)
@@ -402,10 +445,11 @@ for mipEra in ["CMIP6", "CMIP5", "CMIP3", "CMIP6c", "CMIP5c", "CMIP3c"]:
         ripfId = humanSort(ripfId)
         print("ripfId (humanSort):", ripfId)
 
+        # Values of ripf #1, resolved from its source_id entry
+        config = CMIPRules[mipEra[0:5], instId, srcId, actId, expId, ripfId[0]]
+
         # Check valid entries - process only complete entries if mipEra == CMIPxc
-        if (CMIP[instId][srcId][actId][expId][ripfId[0]][queries["modId"]] is None) & (
-            len(mipEra) == 6
-        ):
+        if (config["modId"] is None) & (len(mipEra) == 6):
             continue
 
         fo.write("<tr>\n<td>%s</td>\n" % instId)
@@ -421,7 +465,7 @@ for mipEra in ["CMIP6", "CMIP5", "CMIP3", "CMIP6c", "CMIP5c", "CMIP3c"]:
         # Write entries for ripf #1
         for count2, key in enumerate(queries):
             # Get query value
-            val = CMIP[instId][srcId][actId][expId][ripfId[0]][queries[key]]
+            val = config[key]
             print("key/val:", key, val)
             # if "[(http" in val:
             #    fo.write("<td>%s</td>\n" % markupSwitch(val))
@@ -434,3 +478,7 @@ for mipEra in ["CMIP6", "CMIP5", "CMIP3", "CMIP6c", "CMIP5c", "CMIP3c"]:
     fo.write("</table>")
     fo.write("""\n</body>\n</html>\n""")
     fo.close()
+
+# Modeller entries of the pages now written
+with open(pagesFile, "w", encoding="utf-8") as outJson:
+    json.dump(pageConfigs, outJson, ensure_ascii=False, indent=4, sort_keys=True)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:00:00 2026
+
+Modeller registry, the ocean model configurations (cmipLookup.queries keys)
+supplied by modelling centres. One data file per institution in
+../modeller/<instId>.json:
+
+    {"CMIP6": {"defaults": {queryKey: value},
+               "models": {srcId: {queryKey: value,
+                                  "overrides": {actId: {expId: {ripfId: {queryKey: value}}}}}}},
+     "CMIP5": {...}, "CMIP3": {...}}
+
+plus era defaults in ../modeller/_defaults.json ({mipEra: {queryKey: value}}).
+A model resolves as era defaults < institution defaults < model values, into
+the CMIP_Modeller.json entry {"all": {"all": {"all": {queryKey: value}}}};
+overrides are added as partial entries at their own level, which
+cmipLookup.memberConfig applies to matching members only. An override is
+keyed (actId, "all", "all"), (actId, expId, "all") or (actId, expId, ripfId),
+any other use of "all" is rejected (see cmipLookup.configLevel).
+
+Institution files are read and resolved on first use, and the resolved entry
+is cached ($CMIPOCEAN_CACHE/modeller_registry.json) against the size and
+mtime of the institution and defaults files, so only edited registries are
+re-resolved.
+
+Usage:
+    registry = ModellerRegistry()
+    registry.source('CMIP6', 'NOAA-GFDL', 'GFDL-CM4')
+    CMIP_modeller = registry.modeller()
+    registry.save()
+
+    python modellerRegistry.py --check
+
+PJD 18 Oct 2026 - Started
+PJD 18 Oct 2026 - Reject override shapes memberConfig cannot apply
+
+@author: durack1
+"""
+
+import argparse
+import json
+import os
+import sys
+from cmipLookup import configLevel, mipEras, queries
+
+#%%
+moduleDir = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.path.join(moduleDir, '..', 'modeller')
+DEFAULTS_FILE = '_defaults.json'
+CACHE_DIR = os.environ.get('CMIPOCEAN_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'CMIPOcean'))
+CACHE_FILE = os.path.join(CACHE_DIR, 'modeller_registry.json')
+CACHE_VERSION = 1
+
+
+class RegistryError(ValueError):
+    """
+    Invalid registry file
+    """
+
+
+def _stamp(fileName):
+    # Cache key of a registry file, [size, mtime_ns]
+    stat = os.stat(fileName)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read(fileName):
+    try:
+        with open(fileName, encoding='utf-8') as jsonFile:
+            return json.load(jsonFile)
+    except ValueError as err:
+        raise RegistryError('{}: {}'.format(fileName, err))
+
+
+def _check_fields(fields, where):
+    if not isinstance(fields, dict):
+        raise RegistryError('{}: expected {{queryKey: value}}'.format(where))
+    for key, val in fields.items():
+        if key not in queries:
+            raise RegistryError('{}: unknown key {}, expected one of {}'
+                                .format(where, key, list(queries)))
+        if isinstance(val, bool) or not (val is None or
+                                         isinstance(val, (str, int, float))):
+            raise RegistryError('{}: {} must be a string, number or null'
+                                .format(where, key))
+
+
+def _check_eras(entries, where):
+    for mipEra in entries:
+        if mipEra != '_comment' and mipEra not in mipEras:
+            raise RegistryError('{}: unknown mipEra {}, expected one of {}'
+                                .format(where, mipEra, mipEras))
+
+
+def _check_overrides(overrides, where):
+    if not isinstance(overrides, dict):
+        raise RegistryError('{}: expected {{actId: {{expId: {{ripfId: '
+                            '{{queryKey: value}}}}}}}}'.format(where))
+    for actId, exps in overrides.items():
+        if not isinstance(exps, dict):
+            raise RegistryError('{} {}: expected {{expId: {{...}}}}'
+                                .format(where, actId))
+        for expId, ripfs in exps.items():
+            if not isinstance(ripfs, dict):
+                raise RegistryError('{} {}.{}: expected {{ripfId: {{...}}}}'
+                                    .format(where, actId, expId))
+            for ripfId, fields in ripfs.items():
+                ovWhere = '{} {}.{}.{}'.format(where, actId, expId, ripfId)
+                # (all, all, all) is the model entry itself
+                if configLevel(actId, expId, ripfId) in (None, 0):
+                    raise RegistryError(
+                        '{}: expected an override keyed (actId, all, all), '
+                        '(actId, expId, all) or (actId, expId, ripfId)'
+                        .format(ovWhere))
+                _check_fields(fields, ovWhere)
+
+
+def checkDefaults(defaults, fileName=DEFAULTS_FILE):
+    """
+    Validate an era defaults file ({mipEra: {queryKey: value}})
+    """
+    _check_eras(defaults, fileName)
+    for mipEra in mipEras:
+        _check_fields(defaults.get(mipEra, {}), '{}: {}'.format(fileName,
+                                                                mipEra))
+
+
+def checkInstitution(registry, fileName):
+    """
+    Validate an institution file, see module docstring
+    """
+    _check_eras(registry, fileName)
+    for mipEra in mipEras:
+        if mipEra not in registry:
+            continue
+        where = '{}: {}'.format(fileName, mipEra)
+        entry = registry[mipEra]
+        unknown = set(entry) - {'_comment', 'defaults', 'models'}
+        if unknown:
+            raise RegistryError('{}: unknown keys {}'.format(where,
+                                                            sorted(unknown)))
+        _check_fields(entry.get('defaults', {}), where + ' defaults')
+        if not isinstance(entry.get('models'), dict):
+            raise RegistryError('{}: expected "models": {{srcId: {{...}}}}'
+                                .format(where))
+        for srcId, model in entry['models'].items():
+            modWhere = '{} {}'.format(where, srcId)
+            model = dict(model)
+            overrides = model.pop('overrides', {})
+            _check_fields(model, modWhere)
+            _check_overrides(overrides, modWhere + ' overrides')
+
+
+def resolveInstitution(registry, defaults):
+    """
+
+    Parameters
+    ----------
+    registry : dict
+        institution file, see module docstring
+    defaults : dict
+        era defaults file
+
+    Returns
+    -------
+    resolved : dict
+        {mipEra: {srcId: CMIP_Modeller.json entry}}, every queries key set
+        (None where no level supplies a value)
+
+    """
+    resolved = {}
+    for mipEra in mipEras:
+        if mipEra not in registry:
+            continue
+        entry = registry[mipEra]
+        base = dict.fromkeys(queries)
+        base.update(defaults.get(mipEra, {}))
+        base.update(entry.get('defaults', {}))
+        resolved[mipEra] = {}
+        for srcId, model in entry['models'].items():
+            fields = dict(base)
+            fields.update((key, val) for key, val in model.items()
+                          if key != 'overrides')
+            config = {'all': {'all': {'all': fields}}}
+            for actId, exps in model.get('overrides', {}).items():
+                for expId, ripfs in exps.items():
+                    for ripfId, override in ripfs.items():
+                        level = config.setdefault(actId, {}).setdefault(
+                            expId, {})
+                        level.setdefault(ripfId, {}).update(override)
+            resolved[mipEra][srcId] = config
+    return resolved
+
+
+class ModellerRegistry:
+    """
+    Lazily resolved view of a registry directory, institutions are only read
+    (or taken from the cache) when asked for
+    """
+
+    def __init__(self, registryPath=None, cacheFile=CACHE_FILE):
+        self.registryPath = registryPath or REGISTRY_DIR
+        self.cacheFile = cacheFile
+        self._defaults = None
+        self._resolved = {}
+        self._cache = None
+        self._dirty = False
+
+    def institutions(self):
+        """
+        Return the sorted instIds with a registry file
+        """
+        return sorted(fileName[:-5] for fileName in
+                      os.listdir(self.registryPath)
+                      if fileName.endswith('.json') and
+                      not fileName.startswith('_'))
+
+    def _defaultsPath(self):
+        return os.path.join(self.registryPath, DEFAULTS_FILE)
+
+    def defaults(self):
+        if self._defaults is None:
+            fileName = self._defaultsPath()
+            self._defaults = _read(fileName) if os.path.exists(fileName) \
+                else {}
+            checkDefaults(self._defaults, fileName)
+        return self._defaults
+
+    def _loadCache(self):
+        if self._cache is None:
+            self._cache = {}
+            if self.cacheFile and os.path.exists(self.cacheFile):
+                try:
+                    with open(self.cacheFile, encoding='utf-8') as jsonFile:
+                        cache = json.load(jsonFile)
+                except ValueError:
+                    cache = {}
+                if cache.get('version') == CACHE_VERSION and \
+                        cache.get('registryPath') == \
+                        os.path.abspath(self.registryPath):
+                    self._cache = cache['institutions']
+        return self._cache
+
+    def institution(self, instId):
+        """
+        Return the resolved {mipEra: {srcId: entry}} of instId, from the
+        cache if neither its file nor the era defaults changed
+        """
+        if instId in self._resolved:
+            return self._resolved[instId]
+        fileName = os.path.join(self.registryPath, instId + '.json')
+        if not os.path.exists(fileName):
+            raise KeyError('No registry file for {}: {}'.format(instId,
+                                                                fileName))
+        defaultsPath = self._defaultsPath()
+        stamp = [_stamp(fileName), _stamp(defaultsPath) if
+                 os.path.exists(defaultsPath) else None]
+        cached = self._loadCache().get(instId)
+        if cached and cached['stamp'] == stamp:
+            resolved = cached['resolved']
+        else:
+            registry = _read(fileName)
+            checkInstitution(registry, fileName)
+            resolved = resolveInstitution(registry, self.defaults())
+            self._cache[instId] = {'stamp': stamp, 'resolved': resolved}
+            self._dirty = True
+        self._resolved[instId] = resolved
+        return resolved
+
+    def source(self, mipEra, instId, srcId):
+        """
+        Return the CMIP_Modeller.json entry of srcId, None if not registered
+        """
+        try:
+            return self.institution(instId).get(mipEra, {}).get(srcId)
+        except KeyError:
+            return None
+
+    def modeller(self, institutions=None):
+        """
+
+        Parameters
+        ----------
+        institutions : list, optional
+            instIds to resolve (default is every registry file)
+
+        Returns
+        -------
+        CMIP_modeller : dict
+            {mipEra: {instId: {srcId: entry}}}, the CMIP_Modeller.json tree
+
+        """
+        CMIP_modeller = {}
+        for instId in institutions or self.institutions():
+            for mipEra, srcs in self.institution(instId).items():
+                CMIP_modeller.setdefault(mipEra, {})[instId] = srcs
+        return CMIP_modeller
+
+    def save(self):
+        """
+        Write the resolved cache if anything was (re-)resolved
+        """
+        if not self._dirty or not self.cacheFile:
+            return
+        os.makedirs(os.path.dirname(self.cacheFile), exist_ok=True)
+        tmpFile = self.cacheFile + '.tmp'
+        with open(tmpFile, 'w', encoding='utf-8') as outJson:
+            json.dump({'version': CACHE_VERSION,
+                       'registryPath': os.path.abspath(self.registryPath),
+                       'institutions': self._cache}, outJson,
+                      ensure_ascii=False)
+        os.replace(tmpFile, self.cacheFile)
+        self._dirty = False
+
+
+#%%
+def main():
+
+    parser = argparse.ArgumentParser(description="Validate and resolve the modeller registry")
+    parser.add_argument("--registry", "-r", dest="registry", type=str, default=REGISTRY_DIR, help="Registry directory (default is ../modeller)")
+    parser.add_argument("--institution", "-i", dest="institutions", nargs="+", default=None, help="institution_ids to resolve (default is all)")
+    parser.add_argument("--check", "-c", dest="check", action="store_true", help="Validate every file, ignoring the cache")
+    parser.add_argument("--out", "-o", dest="out", type=str, default=None, help="Write the resolved CMIP_Modeller.json tree to this file")
+    args = parser.parse_args()
+
+    registry = ModellerRegistry(args.registry,
+                                cacheFile=None if args.check else CACHE_FILE)
+    try:
+        CMIP_modeller = registry.modeller(args.institutions)
+    except (RegistryError, KeyError) as err:
+        print('Invalid registry:', err)
+        sys.exit(1)
+    registry.save()
+    for mipEra in mipEras:
+        for instId, srcs in sorted(CMIP_modeller.get(mipEra, {}).items()):
+            print(mipEra, instId, ', '.join(srcs))
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as outJson:
+            json.dump(CMIP_modeller, outJson, ensure_ascii=False, indent=4,
+                      sort_keys=True)
+        print('outFile:', args.out)
+
+    return CMIP_modeller
+
+
+if __name__ == '__main__':
+    main()
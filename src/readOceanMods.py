@@ -30,17 +30,73 @@ PJD 18 May 2021     - update key 'aerosol indirect effects' -> 'sulphate aer*'
 PJD 18 May 2021     - Added modId 'ocean model id (+ version)'
 PJD 21 Jun 2021     - Added geothermal heating (geotHt)
                     TODO: add version info
+PJD 18 Oct 2026     - Iterate docs through iterDocs generator, files are now
+                        streamed page-wise by getOceanMods
+PJD 18 Oct 2026     - Ingest *_ESGF-Facets.json facet pivot trees; split out
+                        actRemap (CMIP5/3 expId -> actId) and addMember
+PJD 18 Oct 2026     - iterDocs parses files incrementally (solrStream), docs
+                        are never held as a list
+PJD 18 Oct 2026     - Record the variables available per member (ripfId
+                        'variables' list), from multi-variable harvests
+PJD 18 Oct 2026     - Skip the getOceanMods manifest and partial (.tmp) files
+PJD 18 Oct 2026     - iterDocs reads any snapshot format (esgfSnapshot)
+PJD 18 Oct 2026     - siftBits, actRemap and instRemap moved to the
+                        precompiled drsParser, no per-id regex compilation
+PJD 18 Oct 2026     - Parse files over a process pool (--workers), merging
+                        partial trees; drop the per-file sleep, per-id prints
+                        only with --verbose
+PJD 18 Oct 2026     - Add --catalog, also persist parsed datasets as a
+                        dictionary-encoded columnar catalog (esgfCatalog)
+PJD 18 Oct 2026     - Add --index, also load parsed datasets into an SQLite
+                        index for facet queries (esgfIndex)
+PJD 18 Oct 2026     - Deduplicate replicas and superseded versions before
+                        building the tree, only the latest version of each
+                        dataset is added; write the replica node map
+                        ../CMIP_ESGF-Replicas.json
+PJD 18 Oct 2026     - Sparse CMIP_ESGF.json (cmipLookup), members are ripfId
+                        lists and variables are kept once per source_id, no
+                        per-member None query placeholders
+PJD 18 Oct 2026     - Add --quarantine, invalid dataset ids are written to
+                        ../CMIP_ESGF-Quarantine.json with their reason rather
+                        than exiting, --reject_threshold fails the run above
+                        a quarantined fraction
+PJD 18 Oct 2026     - Flag instId/srcId/expId unknown to CMIP6_CVs
+                        (drsParser.checkIds), replaces the inline
+                        institution_id CV copy
+PJD 18 Oct 2026     - Keep per-member variables where they differ from the
+                        source's (cmipLookup "members"), e.g. thetao but not so
+PJD 18 Oct 2026     - Exit when CMIP6_CVs are missing rather than skipping
+                        validation, --no_cv_check opts out
+PJD 18 Oct 2026     - Missing CMIP6_CVs warn once and the ids are not
+                        validated, as before; --cv_check (replaces
+                        --no_cv_check) exits instead
 
 @author: durack1
 """
 
 # %% Imports
+import argparse
+import collections
+import concurrent.futures
 import datetime
 import json
 import os
-import re
 import sys
 import time
+from cmipLookup import newTree, saveTree, sourceInfo
+from drsParser import (DrsError, actRemap, checkIds, cvDir, cvFiles, cvNames,
+                       datasetKey, instRemap, loadCVs, parseId, versionKey)
+from esgfIndex import DatasetIndex
+from esgfSnapshot import iter_snapshot_docs
+
+try:
+    from esgfCatalog import Catalog, CatalogBuilder
+except ImportError:  # numpy
+    Catalog = CatalogBuilder = None
+
+# %% Per-file parse result, see parseFile
+ParsedFile = collections.namedtuple('ParsedFile', [
+    'mips', 'cat', 'rows', 'replicas', 'rejects', 'docs', 'unknown'])
 
 # %% functions
 
@@ -50,331 +106,246 @@ def siftBits(tmpId):
 
     Parameters
     ----------
-    tmpId : TYPE
-        DESCRIPTION.
+    tmpId : str
+        dataset id
 
     Returns
     -------
-    mipEra : TYPE
-        DESCRIPTION.
-    actId : TYPE
-        DESCRIPTION.
-    instId : TYPE
-        DESCRIPTION.
-    srcId : TYPE
-        DESCRIPTION.
-    expId : TYPE
-        DESCRIPTION.
-    ripfId : TYPE
-        DESCRIPTION.
-    tabId : TYPE
-        DESCRIPTION.
-    varId : TYPE
-        DESCRIPTION.
-    gridId : TYPE
-        DESCRIPTION.
-    verId : TYPE
-        DESCRIPTION.
-    nodeId : TYPE
-        DESCRIPTION.
+    rec : drsParser.DrsRecord
+        (mipEra, actId, instId, srcId, expId, ripfId, tabId, varId, gridId,
+         verId, nodeId), exits on an invalid id
 
     """
-    # CMIP6.ScenarioMIP.NCAR.CESM2-WACCM.ssp126.r1i1p1f1.Oday.tos.gn.v20190815|esgf-data3.ceda.ac.uk
-    # cmip5.output1.NOAA-GFDL.GFDL-ESM2M.historicalMisc.day.ocean.day.r1i1p3.v20110601|aims3.llnl.gov
-    # cmip3.GFDL.gfdl_cm2_0.historical.mon.ocean.run3.tos.v1|aims3.llnl.gov
-    docId = tmpId.split('|')
-    modId = docId[0].split('.')
-    mipEra = modId[0].upper()
-    # validate mipEra
-    mipTest = re.compile('^CMIP\d{1}')
-    if not mipTest.match(mipEra):
-        print('** mipEra format invalid - mipTest: ', mipEra,
-              ', exiting.. **')
-        sys.exit()
-    # Parse dependent on mipEra indexes
-    if 'CMIP6' in mipEra:
-        actId = modId[1]
-        instId = modId[2]
-        srcId = modId[3]
-        # validate srcId
-        expId = modId[4]
-        ripfId = modId[5]
-        ripfTest = re.compile('^r\d{1,4}i\d{1,4}p\d{1,3}f\d{1,3}')
-        tabId = modId[6]
-        varId = modId[7]
-        gridId = modId[8]
-        verTest = re.compile('^v\d{8}')
-    elif 'CMIP5' in mipEra:
-        actId = 'CMIP'
-        instId = modId[2]
-        srcId = modId[3]
-        # validate srcId
-        expId = modId[4]
-        # Kludge actId from expId
-        if expId in ['esmControl', 'esmHistorical']:
-            actId = 'CMIP'
-        expTest = re.compile('^esmF*')
-        tmp = expTest.match(expId)
-        if tmp and tmp.span()[1] == 4:
-            actId = 'C4MIP'
-        if expId in ['historicalGHG', 'historicalMisc', 'historicalNat']:
-            actId = 'DAMIP'
-        expTest = re.compile('^decadal\d{1,4}')
-        if expTest.match(expId):
-            actId = 'DCPP'
-        if expId in ['midHolocene', 'past1000']:
-            actId = 'PMIP'
-        expTest = re.compile('^esmrcp\d{1,2}')
-        if expTest.match(expId):
-            actId = 'ScenarioMIP'
-        expTest = re.compile('^rcp\d{1,2}')
-        if expTest.match(expId):
-            actId = 'ScenarioMIP'
-        expTest = re.compile('^sst20\d{1,2}')
-        if expTest.match(expId):
-            actId = 'ScenarioMIP'
-        expTest = re.compile('^noVolc\d{1,4}')
-        if expTest.match(expId):
-            actId = 'VolMIP'
-        expTest = re.compile('^volcIn\d{1,4}')
-        if expTest.match(expId):
-            actId = 'VolMIP'
-        # Kludge - poor indexes, missing tableId
-        if ('CCCma' in instId and 'CanCM4' in srcId and
-            'v20130331' in modId[-1]
-            and expId in ['decadal1960', 'decadal1961', 'decadal1962',
-                          'decadal1963', 'decadal1964', 'decadal1965',
-                          'decadal1966', 'decadal1967', 'decadal1968',
-                          'decadal1969', 'decadal1970', 'decadal1971',
-                          'decadal1972', 'decadal1973', 'decadal1974',
-                          'decadal1975', 'decadal1976', 'decadal1977',
-                          'decadal1978', 'decadal1979', 'decadal1980',
-                          'decadal1981', 'decadal1982', 'decadal1983',
-                          'decadal1984', 'decadal1985', 'decadal1986',
-                          'decadal1987', 'decadal1988', 'decadal1989',
-                          'decadal1990', 'decadal1991', 'decadal1992',
-                          'decadal1993', 'decadal1994', 'decadal1995',
-                          'decadal1996', 'decadal1997', 'decadal1998',
-                          'decadal1999', 'decadal2000', 'decadal2001',
-                          'decadal2002', 'decadal2003', 'decadal2004',
-                          'decadal2005', 'decadal2006', 'decadal2007',
-                          'decadal2008', 'decadal2009', 'decadal2010',
-                          'decadal2011', 'decadal2012', 'decadal2013',
-                          'decadal2014', 'decadal2015',
-                          'historical', 'rcp45']) or\
-            ('CCCma' in instId and 'CanESM2' in srcId and
-             'v20130331' in modId[-1]
-             and expId in ['1pctCO2', 'abrupt4xCO2', 'esmControl', 'esmFdbk1',
-                           'esmFdbk2', 'esmFixClim1', 'esmFixClim2',
-                           'esmHistorical', 'esmrcp85', 'historical',
-                           'historicalExt', 'historicalGHG', 'historicalMisc',
-                           'historicalNat', 'piControl',
-                           'rcp26', 'rcp45', 'rcp85']):
-            ripfId = modId[7]
-        else:
-            ripfId = modId[8]
-        ripfTest = re.compile('^r\d{1,2}i\d{1,2}p\d{1,3}')
-        tabId = '.'.join([modId[6], modId[5]])
-        varId = None  # solr scrape was 'tos'
-        gridId = None
-        verTest = re.compile('^v\d{1,8}')
-    elif 'CMIP3' in mipEra:
-        actId = 'CMIP'
-        instId = modId[1]
-        # Kludge for wrong instId
-        if instId in 'CSIRO-QCCCE':
-            instId = 'CSIRO'
-        srcId = modId[2]
-        # validate srcId
-        expId = modId[3]
-        # Kludge actId from expId
-        expTest = re.compile('^sres[a-b]\d')
-        if expTest.match(expId):
-            actId = 'ScenarioMIP'
-        ripfId = modId[6]
-        ripfTest = re.compile('^run\d{1}')
-        tabId = '.'.join([modId[5], modId[4]])
-        varId = modId[7]
-        gridId = None
-        verTest = re.compile('^v\d{1}')
-        pass
-    # Get generics and validate
-    verId = modId[-1]
-    nodeId = docId[1]
-    # Remap institutions to CMIP6
-    instId = instRemap(instId)
-    # Print for testing
-    # print('mipEra:', mipEra)
-    # print('actId:', actId)
-    # print('instId:', instId)
-    # print('srcId:', srcId)
-    # print('expId:', expId)
-    # print('ripfId:', ripfId)
-    # print('tabId:', tabId)
-    # print('varId:', varId)
-    # print('gridId:', gridId)
-    # print('verId:', verId)
-    # print('nodeId:', nodeId)
-    # pdb.set_trace()
-    # validate ripfId
-    if not ripfTest.match(ripfId):
-        print('** ripfId format invalid - ripfTest: ', ripfId,
-              ', exiting.. **')
-        sys.exit()
-    # validate verId
-    if not verTest.match(verId):
-        print('** verId format invalid - verTest: ', verId,
-              ', exiting.. **')
+    try:
+        return parseId(tmpId)
+    except DrsError as err:
+        print('**', err, ', exiting.. **')
         sys.exit()
 
-    return mipEra, actId, instId, srcId, expId, ripfId, tabId, varId, gridId,\
-        verId, nodeId
 
+def addMember(mips, mipEra, instId, srcId, actId, expId, ripfId,
+              variables=None):
+    """
+
+    Parameters
+    ----------
+    mips : dict
+        sparse mipEra > instId > srcId > actId > expId > {ripfId} tree
+        (cmipLookup), updated in place
+    mipEra, instId, srcId, actId, expId, ripfId : str
+        tree keys
+    variables : list, optional
+        variable_ids available for the member, merged into the member's and
+        the source's 'variables' sets (members equal to their source are
+        dropped by cmipLookup.saveTree). The default is None.
 
-def instRemap(instId):
+    """
+    exps = mips[mipEra].setdefault(instId, {}).setdefault(
+        srcId, {}).setdefault(actId, {})
+    exps.setdefault(expId, set()).add(ripfId)
+    source = sourceInfo(mips, mipEra, instId, srcId, create=True)
+    source.setdefault('variables', set()).update(variables or [])
+    if variables:
+        source.setdefault('members', {}).setdefault(actId, {}).setdefault(
+            expId, {}).setdefault(ripfId, set()).update(variables)
+
+
+def docVariables(doc, varId):
     """
 
     Parameters
     ----------
-    instId : TYPE
-        DESCRIPTION.
+    doc : dict
+        Solr dataset document
+    varId : str
+        variable_id parsed from the dataset id (None for CMIP5)
 
     Returns
     -------
-    instId : TYPE
-        DESCRIPTION.
+    variables : list
+        variable_id (CMIP6) or variable (CMIP5/3) field values, else varId
 
     """
-    # Create CMIP6 alias for earlier mipEras
-    if instId in ['CAS', 'IAP', 'LASG-CESS', 'LASG-IAP']:
-        instId = 'CAS'
-    if instId in ['CMCC', 'INGV']:
-        instId = 'CMCC'
-    if instId in ['CRNM_CERFACS', 'CNRM-CERFACS']:
-        instId = 'CNRM-CERFACS'
-    if instId in ['CSIRO', 'CSIRO-BOM']:
-        instId = 'CSIRO'
-    if instId in ['EC-Earth-Consortium', 'ICHEC']:
-        instId = 'EC-Earth-Consortium'
-    if instId in ['FIO-QLNM', 'FIO']:
-        instId = 'FIO-QLNM'
-    if instId in ['NCAR', 'NSF-DOE-NCAR']:
-        instId = 'NCAR'
-    if instId in ['NCC', 'BCCR']:
-        instId = 'NCC'
-    if instId in ['NIMS-KMA', 'NIMR-KMA']:
-        instId = 'NIMS-KMA'
-    if instId in ['NOAA-GFDL', 'GFDL']:
-        instId = 'NOAA-GFDL'
-
-    return instId
-
-
-'''
-https://github.com/WCRP-CMIP/CMIP6_CVs/blob/master/CMIP6_institution_id.json 210506 1231
-"AER":"Research and Climate Group, Atmospheric and Environmental Research, 131 Hartwell Avenue, Lexington, MA 02421, USA",
-"AS-RCEC":"Research Center for Environmental Changes, Academia Sinica, Nankang, Taipei 11529, Taiwan",
-"AWI":"Alfred Wegener Institute, Helmholtz Centre for Polar and Marine Research, Am Handelshafen 12, 27570 Bremerhaven, Germany",
-"BCC":"Beijing Climate Center, Beijing 100081, China",
-"BNU":"Beijing Normal University, Beijing 100875, China",
-"CAMS":"Chinese Academy of Meteorological Sciences, Beijing 100081, China",
-"CAS":"Chinese Academy of Sciences, Beijing 100029, China",
-"CCCR-IITM":"Centre for Climate Change Research, Indian Institute of Tropical Meteorology Pune, Maharashtra 411 008, India",
-"CCCma":"Canadian Centre for Climate Modelling and Analysis, Environment and Climate Change Canada, Victoria, BC V8P 5C2, Canada",
-"CMCC":"Fondazione Centro Euro-Mediterraneo sui Cambiamenti Climatici, Lecce 73100, Italy",
-"CNRM-CERFACS":"CNRM (Centre National de Recherches Meteorologiques, Toulouse 31057, France), CERFACS (Centre Europeen de Recherche et de Formation Avancee en Calcul Scientifique, Toulouse 31057, France)",
-"CSIR-Wits-CSIRO":"CSIR (Council for Scientific and Industrial Research - Natural Resources and the Environment, Pretoria, 0001, South Africa), Wits (University of the Witwatersrand - Global Change Institute, Johannesburg 2050, South Africa), CSIRO (Commonwealth Scientific and Industrial Research Organisation, Aspendale, Victoria 3195, Australia)Mailing address: Wits, Global Change Institute, Johannesburg 2050, South Africa",
-"CSIRO":"Commonwealth Scientific and Industrial Research Organisation, Aspendale, Victoria 3195, Australia",
-"CSIRO-ARCCSS":"CSIRO (Commonwealth Scientific and Industrial Research Organisation, Aspendale, Victoria 3195, Australia), ARCCSS (Australian Research Council Centre of Excellence for Climate System Science). Mailing address: CSIRO, c/o Simon J. Marsland, 107-121 Station Street, Aspendale, Victoria 3195, Australia",
-"CSIRO-COSIMA":"CSIRO (Commonwealth Scientific and Industrial Research Organisation, Australia), COSIMA (Consortium for Ocean-Sea Ice Modelling in Australia). Mailing address: CSIRO, c/o Simon J. Marsland, 107-121 Station Street, Aspendale, Victoria 3195, Australia",
-"DKRZ":"Deutsches Klimarechenzentrum, Hamburg 20146, Germany",
-"DWD":"Deutscher Wetterdienst, Offenbach am Main 63067, Germany",
-"E3SM-Project":"LLNL (Lawrence Livermore National Laboratory, Livermore, CA 94550, USA); ANL (Argonne National Laboratory, Argonne, IL 60439, USA); BNL (Brookhaven National Laboratory, Upton, NY 11973, USA); LANL (Los Alamos National Laboratory, Los Alamos, NM 87545, USA); LBNL (Lawrence Berkeley National Laboratory, Berkeley, CA 94720, USA); ORNL (Oak Ridge National Laboratory, Oak Ridge, TN 37831, USA); PNNL (Pacific Northwest National Laboratory, Richland, WA 99352, USA); SNL (Sandia National Laboratories, Albuquerque, NM 87185, USA). Mailing address: LLNL Climate Program, c/o David C. Bader, Principal Investigator, L-103, 7000 East Avenue, Livermore, CA 94550, USA",
-"EC-Earth-Consortium":"AEMET, Spain; BSC, Spain; CNR-ISAC, Italy; DMI, Denmark; ENEA, Italy; FMI, Finland; Geomar, Germany; ICHEC, Ireland; ICTP, Italy; IDL, Portugal; IMAU, The Netherlands; IPMA, Portugal; KIT, Karlsruhe, Germany; KNMI, The Netherlands; Lund University, Sweden; Met Eireann, Ireland; NLeSC, The Netherlands; NTNU, Norway; Oxford University, UK; surfSARA, The Netherlands; SMHI, Sweden; Stockholm University, Sweden; Unite ASTR, Belgium; University College Dublin, Ireland; University of Bergen, Norway; University of Copenhagen, Denmark; University of Helsinki, Finland; University of Santiago de Compostela, Spain; Uppsala University, Sweden; Utrecht University, The Netherlands; Vrije Universiteit Amsterdam, the Netherlands; Wageningen University, The Netherlands. Mailing address: EC-Earth consortium, Rossby Center, Swedish Meteorological and Hydrological Institute/SMHI, SE-601 76 Norrkoping, Sweden",
-"ECMWF":"European Centre for Medium-Range Weather Forecasts, Reading RG2 9AX, UK",
-"FIO-QLNM":"FIO (First Institute of Oceanography, Ministry of Natural Resources, Qingdao 266061, China), QNLM (Qingdao National Laboratory for Marine Science and Technology, Qingdao 266237, China)",
-"HAMMOZ-Consortium":"ETH Zurich, Switzerland; Max Planck Institut fur Meteorologie, Germany; Forschungszentrum Julich, Germany; University of Oxford, UK; Finnish Meteorological Institute, Finland; Leibniz Institute for Tropospheric Research, Germany; Center for Climate Systems Modeling (C2SM) at ETH Zurich, Switzerland",
-"INM":"Institute for Numerical Mathematics, Russian Academy of Science, Moscow 119991, Russia",
-"INPE":"National Institute for Space Research, Cachoeira Paulista, SP 12630-000, Brazil",
-"IPSL":"Institut Pierre Simon Laplace, Paris 75252, France",
-"KIOST":"Korea Institute of Ocean Science and Technology, Busan 49111, Republic of Korea",
-"LLNL":"Lawrence Livermore National Laboratory, Livermore, CA 94550, USA. Mailing address: LLNL Climate Program, c/o Stephen A. Klein, Principal Investigator, L-103, 7000 East Avenue, Livermore, CA 94550, USA",
-"MESSy-Consortium":"The Modular Earth Submodel System (MESSy) Consortium, represented by the Institute for Physics of the Atmosphere, Deutsches Zentrum fur Luft- und Raumfahrt (DLR), Wessling, Bavaria 82234, Germany",
-"MIROC":"JAMSTEC (Japan Agency for Marine-Earth Science and Technology, Kanagawa 236-0001, Japan), AORI (Atmosphere and Ocean Research Institute, The University of Tokyo, Chiba 277-8564, Japan), NIES (National Institute for Environmental Studies, Ibaraki 305-8506, Japan), and R-CCS (RIKEN Center for Computational Science, Hyogo 650-0047, Japan)",
-"MOHC":"Met Office Hadley Centre, Fitzroy Road, Exeter, Devon, EX1 3PB, UK",
-"MPI-M":"Max Planck Institute for Meteorology, Hamburg 20146, Germany",
-"MRI":"Meteorological Research Institute, Tsukuba, Ibaraki 305-0052, Japan",
-"NASA-GISS":"Goddard Institute for Space Studies, New York, NY 10025, USA",
-"NASA-GSFC":"NASA Goddard Space Flight Center, Greenbelt, MD 20771, USA",
-"NCAR":"National Center for Atmospheric Research, Climate and Global Dynamics Laboratory, 1850 Table Mesa Drive, Boulder, CO 80305, USA",
-"NCC":"NorESM Climate modeling Consortium consisting of CICERO (Center for International Climate and Environmental Research, Oslo 0349), MET-Norway (Norwegian Meteorological Institute, Oslo 0313), NERSC (Nansen Environmental and Remote Sensing Center, Bergen 5006), NILU (Norwegian Institute for Air Research, Kjeller 2027), UiB (University of Bergen, Bergen 5007), UiO (University of Oslo, Oslo 0313) and UNI (Uni Research, Bergen 5008), Norway. Mailing address: NCC, c/o MET-Norway, Henrik Mohns plass 1, Oslo 0313, Norway",
-"NERC":"Natural Environment Research Council, STFC-RAL, Harwell, Oxford, OX11 0QX, UK",
-"NIMS-KMA":"National Institute of Meteorological Sciences/Korea Meteorological Administration, Climate Research Division, Seoho-bukro 33, Seogwipo-si, Jejudo 63568, Republic of Korea",
-"NIWA":"National Institute of Water and Atmospheric Research, Hataitai, Wellington 6021, New Zealand",
-"NOAA-GFDL":"National Oceanic and Atmospheric Administration, Geophysical Fluid Dynamics Laboratory, Princeton, NJ 08540, USA",
-"NTU":"National Taiwan University, Taipei 10650, Taiwan",
-"NUIST":"Nanjing University of Information Science and Technology, Nanjing, 210044, China",
-"PCMDI":"Program for Climate Model Diagnosis and Intercomparison, Lawrence Livermore National Laboratory, Livermore, CA 94550, USA",
-"PNNL-WACCEM":"PNNL (Pacific Northwest National Laboratory), Richland, WA 99352, USA",
-"RTE-RRTMGP-Consortium":"AER (Atmospheric and Environmental Research, Lexington, MA 02421, USA); UColorado (University of Colorado, Boulder, CO 80309, USA). Mailing address: AER c/o Eli Mlawer, 131 Hartwell Avenue, Lexington, MA 02421, USA",
-"RUBISCO":"ORNL (Oak Ridge National Laboratory, Oak Ridge, TN 37831, USA); ANL (Argonne National Laboratory, Argonne, IL 60439, USA); BNL (Brookhaven National Laboratory, Upton, NY 11973, USA); LANL (Los Alamos National Laboratory, Los Alamos, NM 87545); LBNL (Lawrence Berkeley National Laboratory, Berkeley, CA 94720, USA); NAU (Northern Arizona University, Flagstaff, AZ 86011, USA); NCAR (National Center for Atmospheric Research, Boulder, CO 80305, USA); UCI (University of California Irvine, Irvine, CA 92697, USA); UM (University of Michigan, Ann Arbor, MI 48109, USA). Mailing address: ORNL Climate Change Science Institute, c/o Forrest M. Hoffman, Laboratory Research Manager, Building 4500N Room F106, 1 Bethel Valley Road, Oak Ridge, TN 37831-6301, USA",
-"SNU":"Seoul National University, Seoul 08826, Republic of Korea",
-"THU":"Department of Earth System Science, Tsinghua University, Beijing 100084, China",
-"UA":"Department of Geosciences, University of Arizona, Tucson, AZ 85721, USA",
-"UCI":"Department of Earth System Science, University of California Irvine, Irvine, CA 92697, USA",
-"UHH":"Universitat Hamburg, Hamburg 20148, Germany",
-"UTAS":"Institute for Marine and Antarctic Studies, University of Tasmania, Hobart, Tasmania 7001, Australia",
-"UofT":"Department of Physics, University of Toronto, 60 St George Street, Toronto, ON M5S1A7, Canada"
-'''
-
-# %% Build list of models per MIP
-# Get time
-timeFormatDir = datetime.datetime.now().strftime('%y%m%d')
-# List input files
-fileList = os.listdir(os.path.join('..', timeFormatDir))
-fileList.sort()
-print('fileList:', fileList)
-
-# %% Build dictionary keying off source_id
-mips = {}
-mips['CMIP6'] = {}
-mips['CMIP5'] = {}
-mips['CMIP3'] = {}
-
-queries = {'modId': 'ocean model id (+ version)',
-           'eos': 'equation of state (+ constants)',
-           'cp': 'specific heat capacity (cpocean, J kg-1 K-1)',
-           'refRho': 'reference density (boussinesq; rhozero, kg m-3)',
-           'frzEqn': 'freezing point (equation)',
-           'angRot': 'planet angular rotation (radians s-1)',
-           'graAcc': 'gravitational acceleration (m s-2)',
-           'horRes': 'native horizontal resolution',
-           'verRes': 'native vertical resolution',
-           'vertK': 'vertical diffusivity scheme',
-           'mldSch': 'boundary-layer (mixed-) scheme',
-           'vol': 'sea water volume',
-           'initCl': 'initialization observed climatology',
-           'spinYr': 'spinup length (years)',
-           'antAer': 'anthropogenic aerosol forcing',
-           'volcFo': 'volcanic forcing',
-           'aerInd': 'sulphate aerosol indirect effects',
-           'geotHt': 'geothermal heating'}
-
-for count1, filePath in enumerate(fileList):
-    if filePath in ['.DS_Store', 'ESGF.json']:
-        continue
-    print('count1', count1, 'filePath:', filePath)
-    fullPath = os.path.join('..', timeFormatDir, filePath)
-    print('fullPath:', fullPath)
+    variables = doc.get('variable_id', doc.get('variable', varId))
+    if variables is None:
+        return []
+    if isinstance(variables, str):
+        return [variables]
+    return variables
+
+
+def addReplica(latest, tmpId, rec, variables):
+    """
+    Record a parsed doc in latest, {datasetKey: [rec, nodes, variables]},
+    keeping only the latest verId of each dataset and the set of nodes
+    serving it
+
+    """
+    key = datasetKey(tmpId)
+    entry = latest.get(key)
+    if entry is None or versionKey(rec.verId) > versionKey(entry[0].verId):
+        latest[key] = [rec, {rec.nodeId}, variables]
+    elif rec.verId == entry[0].verId:
+        entry[1].add(rec.nodeId)
+        if variables != entry[2]:
+            entry[2] = sorted(set(entry[2]) | set(variables))
+
+
+def mergeReplicas(replicas, partial):
+    """
+    Merge partial into replicas in place, {datasetKey: {'verId': str,
+    'nodes': list}}, the latest verId wins and equal versions union nodes
+
+    """
+    for key, val in partial.items():
+        entry = replicas.get(key)
+        if entry is None or versionKey(val['verId']) > \
+                versionKey(entry['verId']):
+            replicas[key] = val
+        elif val['verId'] == entry['verId']:
+            entry['nodes'] = sorted(set(entry['nodes']) | set(val['nodes']))
+
+    return replicas
+
+
+def iterFacets(fullPath):
+    """
+
+    Parameters
+    ----------
+    fullPath : str
+        path to *_ESGF-Facets.json harvest file (getOceanMods --mode facets)
+
+    Yields
+    ------
+    mipEra, actId, instId, srcId, expId, ripfId : str
+        tree keys, with CMIP6 institution and activity remaps applied
+    variables : list
+        variable_ids pivoted for the member (multi-variable harvests) or
+        the harvested variables
+
+    """
+    mipEra = os.path.basename(fullPath).split('_')[1]
     with open(fullPath) as jsonFile:
         a = json.load(jsonFile)
-        print('a.keys():', a.keys())
-        print('a[''response''].keys():', a['response'].keys())
-        # Use source_id indexes to build out tree
-        for count2, tmp in enumerate(a['response']['docs']):
+    print('numFound:', a['numFound'], 'pivot:', a['pivot'])
+    for instIdF, srcs in a['tree'].items():
+        # Kludge for wrong instId
+        if 'CMIP3' in mipEra and instIdF in 'CSIRO-QCCCE':
+            instIdF = 'CSIRO'
+        instId = instRemap(instIdF)
+        for srcId, acts in srcs.items():
+            for actIdF, exps in acts.items():
+                for expId, members in exps.items():
+                    actId = actRemap(mipEra, actIdF, expId)
+                    for ripfId, counts in members.items():
+                        if isinstance(counts, dict):
+                            variables = list(counts.keys())
+                        else:
+                            variables = a.get('variables', [])
+                        yield mipEra, actId, instId, srcId, expId, ripfId, \
+                            variables
+
+
+def iterDocs(fullPath):
+    """
+
+    Parameters
+    ----------
+    fullPath : str
+        path to *_ESGF-Datasets harvest snapshot (json, ndjson, ndjson.gz,
+        ndjson.zst)
+
+    Yields
+    ------
+    doc : dict
+        Solr dataset document
+
+    """
+    meta = {}
+    for doc in iter_snapshot_docs(fullPath, meta=meta):
+        yield doc
+    print('numFound:', meta.get('numFound'))
+
+
+def parseFile(fullPath, verbose=False, catalog=False, index=False,
+              quarantine=False, validate=True):
+    """
+
+    Parameters
+    ----------
+    fullPath : str
+        harvest file, *_ESGF-Datasets snapshot or *_ESGF-Facets.json
+    verbose : bool, optional
+        print every parsed id. The default is False.
+    catalog : bool, optional
+        also collect dataset rows. The default is False.
+    index : bool, optional
+        also collect (DrsRecord, variables) rows. The default is False.
+    quarantine : bool, optional
+        collect invalid ids in rejects and continue, rather than exiting
+        (siftBits). The default is False.
+    validate : bool, optional
+        check ids against CMIP6_CVs (drsParser.checkIds). The default is
+        True.
+
+    Returns
+    -------
+    ParsedFile namedtuple of
+
+    mips : dict
+        partial sparse tree of the file, see mergeTrees
+    cat : esgfCatalog.Catalog or None
+        dataset rows of the file (None unless catalog, facet trees have no
+        datasets)
+    rows : list or None
+        esgfIndex.DatasetIndex.add rows of the file (None unless index)
+    replicas : dict
+        latest verId and serving nodes per dataset, see mergeReplicas
+    rejects : list
+        {'id', 'reason', 'file'} per quarantined id
+    docs : int
+        docs read from the file (0 for facet trees)
+    unknown : collections.Counter
+        {(field, value): datasets} ids unknown to CMIP6_CVs, see
+        drsParser.checkIds
+
+    """
+    mips = newTree()
+    print('fullPath:', fullPath)
+    unknown = collections.Counter()
+    # Facet pivot harvests carry the tree directly
+    if fullPath.endswith('ESGF-Facets.json'):
+        for mipEra, actId, instId, srcId, expId, ripfId, variables in \
+                iterFacets(fullPath):
+            addMember(mips, mipEra, instId, srcId, actId, expId, ripfId,
+                      variables)
+            if validate:
+                unknown.update(checkIds(mipEra, instId, srcId, expId))
+        return ParsedFile(mips, None, None, {}, [], 0, unknown)
+    builder = CatalogBuilder() if catalog else None
+    rows = [] if index else None
+    # Every doc (replica, version) is catalogued, the tree only needs the
+    # latest version of each dataset
+    latest = {}
+    rejects = []
+    count2 = -1
+    for count2, tmp in enumerate(iterDocs(fullPath)):
+        if not quarantine:
+            rec = siftBits(tmp['id'])
+        else:
+            try:
+                rec = parseId(tmp['id'])
+            except DrsError as err:
+                rejects.append({'id': tmp['id'], 'reason': str(err),
+                                'file': os.path.basename(fullPath)})
+                continue
+        if builder is not None:
+            builder.append(rec)
+        [mipEra, actId, instId, srcId, expId, ripfId, tabId, varId,
+         gridId, verId, nodeId] = rec
+        if verbose:
             print('count2:', count2, 'id:', tmp['id'])
-            [mipEra, actId, instId, srcId, expId, ripfId, tabId, varId,
-             gridId, verId, nodeId] = siftBits(tmp['id'])
             print('mipEra:', mipEra)
             print('actId:', actId)
             print('instId:', instId)
@@ -386,30 +357,194 @@ for count1, filePath in enumerate(fileList):
             print('gridId:', gridId)
             print('verId:', verId)
             print('nodeId:', nodeId)
-            # Build json
-            if instId not in mips[mipEra].keys():
-                mips[mipEra][instId] = {}
-            if srcId not in mips[mipEra][instId].keys():
-                mips[mipEra][instId][srcId] = {}
-            if actId not in mips[mipEra][instId][srcId].keys():
-                mips[mipEra][instId][srcId][actId] = {}
-            if expId not in mips[mipEra][instId][srcId][actId].keys():
-                mips[mipEra][instId][srcId][actId][expId] = {}
-            if ripfId not in mips[mipEra][instId][srcId][actId][expId].keys():
-                mips[mipEra][instId][srcId][actId][expId][ripfId] = {}
-                for count3, query in enumerate(queries.keys()):
-                    print(count3, query)
-                    mips[mipEra][instId][srcId][actId][expId][ripfId][queries[
-                        query]] = None
-        print(fullPath)
-        print('----------')
-        print('----------')
-        time.sleep(3)
-
-# Process mipEra result
-outFile = os.path.join('..', 'CMIP_ESGF.json')
-print('outFile:', outFile)
-with open(outFile, 'w', encoding='utf-8') as outJson:
-    json.dump(mips, outJson, ensure_ascii=False, indent=4, sort_keys=True)
-
-# %% Build webpages per mipEra
+        variables = docVariables(tmp, varId)
+        if rows is not None:
+            rows.append((rec, variables))
+        addReplica(latest, tmp['id'], rec, variables)
+        if validate:
+            unknown.update(checkIds(mipEra, instId, srcId, expId))
+    print('docs:', count2 + 1, 'datasets:', len(latest), 'quarantined:',
+          len(rejects))
+
+    # Use source_id indexes to build out tree
+    replicas = {}
+    for key, (rec, nodes, variables) in latest.items():
+        addMember(mips, rec.mipEra, rec.instId, rec.srcId, rec.actId,
+                  rec.expId, rec.ripfId, variables)
+        replicas[key] = {'verId': rec.verId, 'nodes': sorted(nodes)}
+
+    return ParsedFile(mips, None if builder is None else builder.build(),
+                      rows, replicas, rejects, count2 + 1, unknown)
+
+
+def mergeTrees(mips, partial):
+    """
+    Merge partial into mips in place and return mips. Member and variable
+    sets are unions, so merging is associative and partial trees can be
+    combined in any grouping
+
+    """
+    for key, val in partial.items():
+        if key not in mips:
+            mips[key] = val
+        elif isinstance(val, dict):
+            mergeTrees(mips[key], val)
+        elif isinstance(val, set):
+            mips[key] |= val
+
+    return mips
+
+
+def rejectReason(reason):
+    """
+    Return the failure class of a quarantine reason, e.g. 'ripfId format
+    invalid' for 'ripfId format invalid - ripfTest: r1'
+    """
+    return reason.split(' - ')[0].split(':')[0]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Build CMIP_ESGF.json from today's ESGF harvest")
+    parser.add_argument("--workers", "-w", dest="workers", type=int, default=os.cpu_count(), help="Parse processes (default is the core count, 1 is serial)")
+    parser.add_argument("--verbose", "-v", dest="verbose", action="store_true", help="Print every parsed dataset id")
+    parser.add_argument("--catalog", "-c", dest="catalog", action="store_true", help="Also write the columnar dataset catalog ../CMIP_ESGF-Catalog.npz (needs numpy)")
+    parser.add_argument("--index", "-i", dest="index", action="store_true", help="Also write the SQLite dataset index ../CMIP_ESGF-Index.sqlite (see esgfIndex)")
+    parser.add_argument("--quarantine", "-q", dest="quarantine", action="store_true", help="Write invalid dataset ids to ../CMIP_ESGF-Quarantine.json and continue (default exits on the first)")
+    parser.add_argument("--reject_threshold", "-t", dest="reject_threshold", type=float, default=None, help="Fail when more than this fraction of ids is quarantined, e.g. 0.01 (implies --quarantine)")
+    parser.add_argument("--cv_check", dest="cvCheck", action="store_true", help="Exit if a CMIP6_CVs file is not found (default warns and skips validation against it, see $CMIP6_CVS)")
+    args = parser.parse_args()
+    if args.reject_threshold is not None:
+        args.quarantine = True
+    if args.catalog and CatalogBuilder is None:
+        print('** --catalog needs numpy, exiting.. **')
+        sys.exit()
+    try:
+        loadCVs(required=args.cvCheck)
+    except FileNotFoundError as err:
+        print('**', err, 'exiting.. **')
+        sys.exit(1)
+    cvMissing = [cvNames[field] for field, fileName in sorted(cvFiles.items())
+                 if fileName is None]
+    if cvMissing:
+        print('** CMIP6_CVs', ', '.join(cvMissing), 'not found in', cvDir,
+              '(set CMIP6_CVS), ids not validated against them **')
+    validate = any(cvFiles.values())
+
+    # %% Build list of models per MIP
+    # Get time
+    timeFormatDir = datetime.datetime.now().strftime('%y%m%d')
+    # List input files
+    fileList = os.listdir(os.path.join('..', timeFormatDir))
+    fileList.sort()
+    print('fileList:', fileList)
+    fullPaths = [os.path.join('..', timeFormatDir, filePath)
+                 for filePath in fileList
+                 if filePath not in ['.DS_Store', 'ESGF.json',
+                                     'ESGF-Manifest.json'] and
+                 not filePath.endswith('.tmp')]
+
+    # %% Parse files over a process pool, merge partial trees in file order
+    mips = newTree()
+    cats = []
+    replicas = {}
+    rejects = []
+    docs = 0
+    unknown = collections.Counter()
+    index = None
+    if args.index:
+        index = DatasetIndex(os.path.join('..', 'CMIP_ESGF-Index.sqlite'),
+                             create=True)
+    timeStart = time.time()
+    workers = max(1, min(args.workers or 1, len(fullPaths)))
+    if workers == 1:
+        results = (parseFile(fullPath, args.verbose, args.catalog, args.index,
+                             args.quarantine, validate)
+                   for fullPath in fullPaths)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(parseFile, fullPaths,
+                               [args.verbose] * len(fullPaths),
+                               [args.catalog] * len(fullPaths),
+                               [args.index] * len(fullPaths),
+                               [args.quarantine] * len(fullPaths),
+                               [validate] * len(fullPaths))
+    try:
+        for parsed in results:
+            mergeTrees(mips, parsed.mips)
+            mergeReplicas(replicas, parsed.replicas)
+            cats.append(parsed.cat)
+            rejects.extend(parsed.rejects)
+            docs += parsed.docs
+            unknown.update(parsed.unknown)
+            if parsed.rows:
+                index.add(parsed.rows)
+    except BaseException:
+        if index is not None:
+            index.abort()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print('parse time (s):', round(time.time() - timeStart, 1),
+          'files:', len(fullPaths), 'workers:', workers)
+
+    # %% Ids unknown to CMIP6_CVs, parsed but flagged
+    if validate:
+        print('ids unknown to CMIP6_CVs:', len(unknown))
+        for (field, value), count in sorted(unknown.items()):
+            print('  {:>8d} {} {}'.format(count, field, value))
+
+    # %% Quarantine summary, fail above the threshold before writing output
+    if args.quarantine:
+        reasons = collections.Counter(rejectReason(reject['reason'])
+                                      for reject in rejects)
+        rejectFraction = len(rejects) / docs if docs else 0.
+        unknownIds = {}
+        for (field, value), count in unknown.items():
+            unknownIds.setdefault(field, {})[value] = count
+        quarantineFile = os.path.join('..', 'CMIP_ESGF-Quarantine.json')
+        print('quarantineFile:', quarantineFile, 'docs:', docs,
+              'quarantined:', len(rejects),
+              'fraction: {:.4f}'.format(rejectFraction))
+        for reason, count in reasons.most_common():
+            print('  {:>8d} {}'.format(count, reason))
+        with open(quarantineFile, 'w', encoding='utf-8') as outJson:
+            json.dump({'docs': docs, 'quarantined': len(rejects),
+                       'reasons': dict(reasons), 'ids': rejects,
+                       'unknown': unknownIds},
+                      outJson, ensure_ascii=False, indent=4, sort_keys=True)
+        if args.reject_threshold is not None and \
+                rejectFraction > args.reject_threshold:
+            print('** quarantined fraction {:.4f} > {}, exiting.. **'.format(
+                rejectFraction, args.reject_threshold))
+            if index is not None:
+                index.abort()
+            sys.exit(1)
+
+    # Process mipEra result
+    outFile = os.path.join('..', 'CMIP_ESGF.json')
+    print('outFile:', outFile)
+    saveTree(mips, outFile)
+
+    # Latest version and serving nodes per dataset
+    replicaFile = os.path.join('..', 'CMIP_ESGF-Replicas.json')
+    print('replicaFile:', replicaFile, 'datasets:', len(replicas))
+    with open(replicaFile, 'w', encoding='utf-8') as outJson:
+        json.dump(replicas, outJson, ensure_ascii=False, indent=4,
+                  sort_keys=True)
+
+    # Dataset rows, one per parsed id
+    if args.catalog:
+        cat = Catalog.concat(cats)
+        catFile = os.path.join('..', 'CMIP_ESGF-Catalog.npz')
+        cat.save(catFile)
+        print('catFile:', catFile, 'rows:', len(cat))
+    if index is not None:
+        indexFile = index.commit(source=timeFormatDir)
+        print('indexFile:', indexFile, 'rows:', index.count)
+
+
+if __name__ == '__main__':
+    main()
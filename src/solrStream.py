@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:00:00 2026
+
+Incremental (event-driven) parsing of Solr JSON responses. Text is fed in
+chunks as it arrives from a socket or file and each document of the
+response.docs array is yielded as soon as its closing brace is seen, so the
+document list is never materialized and peak memory is bounded by the
+largest single document rather than the payload.
+
+Usage:
+    for doc in iterFileDocs('261018_CMIP6_CMIP_ESGF-Datasets.json'):
+        print(doc['id'])
+
+PJD 18 Oct 2026 - Started
+
+@author: durack1
+"""
+
+import codecs
+import json
+import re
+
+# %% Structural characters outside and inside strings
+_structTest = re.compile(r'[{}\[\]",:]')
+_stringTest = re.compile(r'["\\]')
+_decoder = json.JSONDecoder()
+
+
+class SolrDocStream:
+    """
+    Push parser over a JSON text, collecting complete objects found in the
+    array at path (default response.docs) and scalar values at the keys in
+    scalars (default response.numFound)
+    """
+
+    def __init__(self, path=('response', 'docs'),
+                 scalars=(('response', 'numFound'),)):
+        self.path = tuple(path)
+        self.scalars = set(tuple(scalar) for scalar in scalars)
+        self.meta = {}
+        self.buf = ''
+        self.pos = 0
+        # container frames [type, path, key, expectKey]
+        self.stack = []
+        self.inString = False
+        self.keyStart = None
+        self.scalarStart = None
+        self.scalarKey = None
+        self.captureStart = None
+
+    def feed(self, text):
+        """
+
+        Parameters
+        ----------
+        text : str
+            next chunk of the JSON text
+
+        Returns
+        -------
+        docs : list
+            objects completed within this chunk
+
+        """
+        self.buf += text
+        docs = []
+        while True:
+            if self.captureStart is not None:
+                if not self._capture(docs):
+                    break
+            elif self.inString:
+                if not self._string():
+                    break
+            elif not self._struct():
+                break
+        self._trim()
+        return docs
+
+    def _trim(self):
+        # Keep only text still needed: a partial doc, key or scalar
+        starts = [start for start in (self.captureStart, self.keyStart,
+                                      self.scalarStart) if start is not None]
+        keep = min(starts + [self.pos])
+        if keep:
+            self.buf = self.buf[keep:]
+            self.pos -= keep
+            if self.captureStart is not None:
+                self.captureStart -= keep
+            if self.keyStart is not None:
+                self.keyStart -= keep
+            if self.scalarStart is not None:
+                self.scalarStart -= keep
+
+    def _string(self):
+        # Scan to the end of a string, honouring escapes
+        while True:
+            match = _stringTest.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                return False
+            if match.group() == '\\':
+                if match.end() >= len(self.buf):
+                    self.pos = match.start()
+                    return False
+                self.pos = match.end() + 1
+                continue
+            self.pos = match.end()
+            self.inString = False
+            if self.keyStart is not None:
+                frame = self.stack[-1]
+                frame[2] = json.loads(self.buf[self.keyStart:self.pos])
+                self.keyStart = None
+            return True
+
+    def _struct(self):
+        match = _structTest.search(self.buf, self.pos)
+        if match is None:
+            self.pos = len(self.buf)
+            return False
+        char = match.group()
+        self.pos = match.end()
+        frame = self.stack[-1] if self.stack else None
+        if char == '"':
+            self.inString = True
+            if frame is not None and frame[0] == '{' and frame[3]:
+                self.keyStart = match.start()
+        elif char == ':':
+            frame[3] = False
+            if frame[1] + (frame[2],) in self.scalars:
+                self.scalarStart = self.pos
+                self.scalarKey = frame[1] + (frame[2],)
+        elif char in ',}]':
+            if self.scalarStart is not None:
+                self.meta[self.scalarKey[-1]] = json.loads(
+                    self.buf[self.scalarStart:match.start()])
+                self.scalarStart = None
+            if char == ',':
+                if frame[0] == '{':
+                    frame[3] = True
+            else:
+                self.stack.pop()
+        else:
+            if frame is None:
+                path = ()
+            elif frame[0] == '{':
+                path = frame[1] + (frame[2],)
+            else:
+                path = frame[1] + ('[]',)
+            if char == '{' and frame is not None and frame[0] == '[' and \
+                    frame[1] == self.path:
+                self.captureStart = match.start()
+                return True
+            self.stack.append([char, path, None, char == '{'])
+        return True
+
+    def _capture(self, docs):
+        # Decode the doc alone, an incomplete doc waits for more text
+        try:
+            doc, end = _decoder.raw_decode(self.buf, self.captureStart)
+        except ValueError:
+            self.pos = self.captureStart
+            return False
+        docs.append(doc)
+        self.pos = end
+        self.captureStart = None
+        return True
+
+    def close(self):
+        """
+        Raise ValueError if the text ended inside a doc or container
+        """
+        if self.captureStart is not None or self.stack or self.inString:
+            raise ValueError('Truncated JSON text, {} chars unparsed'.format(
+                len(self.buf) - self.pos))
+
+
+# %% Generators
+def iterStreamDocs(chunks, meta=None, path=('response', 'docs')):
+    """
+
+    Parameters
+    ----------
+    chunks : iterable
+        bytes (decoded as utf-8) or str chunks of a Solr JSON response
+    meta : dict, optional
+        updated with scalars seen so far, e.g. meta['numFound']
+    path : tuple, optional
+        keys to the docs array. The default is ('response', 'docs').
+
+    Yields
+    ------
+    doc : dict
+        each document as soon as it is complete
+
+    """
+    stream = SolrDocStream(path=path)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        for doc in stream.feed(chunk):
+            if meta is not None:
+                meta.update(stream.meta)
+            yield doc
+    for doc in stream.feed(decoder.decode(b'', final=True)):
+        yield doc
+    stream.close()
+    if meta is not None:
+        meta.update(stream.meta)
+
+
+def iterFileDocs(fullPath, meta=None, chunkSize=1 << 16):
+    """
+
+    Parameters
+    ----------
+    fullPath : str
+        Solr JSON response or *_ESGF-Datasets.json harvest file
+    meta : dict, optional
+        see iterStreamDocs
+    chunkSize : int, optional
+        bytes read per chunk. The default is 64 KiB.
+
+    Yields
+    ------
+    doc : dict
+
+    """
+    def chunks():
+        with open(fullPath, 'rb') as f:
+            while True:
+                chunk = f.read(chunkSize)
+                if not chunk:
+                    return
+                yield chunk
+
+    for doc in iterStreamDocs(chunks(), meta=meta):
+        yield doc
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The scripts in src are run from there and import each other as top level
+# modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
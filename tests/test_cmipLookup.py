@@ -0,0 +1,84 @@
+import itertools
+
+import pytest
+
+from cmipLookup import ConfigRules, memberConfig, newTree, queries, sourceInfo
+from modellerRegistry import checkInstitution, resolveInstitution
+
+# Overrides of every shape the registry accepts, (actId, all, all),
+# (actId, expId, all) and (actId, expId, ripfId)
+OVERRIDES = [
+    ('CMIP', 'all', 'all', {'cp': 1., 'eos': 'act'}),
+    ('CMIP', 'historical', 'all', {'cp': 2., 'vol': 'exp'}),
+    ('CMIP', 'historical', 'r1i1p1f1', {'cp': 3., 'eos': 'ripf'}),
+    ('CMIP', 'piControl', 'r1i1p1f1', {'refRho': 1035.}),
+    ('ScenarioMIP', 'ssp585', 'all', {'cp': 4.}),
+]
+MEMBERS = list(itertools.product(['CMIP', 'ScenarioMIP', 'DAMIP'],
+                                 ['historical', 'piControl', 'ssp585'],
+                                 ['r1i1p1f1', 'r2i1p1f1']))
+
+
+def oldMemberConfig(tree, mipEra, instId, srcId, actId, expId, ripfId):
+    # memberConfig before ConfigRules, the reference semantics
+    config = dict.fromkeys(queries)
+    entries = sourceInfo(tree, mipEra, instId, srcId).get('config')
+    if not entries:
+        return config
+    for actKey, expKey, ripfKey in [('all', 'all', 'all'),
+                                    (actId, 'all', 'all'),
+                                    (actId, expId, 'all'),
+                                    (actId, expId, ripfId)]:
+        entry = entries.get(actKey, {}).get(expKey, {}).get(ripfKey)
+        if entry:
+            config.update((key, val) for key, val in entry.items()
+                          if key in config)
+    return config
+
+
+def registryTree(overrides):
+    nested = {}
+    for actId, expId, ripfId, fields in overrides:
+        nested.setdefault(actId, {}).setdefault(expId, {})[ripfId] = fields
+    registry = {'CMIP6': {'defaults': {'eos': 'inst'},
+                          'models': {'SRC': {'modId': 'MOM6',
+                                             'overrides': nested}}}}
+    checkInstitution(registry, 'INST.json')
+    tree = newTree()
+    sourceInfo(tree, 'CMIP6', 'INST', 'SRC', create=True)['config'] = \
+        resolveInstitution(registry, {})['CMIP6']['SRC']
+    return tree
+
+
+@pytest.mark.parametrize('overrides', [
+    list(subset) for count in range(len(OVERRIDES) + 1)
+    for subset in itertools.combinations(OVERRIDES, count)])
+def test_member_config_matches_old(overrides):
+    tree = registryTree(overrides)
+    rules = ConfigRules(tree)
+    for member in MEMBERS:
+        key = ('CMIP6', 'INST', 'SRC') + member
+        expected = oldMemberConfig(tree, *key)
+        assert rules[key] == expected
+        assert memberConfig(tree, *key) == expected
+
+
+def test_source_without_config():
+    tree = newTree()
+    key = ('CMIP6', 'INST', 'SRC', 'CMIP', 'historical', 'r1i1p1f1')
+    assert ConfigRules(tree)[key] == oldMemberConfig(tree, *key)
+    assert memberConfig(tree, *key) == dict.fromkeys(queries)
+
+
+@pytest.mark.parametrize('shape', [
+    ('all', 'historical', 'all'),
+    ('all', 'historical', 'r1i1p1f1'),
+    ('all', 'all', 'r1i1p1f1'),
+    ('CMIP', 'all', 'r1i1p1f1'),
+])
+def test_unsupported_config_shapes(shape):
+    actId, expId, ripfId = shape
+    rules = ConfigRules()
+    with pytest.raises(ValueError, match='not keyed'):
+        rules.addSource('CMIP6', 'INST', 'SRC',
+                        {actId: {expId: {ripfId: {'cp': 1.}}}})
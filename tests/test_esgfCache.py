@@ -0,0 +1,161 @@
+import json
+import urllib.parse
+
+import pytest
+
+import esgfQueryModels
+from esgfCache import ResponseCache, normalize_url
+
+SOLR_URL = 'http://node/solr/datasets/select?q=*:*&wt=json{query}&shards=s1'
+PAGE_SIZE = 2
+LIVE = [{'id': 'live{}'.format(num)} for num in range(5)]
+CACHED = [{'id': 'cached{}'.format(num)} for num in range(5)]
+
+
+def read(chunks):
+    return b''.join(chunks)
+
+
+def test_normalize_url():
+    assert normalize_url('HTTP://Node/s?b=2&a=1&shards=x,y') == \
+        normalize_url('HTTP://node/s?a=1&b=2')
+
+
+def test_roundtrip_and_info(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get('http://node/q?a=1') is None
+    writer = cache.writer('http://node/q?a=1')
+    for chunk in [b'abc', b'', b'def']:
+        writer.write(chunk)
+    writer.commit({'unit': 'u1', 'numFound': 3})
+    assert read(cache.get('http://node/q?a=1&shards=x')) == b'abcdef'
+    assert cache.info('http://node/q?a=1') == {'unit': 'u1', 'numFound': 3}
+    cache.close()
+    # The index persists across instances
+    cache = ResponseCache(str(tmp_path))
+    assert read(cache.get('http://node/q?a=1')) == b'abcdef'
+    assert cache.stats()['entries'] == 1
+
+
+def test_abort_and_expiry(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    writer = cache.writer('http://node/q?a=1')
+    writer.write(b'partial')
+    writer.abort()
+    assert cache.get('http://node/q?a=1') is None
+    writer = cache.writer('http://node/q?a=2', ttl=-1)
+    writer.write(b'old')
+    writer.commit()
+    assert cache.get('http://node/q?a=2') is None
+    assert cache.info('http://node/q?a=2') is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+
+    def put(num):
+        writer = cache.writer('http://node/q?a={}'.format(num))
+        writer.write(b'x' * 100)
+        writer.commit()
+
+    put(0)
+    cache.max_bytes = 2 * cache.stats()['bytes']
+    put(1)
+    # Reading 0 makes 1 the least recently used
+    read(cache.get('http://node/q?a=0'))
+    put(2)
+    assert cache.get('http://node/q?a=1') is None
+    assert read(cache.get('http://node/q?a=0')) == b'x' * 100
+    assert read(cache.get('http://node/q?a=2')) == b'x' * 100
+
+
+def test_get_survives_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    writer = cache.writer('http://node/q?a=1')
+    writer.write(b'body')
+    writer.commit()
+    chunks = cache.get('http://node/q?a=1')
+    cache.invalidate()
+    assert read(chunks) == b'body'
+
+
+# %% Multi-page walks, see esgfQueryModels.get_cached_pages
+@pytest.fixture
+def walk(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path))
+    monkeypatch.setattr(esgfQueryModels, '_response_cache', cache)
+    monkeypatch.setattr(esgfQueryModels, '_response_cache_refresh', False)
+    monkeypatch.setattr(esgfQueryModels, 'get_solr_query_url',
+                        lambda: SOLR_URL)
+    calls = []
+
+    def http_get_docs(url, meta=None, timeout=None, retries=None,
+                      unit=None):
+        # Live index, every page fetched with the walk tag
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(
+            url).query))
+        start = int(params['start'])
+        calls.append((start, unit))
+        meta['numFound'] = len(LIVE)
+        for doc in LIVE[start:start + int(params['rows'])]:
+            yield doc
+
+    monkeypatch.setattr(esgfQueryModels, 'http_get_docs', http_get_docs)
+    query_url = esgfQueryModels.get_query_url('CMIP6', 'CMIP', 'thetao')
+    return cache, query_url, calls
+
+
+def cache_page(cache, query_url, start, unit, numFound=len(CACHED)):
+    page_url = esgfQueryModels.get_page_url(query_url, start, PAGE_SIZE)
+    writer = cache.writer(page_url)
+    writer.write(json.dumps({'response': {
+        'numFound': numFound,
+        'docs': CACHED[start:start + PAGE_SIZE]}}).encode('utf-8'))
+    writer.commit({'unit': unit, 'numFound': numFound})
+
+
+def harvest():
+    meta = {}
+    docs = list(esgfQueryModels.iter_dataset_docs(
+        'CMIP6', 'CMIP', 'thetao', page_size=PAGE_SIZE, meta=meta))
+    return docs, meta['numFound']
+
+
+def test_live_walk_is_one_unit(walk):
+    cache, query_url, calls = walk
+    assert harvest() == (LIVE, len(LIVE))
+    assert [start for start, unit in calls] == [0, 2, 4]
+    assert len({unit for start, unit in calls}) == 1
+
+
+def test_consistent_walk_served_from_cache(walk):
+    cache, query_url, calls = walk
+    for start in range(0, len(CACHED), PAGE_SIZE):
+        cache_page(cache, query_url, start, 'walk1')
+    assert harvest() == (CACHED, len(CACHED))
+    assert calls == []
+
+
+@pytest.mark.parametrize('pages', [
+    [(0, 'walk1'), (2, 'walk2'), (4, 'walk1')],  # mixed walks
+    [(0, 'walk1'), (4, 'walk1')],  # page missing (evicted, expired)
+    [(0, 'walk1'), (2, 'walk1', 4), (4, 'walk1')],  # numFound changed
+])
+def test_inconsistent_walk_refetched(walk, pages):
+    cache, query_url, calls = walk
+    for page in pages:
+        cache_page(cache, query_url, *page)
+    # Never a mix of cached and live docs
+    assert harvest() == (LIVE, len(LIVE))
+    assert [start for start, unit in calls] == [0, 2, 4]
+    for start in range(0, len(CACHED), PAGE_SIZE):
+        assert cache.info(esgfQueryModels.get_page_url(
+            query_url, start, PAGE_SIZE)) is None
+
+
+def test_refresh_ignores_cache(walk, monkeypatch):
+    cache, query_url, calls = walk
+    for start in range(0, len(CACHED), PAGE_SIZE):
+        cache_page(cache, query_url, start, 'walk1')
+    monkeypatch.setattr(esgfQueryModels, '_response_cache_refresh', True)
+    assert harvest() == (LIVE, len(LIVE))
@@ -0,0 +1,98 @@
+import json
+
+from esgfDiff import changed_sources, diff_snapshots, load_snapshot
+from esgfSnapshot import SnapshotWriter
+
+ID = 'CMIP6.CMIP.NCAR.CESM2.{}.{}.Omon.{}.gn.{}|{}'
+
+
+def doc(expId, ripfId, verId, varId='thetao', node='esgf-data.ucar.edu',
+        retracted=False):
+    return {'id': ID.format(expId, ripfId, varId, verId, node),
+            'retracted': retracted}
+
+
+def member(expId, ripfId):
+    return 'CMIP6.NCAR.CESM2.CMIP.{}.{}'.format(expId, ripfId)
+
+
+def dataset(expId, ripfId, varId='thetao'):
+    return 'CMIP6.CMIP.NCAR.CESM2.{}.{}.Omon.{}.gn'.format(expId, ripfId,
+                                                          varId)
+
+
+OLD = [doc('historical', 'r1i1p1f1', 'v20190101'),
+       doc('historical', 'r1i1p1f1', 'v20190101', node='esgf.nci.org.au'),
+       doc('piControl', 'r1i1p1f1', 'v20190101'),
+       doc('historical', 'r2i1p1f1', 'v20190101'),
+       doc('historical', 'r3i1p1f1', 'v20190101'),
+       doc('historical', 'r3i1p1f1', 'v20190101', varId='so'),
+       doc('historical', 'r4i1p1f1', 'v20190101')]
+NEW = [
+    # Version bump, the old version still served by a replica
+    doc('historical', 'r1i1p1f1', 'v20200101'),
+    doc('historical', 'r1i1p1f1', 'v20190101', node='esgf.nci.org.au'),
+    # piControl unpublished, ssp585 new
+    doc('ssp585', 'r1i1p1f1', 'v20200101'),
+    # Flagged on every node
+    doc('historical', 'r2i1p1f1', 'v20190101', retracted=True),
+    doc('historical', 'r2i1p1f1', 'v20190101', node='esgf.nci.org.au',
+        retracted=True),
+    # so gone without a newer version
+    doc('historical', 'r3i1p1f1', 'v20190101'),
+    # Newest version retracted, the older one still published
+    doc('historical', 'r4i1p1f1', 'v20190101'),
+    doc('historical', 'r4i1p1f1', 'v20200101', retracted=True)]
+
+
+def write_day(tmp_path, day, docs, fmt):
+    dayDir = tmp_path / day
+    dayDir.mkdir()
+    # Split over two activity files, as getOceanMods writes them
+    for actId, part in [('CMIP', docs[::2]), ('DAMIP', docs[1::2])]:
+        writer = SnapshotWriter(str(dayDir / '_'.join(
+            [day, 'CMIP6', actId, 'ESGF-Datasets'])), fmt)
+        for tmp in part:
+            writer.write(tmp)
+        writer.commit(len(part))
+    (dayDir / 'ESGF-Manifest.json').write_text('{}')
+    return str(dayDir)
+
+
+def test_diff_days(tmp_path):
+    old = load_snapshot(write_day(tmp_path, '261017', OLD, 'json'))
+    new = load_snapshot(write_day(tmp_path, '261018', NEW, 'ndjson.gz'))
+    assert new[dataset('historical', 'r4i1p1f1')][1:] == ['v20190101', False]
+    assert new[dataset('historical', 'r2i1p1f1')][1:] == ['v20190101', True]
+    changes = diff_snapshots(old, new)
+    assert changes['added'] == [member('ssp585', 'r1i1p1f1')]
+    assert changes['removed'] == [member('piControl', 'r1i1p1f1')]
+    assert changes['retracted'] == {
+        member('historical', 'r2i1p1f1'): [dataset('historical', 'r2i1p1f1')],
+        member('historical', 'r3i1p1f1'): [
+            dataset('historical', 'r3i1p1f1', 'so')]}
+    assert changes['versions'] == {member('historical', 'r1i1p1f1'): {
+        dataset('historical', 'r1i1p1f1'): ['v20190101', 'v20200101']}}
+    assert changes['summary'] == {'added': 1, 'removed': 1, 'retracted': 2,
+                                  'versions': 1, 'datasetVersions': 1}
+    assert changed_sources(changes) == {('CMIP6', 'NCAR', 'CESM2')}
+
+
+def test_no_changes(tmp_path):
+    old = load_snapshot(write_day(tmp_path, '261017', OLD, 'ndjson'))
+    new = load_snapshot(write_day(tmp_path, '261018', OLD[::-1], 'json'))
+    changes = diff_snapshots(old, new)
+    assert changes['summary'] == dict.fromkeys(
+        ['added', 'removed', 'retracted', 'versions', 'datasetVersions'], 0)
+
+
+def test_replica_map(tmp_path):
+    # readOceanMods CMIP_ESGF-Replicas.json, the same datasets as a day dir
+    replicas = {dataset('historical', 'r1i1p1f1'): {
+        'verId': 'v20200101', 'nodes': ['esgf-data.ucar.edu']}}
+    fileName = tmp_path / 'CMIP_ESGF-Replicas.json'
+    fileName.write_text(json.dumps(replicas))
+    old = load_snapshot(write_day(tmp_path, '261017', OLD[:1], 'json'))
+    changes = diff_snapshots(old, load_snapshot(str(fileName)))
+    assert changes['versions'] == {member('historical', 'r1i1p1f1'): {
+        dataset('historical', 'r1i1p1f1'): ['v20190101', 'v20200101']}}
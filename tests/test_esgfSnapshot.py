@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+import esgfSnapshot
+from esgfSnapshot import (SNAPSHOT_FORMATS, SnapshotWriter, check_format,
+                          find_snapshot, iter_snapshot_docs, snapshot_format)
+
+DOCS = [{'id': 'CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.gn.'
+               'v20190308|esgf-data.ucar.edu',
+         'retracted': False, 'variable_id': ['thetao']},
+        {'id': 'unicode éè 水, "quoted" {braces}', 'nested': {'a': [1, None]}},
+        {'id': 'x', 'score': 0.5}]
+
+
+def formats():
+    # ndjson.zst only where zstandard is installed
+    return [pytest.param(fmt, marks=pytest.mark.skipif(
+        fmt == 'ndjson.zst' and esgfSnapshot.zstandard is None,
+        reason='needs zstandard')) for fmt in SNAPSHOT_FORMATS]
+
+
+@pytest.mark.parametrize('fmt', formats())
+@pytest.mark.parametrize('docs', [DOCS, []])
+def test_roundtrip(tmp_path, fmt, docs):
+    writer = SnapshotWriter(str(tmp_path / '261018_CMIP6_CMIP_ESGF-Datasets'),
+                            fmt)
+    for doc in docs:
+        writer.write(doc)
+    assert not os.path.exists(writer.outFile)
+    outFile = writer.commit(len(docs))
+    assert outFile.endswith('.' + fmt) and not os.path.exists(outFile + '.tmp')
+    assert snapshot_format(outFile) == fmt
+    assert find_snapshot(outFile[:-len(fmt) - 1]) == outFile
+    meta = {}
+    assert list(iter_snapshot_docs(outFile, meta=meta)) == docs
+    assert meta['numFound'] == len(docs)
+
+
+def test_json_is_solr_shaped(tmp_path):
+    writer = SnapshotWriter(str(tmp_path / 'snap'), 'json')
+    for doc in DOCS:
+        writer.write(doc)
+    with open(writer.commit(len(DOCS)), encoding='utf-8') as f:
+        assert json.load(f) == {'response': {'docs': DOCS,
+                                             'numFound': len(DOCS)}}
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'ndjson.gz'])
+def test_truncated_ndjson(tmp_path, fmt):
+    writer = SnapshotWriter(str(tmp_path / 'snap'), fmt)
+    writer.write(DOCS[0])
+    # A crash before commit leaves no trailer
+    writer.f.close()
+    os.replace(writer.tmpFile, writer.outFile)
+    with pytest.raises(ValueError, match='Truncated'):
+        list(iter_snapshot_docs(writer.outFile))
+
+
+def test_abort(tmp_path):
+    writer = SnapshotWriter(str(tmp_path / 'snap'), 'ndjson')
+    writer.write(DOCS[0])
+    writer.abort()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_check_format(monkeypatch):
+    with pytest.raises(ValueError, match='Unknown'):
+        check_format('csv')
+    monkeypatch.setattr(esgfSnapshot, 'zstandard', None)
+    with pytest.raises(ValueError, match='zstandard'):
+        check_format('ndjson.zst')
+    assert snapshot_format('a_ESGF-Datasets.ndjson.gz') == 'ndjson.gz'
+    assert snapshot_format('a_ESGF-Facets.txt') is None
@@ -0,0 +1,57 @@
+import pytest
+
+from cmipLookup import ConfigRules
+from modellerRegistry import (ModellerRegistry, RegistryError,
+                              checkInstitution, resolveInstitution)
+
+
+def institution(overrides):
+    return {'CMIP6': {'defaults': {'eos': 'TEOS-10'},
+                      'models': {'SRC': {'modId': 'MOM6',
+                                         'overrides': overrides}}}}
+
+
+@pytest.mark.parametrize('overrides', [
+    {'CMIP': {'all': {'all': {'cp': 3992.}}}},
+    {'CMIP': {'historical': {'all': {'cp': 3992.}}}},
+    {'CMIP': {'historical': {'r1i1p1f1': {'cp': 3992.}}}},
+])
+def test_supported_override_shapes(overrides):
+    registry = institution(overrides)
+    checkInstitution(registry, 'INST.json')
+    config = resolveInstitution(registry, {})['CMIP6']['SRC']
+    rules = ConfigRules()
+    rules.addSource('CMIP6', 'INST', 'SRC', config)
+    member = rules['CMIP6', 'INST', 'SRC', 'CMIP', 'historical', 'r1i1p1f1']
+    assert (member['modId'], member['eos'], member['cp']) == \
+        ('MOM6', 'TEOS-10', 3992.)
+    other = rules['CMIP6', 'INST', 'SRC', 'ScenarioMIP', 'ssp585', 'r1i1p1f1']
+    assert other['cp'] is None
+
+
+@pytest.mark.parametrize('overrides', [
+    {'all': {'all': {'all': {'cp': 3992.}}}},
+    {'all': {'historical': {'all': {'cp': 3992.}}}},
+    {'all': {'historical': {'r1i1p1f1': {'cp': 3992.}}}},
+    {'all': {'all': {'r1i1p1f1': {'cp': 3992.}}}},
+    {'CMIP': {'all': {'r1i1p1f1': {'cp': 3992.}}}},
+])
+def test_unsupported_override_shapes(overrides):
+    with pytest.raises(RegistryError, match='overrides'):
+        checkInstitution(institution(overrides), 'INST.json')
+
+
+@pytest.mark.parametrize('overrides', [
+    [],
+    {'CMIP': ['historical']},
+    {'CMIP': {'historical': ['r1i1p1f1']}},
+    {'CMIP': {'historical': {'r1i1p1f1': {'unknown': 1}}}},
+])
+def test_malformed_overrides(overrides):
+    with pytest.raises(RegistryError):
+        checkInstitution(institution(overrides), 'INST.json')
+
+
+def test_registry_files():
+    registry = ModellerRegistry(cacheFile=None)
+    assert registry.modeller()
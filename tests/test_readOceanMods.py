@@ -0,0 +1,85 @@
+import json
+import random
+
+from drsParser import datasetKey, parseId, versionKey
+from readOceanMods import addReplica, mergeReplicas, parseFile
+
+CMIP6 = 'CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.gn.{}|{}'
+CMIP5 = 'cmip5.output1.NCAR.CCSM4.historical.mon.ocean.Omon.r1i1p1.{}|{}'
+
+
+def test_dataset_key():
+    keys = {datasetKey(CMIP6.format(verId, nodeId))
+            for verId in ['v20190308', 'v20200101']
+            for nodeId in ['esgf-data.ucar.edu', 'esgf.nci.org.au']}
+    assert keys == {'CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.gn'}
+    assert datasetKey(CMIP5.format('v1', 'node')) != \
+        datasetKey(CMIP6.format('v1', 'node'))
+
+
+def test_version_key():
+    verIds = ['v1', 'v9', 'v10', 'v20190308', 'v20200101']
+    shuffled = list(verIds)
+    random.Random(0).shuffle(shuffled)
+    assert sorted(shuffled, key=versionKey) == verIds
+    # Non-numeric versions sort first
+    assert versionKey('latest') < versionKey('v1')
+
+
+def replicas_of(ids):
+    latest = {}
+    for tmpId, variables in ids:
+        addReplica(latest, tmpId, parseId(tmpId), variables)
+    return {key: {'verId': rec.verId, 'nodes': sorted(nodes),
+                  'variables': variables}
+            for key, (rec, nodes, variables) in latest.items()}
+
+
+IDS = [(CMIP6.format('v20190308', 'esgf-data.ucar.edu'), ['thetao']),
+       (CMIP6.format('v20190308', 'esgf.nci.org.au'), ['thetao']),
+       (CMIP6.format('v20200101', 'esgf.nci.org.au'), ['thetao']),
+       (CMIP6.format('v20200101', 'esgf-data.ucar.edu'), ['thetao', 'so']),
+       (CMIP5.format('v20121031', 'aims3.llnl.gov'), ['thetao']),
+       (CMIP5.format('v1', 'esgf-data.ucar.edu'), ['thetao'])]
+EXPECTED = {
+    'CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.gn': {
+        'verId': 'v20200101',
+        'nodes': ['esgf-data.ucar.edu', 'esgf.nci.org.au'],
+        'variables': ['so', 'thetao']},
+    'cmip5.output1.NCAR.CCSM4.historical.mon.ocean.Omon.r1i1p1': {
+        'verId': 'v20121031', 'nodes': ['aims3.llnl.gov'],
+        'variables': ['thetao']}}
+
+
+def test_add_replica_any_order():
+    for seed in range(10):
+        ids = list(IDS)
+        random.Random(seed).shuffle(ids)
+        assert replicas_of(ids) == EXPECTED
+
+
+def test_merge_replicas_any_split():
+    expected = {key: {'verId': val['verId'], 'nodes': val['nodes']}
+                for key, val in EXPECTED.items()}
+    for split in range(len(IDS) + 1):
+        replicas = {}
+        for part in [IDS[split:], IDS[:split]]:
+            partial = {key: {'verId': val['verId'], 'nodes': val['nodes']}
+                       for key, val in replicas_of(part).items()}
+            mergeReplicas(replicas, partial)
+        assert replicas == expected
+
+
+def test_parse_file(tmp_path):
+    fileName = tmp_path / '261018_CMIP6_CMIP_ESGF-Datasets.json'
+    docs = [{'id': tmpId, 'variable_id': variables}
+            for tmpId, variables in IDS if tmpId.startswith('CMIP6')]
+    fileName.write_text(json.dumps({'response': {'docs': docs,
+                                                 'numFound': len(docs)}}))
+    parsed = parseFile(str(fileName), validate=False)
+    assert parsed.docs == len(docs)
+    assert parsed.replicas == {
+        key: {'verId': val['verId'], 'nodes': val['nodes']}
+        for key, val in EXPECTED.items() if key.startswith('CMIP6')}
+    assert parsed.mips['CMIP6']['NCAR']['CESM2']['CMIP']['historical'] == \
+        {'r1i1p1f1'}
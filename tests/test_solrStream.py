@@ -0,0 +1,89 @@
+import json
+import random
+
+import pytest
+
+from solrStream import SolrDocStream, iterFileDocs, iterStreamDocs
+
+# Structural characters, escapes and multi-byte text inside the docs, the
+# docs array before numFound and a decoy docs key outside response
+RESPONSE = {
+    'responseHeader': {'status': 0, 'params': {'q': '*:*', 'docs': ['{']}},
+    'response': {
+        'docs': [
+            {'id': 'CMIP6.CMIP.NCAR.CESM2.historical.r1i1p1f1.Omon.thetao.'
+                   'gn.v20190308|esgf-data.ucar.edu',
+             'retracted': False, '_timestamp': '2019-03-08T00:00:00Z'},
+            {'id': 'a "quoted" id, with {braces} [and] colons: \\ \\"',
+             'variable': ['thetao', 'so'], 'nested': {'a': [1, {'b': None}]},
+             'score': 1.5e-3},
+            {'id': 'unicode éè 水 \U0001f30a', 'empty': {},
+             'list': []},
+            {},
+        ],
+        'numFound': 4, 'start': 0},
+}
+
+
+def chunked(data, sizes):
+    pos = 0
+    for size in sizes:
+        yield data[pos:pos + size]
+        pos += size
+    yield data[pos:]
+
+
+def expected(text):
+    js = json.loads(text)
+    return js['response']['docs'], js['response']['numFound']
+
+
+@pytest.mark.parametrize('indent', [None, 4])
+def test_every_split_point(indent):
+    text = json.dumps(RESPONSE, indent=indent, ensure_ascii=False)
+    data = text.encode('utf-8')
+    docs, numFound = expected(text)
+    for split in range(len(data) + 1):
+        meta = {}
+        assert list(iterStreamDocs([data[:split], data[split:]],
+                                   meta=meta)) == docs
+        assert meta['numFound'] == numFound
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_chunkings(seed):
+    rand = random.Random(seed)
+    text = json.dumps(RESPONSE, indent=rand.choice([None, 1]),
+                      ensure_ascii=rand.random() < 0.5)
+    data = text.encode('utf-8')
+    sizes = [rand.randint(1, 16) for _ in range(len(data))]
+    meta = {}
+    docs = list(iterStreamDocs(chunked(data, sizes), meta=meta))
+    assert (docs, meta['numFound']) == expected(text)
+
+
+def test_single_char_str_chunks():
+    text = json.dumps(RESPONSE, ensure_ascii=False)
+    stream = SolrDocStream()
+    docs = []
+    for char in text:
+        docs.extend(stream.feed(char))
+    stream.close()
+    assert (docs, stream.meta['numFound']) == expected(text)
+
+
+def test_file_docs(tmp_path):
+    fileName = tmp_path / 'response.json'
+    fileName.write_text(json.dumps(RESPONSE, ensure_ascii=False),
+                        encoding='utf-8')
+    meta = {}
+    docs = list(iterFileDocs(str(fileName), meta=meta, chunkSize=7))
+    assert (docs, meta['numFound']) == expected(fileName.read_text(
+        encoding='utf-8'))
+
+
+@pytest.mark.parametrize('cut', [10, 150, -3])
+def test_truncated_text(cut):
+    data = json.dumps(RESPONSE).encode('utf-8')[:cut]
+    with pytest.raises(ValueError):
+        list(iterStreamDocs([data]))